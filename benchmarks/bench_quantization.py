@@ -0,0 +1,71 @@
+# Import the libraries
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+# Add the parent directory to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from enigma_code.local_store import LocalVectorStore
+
+
+# Function for generating a clustered synthetic corpus
+def make_corpus(n_vectors, dim, n_clusters, seed):
+    generator = np.random.RandomState(seed)
+    centers = generator.normal(size=(n_clusters, dim))
+    vectors = centers[generator.randint(n_clusters, size=n_vectors)] + 0.5 * generator.normal(size=(n_vectors, dim))
+    queries = centers[generator.randint(n_clusters, size=200)] + 0.5 * generator.normal(size=(200, dim))
+    return vectors.astype(np.float32), queries.astype(np.float32)
+
+
+# Function for benchmarking a storage type
+def bench_storage(storage, folder_path, queries, truth, k):
+    store = LocalVectorStore.load_local(folder_path, embeddings=None, storage=storage)
+    store._search(queries[0], k)
+
+    # First-pass memory (the full-precision vectors stay memory-mapped)
+    resident = store.vectors.nbytes if storage == "float32" else store._codes.nbytes
+
+    # Recall and latency
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        rows, _ = store._search(query, k)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(set(rows.tolist()) & expected) / k)
+
+    return {"storage": storage, "first_pass_bytes": int(resident), f"recall@{k}": float(np.mean(recalls)), "p50_ms": 1000 * float(np.percentile(latencies, 50)), "p99_ms": 1000 * float(np.percentile(latencies, 99))}
+
+
+# Function for running the benchmark
+def main():
+    parser = argparse.ArgumentParser(description="Compare the float32, float16 and int8 storages of LocalVectorStore.")
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Build and save the corpus once per storage
+    vectors, queries = make_corpus(args.vectors, args.dim, args.clusters, args.seed)
+    results = []
+    with tempfile.TemporaryDirectory() as folder_path:
+        for storage in LocalVectorStore.STORAGES:
+            store = LocalVectorStore(embedding=None, storage=storage)
+            store.add_embeddings(zip(map(str, range(len(vectors))), vectors))
+            store.save_local(os.path.join(folder_path, storage))
+            if storage == "float32":
+                truth = [set(store._search(query, args.k)[0].tolist()) for query in queries]
+            del store
+            results.append(bench_storage(storage, os.path.join(folder_path, storage), queries, truth, args.k))
+
+    print(json.dumps({"vectors": args.vectors, "dim": args.dim, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
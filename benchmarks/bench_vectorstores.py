@@ -0,0 +1,195 @@
+# Import the libraries
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import zlib
+from functools import lru_cache
+import numpy as np
+
+# Add the parent directory to the system path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+
+
+# Embedding model hashing the words of a text into unit vectors (deterministic and offline)
+class HashingEmbeddings(Embeddings):
+    def __init__(self, dim):
+        self.dim = dim
+
+    # Bucket and sign of a word
+    @lru_cache(maxsize=None)
+    def _feature(self, word):
+        value = zlib.crc32(word.encode("utf-8"))
+        return value % self.dim, 1.0 if value & (1 << 31) else -1.0
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.split():
+            bucket, sign = self._feature(word)
+            vector[bucket] += sign
+        return (vector / max(float(np.linalg.norm(vector)), 1e-12)).tolist()
+
+
+# Brute-force retriever of the notebooks (numpy matrix, one matrix-vector product per query)
+class NumpyRetriever:
+    def __init__(self, vectors, documents):
+        self.matrix, self.documents = np.asarray(vectors, dtype=np.float32), documents
+
+    def similarity_search_by_vector(self, vector, k=4):
+        scores = self.matrix @ np.asarray(vector, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [self.documents[row] for row in top[np.argsort(-scores[top])]]
+
+
+# Function for generating a synthetic corpus of topical texts
+def make_corpus(n_documents, n_queries, n_topics, seed):
+    """
+    Every topic has its own vocabulary; a document draws most of its words from its topic and some from the whole
+    vocabulary, and a query draws a few words from a topic.
+    """
+    generator = np.random.RandomState(seed)
+    vocabulary = [f"w{i}" for i in range(50 * n_topics)]
+    topics = generator.randint(n_topics, size=n_documents + n_queries)
+    texts = []
+    for index, topic in enumerate(topics):
+        n_words = 40 if index < n_documents else 6
+        words = generator.randint(50, size=n_words) + 50 * topic
+        noise = generator.randint(len(vocabulary), size=n_words // 4)
+        texts.append(" ".join(vocabulary[i] for i in np.concatenate([words, noise])))
+    return texts[:n_documents], texts[n_documents:]
+
+
+# Function for getting the resident memory of the process
+def rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Peak resident memory (kilobytes on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# Function for getting the size of a folder
+def folder_bytes(path):
+    if path is None or not os.path.exists(path):
+        return None
+    path = os.path.realpath(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+# Function for benchmarking a backend (runs in its own process)
+def bench_backend(backend, args):
+    from enigma_code.vectorstore import VectorStoreManager
+
+    texts, queries = make_corpus(args.documents, args.queries, args.topics, args.seed)
+    embedding = HashingEmbeddings(args.dim)
+    documents = [Document(page_content=text, metadata={"i": i}) for i, text in enumerate(texts)]
+    query_vectors = np.asarray(embedding.embed_documents(queries), dtype=np.float32)
+    document_vectors = np.asarray(embedding.embed_documents(texts), dtype=np.float32)
+
+    # Exact scores and k-th best score of each query (the vectors are normalized, so cosine and L2 rank alike)
+    exact_scores = query_vectors @ document_vectors.T
+    thresholds = -np.partition(-exact_scores, args.k - 1, axis=1)[:, args.k - 1]
+
+    with tempfile.TemporaryDirectory() as folder_path:
+        rss_before = rss_bytes()
+        start = time.perf_counter()
+
+        # Build
+        if backend == "numpy":
+            store = NumpyRetriever(document_vectors, documents)
+            path = None
+        else:
+            name, _, storage = backend.partition(":")
+            VectorStoreManager.EMBEDDING_MODELS["hashing"] = lambda: embedding
+            path = os.path.join(folder_path, "index")
+            manager = VectorStoreManager(name, "hashing", index_name="bench", vectorstore_path=path, vectorstore_kwargs={"storage": storage} if storage else None)
+            try:
+                manager.build(documents, batch_size=1024, max_workers=1)
+            except ImportError as error:
+                return {"backend": backend, "skipped": str(error)}
+            store = manager.vectorstore
+        build_seconds = time.perf_counter() - start
+        rss_after = rss_bytes()
+
+        # Function for searching a query
+        def search(query):
+            return [document.metadata["i"] for document in store.similarity_search_by_vector(query.tolist(), k=args.k)]
+
+        # Latency and recall
+        search(query_vectors[0])
+        latencies, recalls = [], []
+        for query, scores, threshold in zip(query_vectors, exact_scores, thresholds):
+            start = time.perf_counter()
+            found = search(query)
+            latencies.append(time.perf_counter() - start)
+            # Hashed vectors have ties, so any document scoring at least the k-th best score is a true neighbour
+            recalls.append(min(int(np.sum(scores[found] >= threshold - 1e-6)), args.k) / args.k)
+
+        # Throughput under concurrency
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.threads) as executor:
+            list(executor.map(search, query_vectors))
+        qps = len(query_vectors) / (time.perf_counter() - start)
+
+        return {
+            "backend": backend,
+            "build_seconds": build_seconds,
+            "index_bytes": folder_bytes(path),
+            "rss_bytes": rss_after,
+            "rss_build_bytes": rss_after - rss_before,
+            "p50_ms": 1000 * float(np.percentile(latencies, 50)),
+            "p99_ms": 1000 * float(np.percentile(latencies, 99)),
+            "qps": qps,
+            f"recall@{args.k}": float(np.mean(recalls)),
+        }
+
+
+# Function for running the benchmark
+def main():
+    parser = argparse.ArgumentParser(description="Compare the vector store backends of VectorStoreManager offline, on a synthetic corpus with a hashing embedding model.")
+    parser.add_argument("--backends", default="numpy,local,local:int8,faiss,annoy,chroma", help="Comma-separated backends (numpy, local[:storage], faiss, annoy, chroma).")
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--topics", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Path to also write the JSON report to.")
+    args = parser.parse_args()
+
+    # Every backend runs in a fresh process, so the memory of one does not count against the next
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for backend in args.backends.split(","):
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            try:
+                results.append(executor.submit(bench_backend, backend, args).result())
+            except Exception as error:
+                results.append({"backend": backend, "error": f"{type(error).__name__}: {error}"})
+
+    report = {"config": vars(args), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
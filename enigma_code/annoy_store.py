@@ -0,0 +1,219 @@
+# Import the libraries
+import json
+import os
+import uuid
+from langchain.schema import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import Annoy
+from langchain_core.vectorstores import VectorStore
+from enigma_code.local_store import LocalVectorStore
+
+
+# Class for updating an Annoy index
+class DeltaAnnoy(VectorStore):
+    """
+    Updatable Annoy vector store.
+
+    Annoy indexes cannot be changed once built, so the store keeps three parts: the base Annoy index, a delta of the
+    documents added since it was built (an exact LocalVectorStore), and the IDs of the base documents that were
+    deleted or replaced. A search queries the base and the delta and merges them by cosine similarity, skipping the
+    deleted documents. When the delta and the deleted documents reach merge_ratio of the base, the base is rebuilt
+    with the delta (merge), so the cost of a rebuild is paid once per merge_ratio of changes rather than per update.
+
+    The documents are stored under their external IDs, so upserts and deletes use the same IDs as the rest of the
+    pipeline (e.g. the chunk IDs of IngestionManifest).
+    """
+
+    # Constructor function
+    def __init__(self, embedding, base=None, delta=None, deleted=None, trees=100, merge_ratio=0.1):
+        """
+        Initialize the DeltaAnnoy class.
+
+        Args:
+        embedding (Embeddings): The embedding model.
+        base (Annoy): The base Annoy store (angular metric), or None.
+        delta (LocalVectorStore): The documents added since the base was built, or None.
+        deleted (set): The IDs of the deleted base documents.
+        trees (int): The number of trees of the Annoy index.
+        merge_ratio (float): The size of the delta and the deleted documents, relative to the base, that triggers a merge.
+
+        Returns:
+        None
+        """
+        if base is not None and base.metric != "angular":
+            raise ValueError(f"Only the angular metric is supported, got {base.metric}")
+        self.embedding = embedding
+        self.base = base
+        self.delta = delta if delta is not None else LocalVectorStore(embedding)
+        self.deleted = set(deleted or ())
+        self.trees = trees
+        self.merge_ratio = merge_ratio
+        self.version = 0
+        self._base_rows = {id_: row for row, id_ in base.index_to_docstore_id.items()} if base is not None else {}
+
+    # Property for getting the embedding model
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    # Function for getting the number of documents
+    def __len__(self):
+        return len(self._base_rows) - len(self.deleted) + len(self.delta)
+
+    # Function for adding embeddings
+    def add_embeddings(self, text_embeddings, metadatas=None, ids=None, **kwargs):
+        """
+        Add (or replace) texts with their precomputed embeddings. They go to the delta until the next merge.
+
+        Returns:
+        list: The IDs of the texts.
+        """
+        text_embeddings = list(text_embeddings)
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in text_embeddings]
+        self.delete(ids, merge=False)
+        self.delta.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        self.version += 1
+        self._maybe_merge()
+        return ids
+
+    # Function for adding texts
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        return self.add_embeddings(zip(texts, self.embedding.embed_documents(texts)), metadatas=metadatas, ids=ids)
+
+    # Function for deleting documents
+    def delete(self, ids=None, merge=True, **kwargs):
+        """
+        Delete documents by ID: base documents are marked as deleted, delta documents are removed.
+
+        Returns:
+        bool: True.
+        """
+        ids = list(ids or [])
+        self.deleted.update(id_ for id_ in ids if id_ in self._base_rows)
+        self.delta.delete([id_ for id_ in ids if id_ in self.delta._id_to_row])
+        self.version += 1
+        if merge:
+            self._maybe_merge()
+        return True
+
+    # Function for merging when the delta is large
+    def _maybe_merge(self):
+        if len(self.delta) + len(self.deleted) > self.merge_ratio * len(self._base_rows):
+            self.merge()
+
+    # Function for merging the delta into the base
+    def merge(self):
+        """
+        Rebuild the base Annoy index with the live base documents and the delta, and empty the delta.
+        """
+        import annoy
+
+        # Collect the live documents
+        documents, vectors = {}, []
+        for row, id_ in sorted((row, id_) for id_, row in self._base_rows.items() if id_ not in self.deleted):
+            documents[id_] = self.base.docstore.search(id_)
+            vectors.append(self.base.index.get_item_vector(row))
+        for row, id_ in enumerate(self.delta.ids):
+            documents[id_] = Document(page_content=self.delta.texts[row], metadata=dict(self.delta.metadatas[row]))
+            vectors.append(self.delta.vectors[row])
+
+        # Build the index
+        if documents:
+            index = annoy.AnnoyIndex(len(vectors[0]), metric="angular")
+            for row, vector in enumerate(vectors):
+                index.add_item(row, vector)
+            index.build(self.trees)
+            index_to_id = dict(enumerate(documents))
+            self.base = Annoy(self.embedding.embed_query, index, "angular", InMemoryDocstore(documents), index_to_id)
+        else:
+            self.base = None
+        self._base_rows = {id_: row for row, id_ in self.base.index_to_docstore_id.items()} if self.base is not None else {}
+        self.delta = LocalVectorStore(self.embedding)
+        self.deleted = set()
+
+    # Function for searching by vector with scores
+    def similarity_search_with_score_by_vector(self, embedding, k=4, search_k=-1, **kwargs):
+        """
+        Search the base and the delta, and merge the results by cosine similarity.
+
+        Returns:
+        list: The (document, cosine similarity) pairs, best first.
+        """
+        results = self.delta.similarity_search_with_score_by_vector(embedding, k)
+
+        # Base (fetch enough results to make up for the deleted documents)
+        if self.base is not None:
+            n = min(k + len(self.deleted), len(self._base_rows))
+            rows, distances = self.base.index.get_nns_by_vector(list(map(float, embedding)), n, search_k=search_k, include_distances=True)
+            for row, distance in zip(rows, distances):
+                id_ = self.base.index_to_docstore_id[row]
+                if id_ not in self.deleted:
+                    # Angular distance is sqrt(2 - 2 cos)
+                    results.append((self.base.docstore.search(id_), 1 - distance ** 2 / 2))
+
+        return sorted(results, key=lambda result: -result[1])[:k]
+
+    # Function for searching by vector
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    # Function for searching by text with scores
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    # Function for searching by text
+    def similarity_search(self, query, k=4, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    # Function for getting the relevance score function
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1) / 2
+
+    # Function for creating a store from texts
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        return cls.from_embeddings(list(zip(texts, embedding.embed_documents(texts))), embedding, metadatas=metadatas, ids=ids, **kwargs)
+
+    # Function for creating a store from embeddings
+    @classmethod
+    def from_embeddings(cls, text_embeddings, embedding, metadatas=None, ids=None, **kwargs):
+        store = cls(embedding, **kwargs)
+        store.delta.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        store.merge()
+        return store
+
+    # Function for saving the store
+    def save_local(self, folder_path):
+        """
+        Save the base (index.annoy and index.pkl), the delta (delta/) and the deleted IDs (deleted.json).
+        """
+        os.makedirs(folder_path, exist_ok=True)
+        if self.base is not None:
+            self.base.save_local(folder_path)
+        self.delta.save_local(os.path.join(folder_path, "delta"))
+        with open(os.path.join(folder_path, "deleted.json"), "w") as f:
+            json.dump(sorted(self.deleted), f)
+
+    # Function for loading a saved store
+    @classmethod
+    def load_local(cls, folder_path, embeddings, **kwargs):
+        """
+        Load a saved store (or a plain Annoy store saved by langchain). The Annoy index is memory-mapped, the delta
+        is read into memory.
+
+        Returns:
+        DeltaAnnoy: The store.
+        """
+        base = None
+        if os.path.exists(os.path.join(folder_path, "index.annoy")):
+            base = Annoy.load_local(folder_path, embeddings, allow_dangerous_deserialization=True)
+        delta = None
+        if os.path.exists(os.path.join(folder_path, "delta", "docstore.json")):
+            delta = LocalVectorStore.load_local(os.path.join(folder_path, "delta"), embeddings, mmap=False)
+        deleted = []
+        if os.path.exists(os.path.join(folder_path, "deleted.json")):
+            with open(os.path.join(folder_path, "deleted.json"), "r") as f:
+                deleted = json.load(f)
+        return cls(embeddings, base=base, delta=delta, deleted=deleted, **kwargs)
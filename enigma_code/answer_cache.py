@@ -0,0 +1,157 @@
+# Import the libraries
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+# Class for caching answers by the meaning of the question
+class SemanticAnswerCache:
+    """
+    Bounded, thread-safe cache of answers keyed by the embedding of the (standalone) question, so that paraphrases of
+    a question already answered skip retrieval and the LLM.
+
+    A lookup returns the answer of the most similar cached question when their cosine similarity is at least
+    threshold. Entries expire ttl seconds after they were stored, the least recently used entry is evicted when the
+    cache holds max_entries, and the cache is emptied when the version of the index changes (like QueryCache). The
+    embeddings are kept in one matrix, so a lookup is one matrix-vector product.
+    """
+
+    # Constructor function
+    def __init__(self, embedding, threshold=0.95, max_entries=1024, ttl=3600.0):
+        """
+        Initialize the SemanticAnswerCache class.
+
+        Args:
+        embedding (Embeddings): The embedding model of the questions.
+        threshold (float): The minimum cosine similarity of a hit.
+        max_entries (int): The maximum number of entries.
+        ttl (float): The number of seconds an entry is valid (None for no expiry).
+
+        Returns:
+        None
+        """
+        self.embedding = embedding
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.seconds_saved = 0.0
+        self._entries = OrderedDict()
+        self._vectors = None
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._version = None
+        self._lock = threading.Lock()
+
+    # Function for getting the number of entries
+    def __len__(self):
+        return len(self._entries)
+
+    # Function for emptying the cache when the version changes
+    def _check_version(self, version):
+        if version is not None and version != self._version:
+            if self._version is not None and self._entries:
+                self._clear()
+                self.invalidations += 1
+            self._version = version
+
+    # Function for removing all the entries
+    def _clear(self):
+        self._entries.clear()
+        self._free = list(range(self.max_entries - 1, -1, -1))
+
+    # Function for normalizing a vector
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    # Function for embedding a question
+    def embed(self, question):
+        return self._normalize(self.embedding.embed_query(question))
+
+    # Function for looking up an answer
+    def lookup(self, vector, version=None):
+        """
+        Find the answer of the most similar cached question.
+
+        Args:
+        vector (list): The embedding of the question (see embed()).
+        version (hashable): The version of the index, or None.
+
+        Returns:
+        dict: The entry ({"question", "answer", "sources", "seconds"}) or None on a miss.
+        """
+        vector = self._normalize(vector)
+        with self._lock:
+            self._check_version(version)
+
+            # Drop the expired entries (the oldest first)
+            if self.ttl is not None:
+                now = time.monotonic()
+                for slot in [slot for slot, entry in self._entries.items() if now - entry["time"] > self.ttl]:
+                    del self._entries[slot]
+                    self._free.append(slot)
+                    self.expirations += 1
+
+            if self._entries:
+                slots = np.fromiter(self._entries.keys(), dtype=np.int64, count=len(self._entries))
+                scores = self._vectors[slots] @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    slot = int(slots[best])
+                    self._entries.move_to_end(slot)
+                    entry = self._entries[slot]
+                    self.hits += 1
+                    self.seconds_saved += entry["seconds"]
+                    return entry
+            self.misses += 1
+            return None
+
+    # Function for storing an answer
+    def store(self, vector, question, answer, sources=None, version=None, seconds=0.0):
+        """
+        Store the answer of a question.
+
+        Args:
+        vector (list): The embedding of the question (see embed()).
+        question (str): The question.
+        answer (str): The answer.
+        sources (list): The source documents of the answer.
+        version (hashable): The version of the index the answer was retrieved from, or None.
+        seconds (float): The time it took to answer, counted as saved by every hit.
+
+        Returns:
+        None
+        """
+        vector = self._normalize(vector)
+        with self._lock:
+            self._check_version(version)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            if not self._free:
+                slot, _ = self._entries.popitem(last=False)
+                self._free.append(slot)
+                self.evictions += 1
+            slot = self._free.pop()
+            self._vectors[slot] = vector
+            self._entries[slot] = {"question": question, "answer": answer, "sources": list(sources or []), "seconds": seconds, "time": time.monotonic()}
+
+    # Function for emptying the cache
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+            self.invalidations += 1
+
+    # Function for getting the cache statistics
+    def stats(self):
+        """
+        Get the number of hits, misses, evictions, expirations and invalidations, the hit rate, the seconds saved by
+        the hits and the size.
+        """
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0, "seconds_saved": self.seconds_saved, "evictions": self.evictions, "expirations": self.expirations, "invalidations": self.invalidations, "entries": len(self._entries)}
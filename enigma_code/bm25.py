@@ -0,0 +1,171 @@
+# Import the libraries
+import json
+import os
+import re
+from collections import Counter
+import numpy as np
+from langchain.schema import Document
+
+
+# Words, with codes such as "LX-0112", "POL-4.2" or "a/b" kept together
+_TERMS = re.compile(r"\w+(?:[-./]\w+)*")
+
+# Separators inside codes
+_SEPARATORS = re.compile(r"[-./]")
+
+
+# Function for splitting a text into BM25 terms
+def tokenize(text):
+    """
+    Split a text into lowercase terms. A code such as "LX-0112" gives the whole code and its parts ("lx-0112", "lx",
+    "0112"), so both "LX-0112" and "LX 0112" find it.
+    """
+    terms = []
+    for term in _TERMS.findall(text.lower()):
+        terms.append(term)
+        if _SEPARATORS.search(term):
+            terms.extend(part for part in _SEPARATORS.split(term) if part)
+    return terms
+
+
+# Class for searching chunks by keywords
+class BM25Index:
+    """
+    In-process sparse BM25 index of chunks, for the queries embeddings handle badly (flight, ticket and policy
+    numbers).
+
+    The postings are stored in a compact CSR layout: the postings of term t are doc_ids[indptr[t]:indptr[t + 1]]
+    (int32) with their BM25 weights (float32, the term frequency part of the score, computed once at build time), so
+    a posting costs 8 bytes. A search only reads the postings of the query terms and never calls a model.
+    """
+
+    # Constructor function
+    def __init__(self, k1=1.5, b=0.75):
+        """
+        Initialize the BM25Index class.
+
+        Args:
+        k1 (float): The term frequency saturation.
+        b (float): The document length normalization.
+
+        Returns:
+        None
+        """
+        self.k1 = k1
+        self.b = b
+        self.documents = []
+        self.vocabulary = {}
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.empty(0, dtype=np.int32)
+        self.weights = np.empty(0, dtype=np.float32)
+        self.idf = np.empty(0, dtype=np.float32)
+
+    # Function for getting the number of documents
+    def __len__(self):
+        return len(self.documents)
+
+    # Function for building the index
+    @classmethod
+    def from_documents(cls, documents, **kwargs):
+        """
+        Build the index of documents, e.g. the chunks of DataHandler.chunk_dataset.
+
+        Args:
+        documents (iterable): The documents.
+
+        Returns:
+        BM25Index: The index.
+        """
+        index = cls(**kwargs)
+        index.documents = list(documents)
+
+        # Count the terms of each document
+        vocabulary = {}
+        term_ids, doc_ids, frequencies, lengths = [], [], [], []
+        for doc_id, document in enumerate(index.documents):
+            terms = tokenize(document.page_content)
+            lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc_id)
+                frequencies.append(frequency)
+
+        # Group the postings by term
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)[order]
+        frequencies = np.asarray(frequencies, dtype=np.float32)[order]
+        document_frequencies = np.bincount(term_ids, minlength=len(vocabulary))
+
+        # Weights of the postings and inverse document frequencies of the terms
+        lengths = np.asarray(lengths, dtype=np.float32)
+        norms = index.k1 * (1 - index.b + index.b * lengths / max(float(lengths.mean()) if len(lengths) else 0.0, 1.0))
+        index.weights = (frequencies * (index.k1 + 1) / (frequencies + norms[doc_ids])).astype(np.float32)
+        index.doc_ids = doc_ids
+        index.indptr = np.concatenate([[0], np.cumsum(document_frequencies)]).astype(np.int64)
+        index.idf = np.log1p((len(index.documents) - document_frequencies + 0.5) / (document_frequencies + 0.5)).astype(np.float32)
+        index.vocabulary = vocabulary
+
+        return index
+
+    # Function for searching the top k rows of a query
+    def _search(self, query, k):
+        """
+        Find the k documents with the best BM25 score for a query.
+
+        Returns:
+        tuple: The document rows and their scores, best first (only documents containing a query term).
+        """
+        terms = [self.vocabulary[term] for term in dict.fromkeys(tokenize(query)) if term in self.vocabulary]
+        if not terms or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        # Accumulate the scores of the documents in the postings of the query terms
+        doc_ids = np.concatenate([self.doc_ids[self.indptr[t]:self.indptr[t + 1]] for t in terms])
+        weights = np.concatenate([self.weights[self.indptr[t]:self.indptr[t + 1]] * self.idf[t] for t in terms])
+        rows, inverse = np.unique(doc_ids, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights).astype(np.float32)
+
+        # Top k
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return rows[order].astype(np.int64), scores[order]
+
+    # Function for searching with scores
+    def search_with_score(self, query, k=4):
+        """
+        Find the k documents with the best BM25 score for a query.
+
+        Returns:
+        list: The (document, score) pairs, best first.
+        """
+        rows, scores = self._search(query, k)
+        return [(self.documents[row], float(score)) for row, score in zip(rows, scores)]
+
+    # Function for searching
+    def search(self, query, k=4):
+        return [document for document, _ in self.search_with_score(query, k)]
+
+    # Function for saving the index
+    def save_local(self, folder_path):
+        """
+        Save the postings to bm25.npz and the documents and vocabulary to bm25.json.
+        """
+        os.makedirs(folder_path, exist_ok=True)
+        np.savez(os.path.join(folder_path, "bm25.npz"), indptr=self.indptr, doc_ids=self.doc_ids, weights=self.weights, idf=self.idf)
+        with open(os.path.join(folder_path, "bm25.json"), "w") as f:
+            json.dump({"k1": self.k1, "b": self.b, "vocabulary": list(self.vocabulary), "documents": [{"page_content": document.page_content, "metadata": document.metadata} for document in self.documents]}, f)
+
+    # Function for loading a saved index
+    @classmethod
+    def load_local(cls, folder_path):
+        with open(os.path.join(folder_path, "bm25.json"), "r") as f:
+            saved = json.load(f)
+        index = cls(k1=saved["k1"], b=saved["b"])
+        index.vocabulary = {term: term_id for term_id, term in enumerate(saved["vocabulary"])}
+        index.documents = [Document(**document) for document in saved["documents"]]
+        with np.load(os.path.join(folder_path, "bm25.npz")) as arrays:
+            index.indptr, index.doc_ids, index.weights, index.idf = arrays["indptr"], arrays["doc_ids"], arrays["weights"], arrays["idf"]
+        return index
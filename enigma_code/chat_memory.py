@@ -0,0 +1,197 @@
+# Import the libraries
+import re
+from collections import deque
+from typing import Any, Callable, Optional
+from langchain_core.messages import SystemMessage
+from langchain_core.retrievers import BaseRetriever
+
+
+# Runs of whitespace
+_WHITESPACE = re.compile(r"\s+")
+
+# Prompt of the rolling summary
+SUMMARY_PROMPT = """Progressively summarize the conversation between a customer and a travel assistant, adding the new lines to the current summary. Keep names, dates, booking and ticket numbers.
+
+Current summary:
+{summary}
+
+New lines:
+{lines}
+
+New summary:"""
+
+
+# Function for estimating the number of tokens of a text
+def approximate_tokens(text):
+    """
+    Estimate the number of tokens of a text (about 4 characters per token for English), for budgets that do not need
+    the exact tokenizer of the model.
+    """
+    return (len(text) + 3) // 4
+
+
+# Function for cutting a text to a number of tokens
+def _truncate(text, max_tokens, count_tokens):
+    """
+    Keep the end of a text that fits in max_tokens (the most recent part of a summary).
+    """
+    words = text.split()
+    while words and count_tokens(" ".join(words)) > max_tokens:
+        words = words[max(1, len(words) // 8):]
+    return " ".join(words)
+
+
+# Class for keeping the chat history within a token budget
+class TokenBudgetHistory:
+    """
+    Chat history with a token budget: a sliding window of the most recent turns plus a rolling summary of the older
+    ones, so the history sent through question condensing stays under max_tokens however long the session is.
+
+    When the window outgrows its budget (max_tokens minus summary_tokens), the oldest turns leave the window and are
+    folded into the summary in one call of the LLM (or, without an LLM, the summary keeps their questions). The
+    summary is kept under summary_tokens, so every turn costs about the same.
+    """
+
+    # Constructor function
+    def __init__(self, max_tokens=1000, summary_tokens=250, llm=None, count_tokens=None, min_turns=1):
+        """
+        Initialize the TokenBudgetHistory class.
+
+        Args:
+        max_tokens (int): The token budget of the history (window and summary).
+        summary_tokens (int): The token budget of the summary.
+        llm (BaseLanguageModel): The model writing the summary, or None.
+        count_tokens (callable): The function counting the tokens of a text (approximate_tokens by default).
+        min_turns (int): The number of recent turns kept in the window even over budget.
+
+        Returns:
+        None
+        """
+        if summary_tokens >= max_tokens:
+            raise ValueError("summary_tokens must be lower than max_tokens")
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.llm = llm
+        self.count_tokens = count_tokens or approximate_tokens
+        self.min_turns = min_turns
+        self.turns = deque()
+        self.summary = ""
+        self._window_tokens = 0
+
+    # Function for getting the number of turns in the window
+    def __len__(self):
+        return len(self.turns)
+
+    # Function for counting the tokens of a turn
+    def _turn_tokens(self, turn):
+        return self.count_tokens(turn[0]) + self.count_tokens(turn[1])
+
+    # Function for adding a turn
+    def append(self, question, answer):
+        """
+        Add a turn, and fold the oldest turns into the summary when the window is over its budget.
+        """
+        turn = (question, answer, self._turn_tokens((question, answer)))
+        self.turns.append(turn)
+        self._window_tokens += turn[2]
+        evicted = []
+        while self._window_tokens > self.max_tokens - self.summary_tokens and len(self.turns) > self.min_turns:
+            evicted.append(self.turns.popleft())
+            self._window_tokens -= evicted[-1][2]
+        if evicted:
+            self._summarize(evicted)
+
+    # Function for folding turns into the summary
+    def _summarize(self, turns):
+        if self.llm is not None:
+            lines = "\n".join(f"Human: {question}\nAssistant: {answer}" for question, answer, _ in turns)
+            result = self.llm.invoke(SUMMARY_PROMPT.format(summary=self.summary or "(empty)", lines=lines))
+            summary = getattr(result, "content", result).strip()
+        else:
+            summary = " ".join([self.summary] + [f"The customer asked: {question}" for question, _, _ in turns]).strip()
+        self.summary = _truncate(summary, self.summary_tokens, self.count_tokens)
+
+    # Function for getting the history of the chain
+    def as_chat_history(self):
+        """
+        Get the history in the format of ConversationalRetrievalChain: the summary as a system message, then the
+        (question, answer) turns of the window.
+        """
+        history = [SystemMessage(content=f"Summary of the earlier conversation: {self.summary}")] if self.summary else []
+        return history + [(question, answer) for question, answer, _ in self.turns]
+
+    # Function for getting the number of tokens of the history
+    def tokens(self):
+        return self._window_tokens + (self.count_tokens(self.summary) if self.summary else 0)
+
+    # Function for getting the state of the history (JSON-serializable)
+    def to_dict(self):
+        return {"summary": self.summary, "turns": [[question, answer] for question, answer, _ in self.turns]}
+
+    # Function for restoring the state of the history
+    def load_dict(self, state):
+        self.clear()
+        self.summary = state.get("summary", "")
+        for question, answer in state.get("turns", []):
+            self.turns.append((question, answer, self._turn_tokens((question, answer))))
+            self._window_tokens += self.turns[-1][2]
+
+    # Function for emptying the history
+    def clear(self):
+        self.turns.clear()
+        self.summary = ""
+        self._window_tokens = 0
+
+
+# Function for packing retrieved chunks into a token budget
+def pack_context(scored_documents, max_tokens, count_tokens=None):
+    """
+    Select the retrieved chunks that fit in a context budget: duplicates (same content up to whitespace and case)
+    are dropped, and the chunks are taken by decreasing score while they fit (a chunk that does not fit is skipped,
+    so a smaller one after it can still be taken).
+
+    Args:
+    scored_documents (list): The (document, score) pairs, higher scores being better.
+    max_tokens (int): The token budget of the context.
+    count_tokens (callable): The function counting the tokens of a text (approximate_tokens by default).
+
+    Returns:
+    list: The selected documents, best first.
+    """
+    count_tokens = count_tokens or approximate_tokens
+    seen, packed, used = set(), [], 0
+    for document, _ in sorted(scored_documents, key=lambda result: -result[1]):
+        key = _WHITESPACE.sub(" ", document.page_content).strip().lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        tokens = count_tokens(document.page_content)
+        if used + tokens <= max_tokens:
+            packed.append(document)
+            used += tokens
+    return packed
+
+
+# Class for retrieving chunks within a context budget
+class PackedRetriever(BaseRetriever):
+    """
+    Retriever that fetches fetch_k scored chunks and packs them into a context budget (see pack_context). The source
+    is a HybridRetriever (fused scores) or a VectorStore (relevance scores, so every backend ranks higher-is-better).
+    """
+
+    source: Any
+    """The HybridRetriever or VectorStore."""
+    max_tokens: int = 1500
+    """The token budget of the context."""
+    fetch_k: int = 20
+    """The number of chunks fetched before packing."""
+    count_tokens: Optional[Callable[[str], int]] = None
+    """The function counting the tokens of a text."""
+
+    # Function for getting the relevant documents
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        if hasattr(self.source, "search_with_score"):
+            scored = self.source.search_with_score(query, k=self.fetch_k)
+        else:
+            scored = self.source.similarity_search_with_relevance_scores(query, k=self.fetch_k)
+        return pack_context(scored, self.max_tokens, self.count_tokens)
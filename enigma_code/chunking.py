@@ -0,0 +1,410 @@
+# Import the libraries
+import threading
+from array import array
+from collections import deque, namedtuple
+from itertools import accumulate
+from langchain.schema import Document
+
+
+# Offsets of a chunk in the text of a source document
+TextSpan = namedtuple("TextSpan", ["doc_id", "start", "end"])
+
+
+# Class for holding chunks as offset spans
+class SpanChunks:
+    """
+    Chunks stored as (doc_id, start, end) offsets into the source documents.
+
+    The offsets live in three compact arrays and no substring is created until a chunk is accessed, so chunking
+    millions of lines costs three integers per chunk instead of a string and a Document.
+    """
+
+    # Constructor function
+    def __init__(self, documents):
+        """
+        Initialize the SpanChunks class.
+
+        Args:
+        documents (list): The source documents the spans point into.
+
+        Returns:
+        None
+        """
+        self.documents = documents
+        self.doc_ids = array("q")
+        self.starts = array("q")
+        self.ends = array("q")
+
+    # Function for adding a span
+    def append(self, doc_id, start, end):
+        self.doc_ids.append(doc_id)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    # Function for getting the number of chunks
+    def __len__(self):
+        return len(self.starts)
+
+    # Function for getting the span of a chunk
+    def span(self, index):
+        """
+        Get the (doc_id, start, end) span of a chunk, e.g. to cite it.
+        """
+        return TextSpan(self.doc_ids[index], self.starts[index], self.ends[index])
+
+    # Function for iterating over the spans
+    def spans(self):
+        for index in range(len(self)):
+            yield self.span(index)
+
+    # Function for getting the text of a chunk
+    def text(self, index):
+        doc_id, start, end = self.span(index)
+        return self.documents[doc_id].page_content[start:end]
+
+    # Function for materializing a chunk
+    def __getitem__(self, index):
+        """
+        Materialize a chunk as a Document. The metadata of the source document is kept and the span is added as
+        start_index and end_index, counted from the start of the text the source document was cut from (a source
+        document that is itself a chunk has a start_index). The doc_id is only a position in the documents that
+        were chunked together, so it is not part of the metadata (see span).
+        """
+        doc_id, start, end = self.span(index)
+        document = self.documents[doc_id]
+        offset = document.metadata.get("start_index") or 0
+        metadata = {**document.metadata, "start_index": offset + start, "end_index": offset + end}
+        return Document(page_content=document.page_content[start:end], metadata=metadata)
+
+    # Function for materializing the chunks one at a time
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+# Class for chunking text into offset spans
+class SpanChunker:
+    """
+    Chunker that computes offset spans over the source text instead of copying substrings.
+
+    Two modes are supported:
+        - "char": the text is split on a separator and the pieces are merged into chunks of at most chunk_size
+          characters, the last pieces of a chunk (up to chunk_overlap characters) starting the next one. This follows
+          langchain's CharacterTextSplitter, pieces longer than chunk_size are kept whole.
+        - "newline": one chunk per non-empty line.
+    """
+
+    # Constructor function
+    def __init__(self, mode="char", chunk_size=1000, chunk_overlap=200, separator="\n\n"):
+        """
+        Initialize the SpanChunker class.
+
+        Args:
+        mode (str): The chunking mode ("char" or "newline").
+        chunk_size (int): The maximum size of the chunks in characters ("char" mode).
+        chunk_overlap (int): The maximum overlap between the chunks in characters ("char" mode).
+        separator (str): The separator the text is split on ("char" mode).
+
+        Returns:
+        None
+        """
+        if mode not in ("char", "newline"):
+            raise ValueError(f"Unsupported span chunking mode: {mode}")
+        if mode == "char" and chunk_overlap > chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) is larger than chunk_size ({chunk_size})")
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separator = "\n" if mode == "newline" else separator
+
+    # Function for iterating over the pieces of a text
+    def _pieces(self, text):
+        """
+        Yield the (start, end) offsets of the non-empty pieces between separators, with surrounding whitespace
+        trimmed.
+        """
+        separator_length = len(self.separator)
+        position = 0
+        while True:
+            index = text.find(self.separator, position)
+            end = len(text) if index == -1 else index
+
+            # Trim the whitespace by moving the offsets
+            start = position
+            while start < end and text[start].isspace():
+                start += 1
+            while end > start and text[end - 1].isspace():
+                end -= 1
+            if end > start:
+                yield start, end
+
+            if index == -1:
+                return
+            position = index + separator_length
+
+    # Function for iterating over the spans of a text
+    def iter_spans(self, text):
+        """
+        Yield the (start, end) offsets of the chunks of a text.
+        """
+
+        # Newline mode (one chunk per line)
+        if self.mode == "newline":
+            yield from self._pieces(text)
+            return
+
+        # Char mode (merge the pieces up to chunk_size, keep up to chunk_overlap)
+        window = deque()
+        for start, end in self._pieces(text):
+            if window and end - window[0][0] > self.chunk_size:
+                yield window[0][0], window[-1][1]
+
+                # Drop pieces from the front until the rest fits in the overlap and leaves room for the new piece
+                while window and (window[-1][1] - window[0][0] > self.chunk_overlap or end - window[0][0] > self.chunk_size):
+                    window.popleft()
+            window.append((start, end))
+
+        if window:
+            yield window[0][0], window[-1][1]
+
+    # Function for chunking documents
+    def split(self, documents):
+        """
+        Chunk the documents into spans.
+
+        Args:
+        documents (list): The documents to chunk.
+
+        Returns:
+        SpanChunks: The chunks.
+        """
+        chunks = SpanChunks(documents)
+        for doc_id, document in enumerate(documents):
+            for start, end in self.iter_spans(document.page_content):
+                chunks.append(doc_id, start, end)
+        return chunks
+
+    # Function for chunking documents into Documents
+    def split_documents(self, documents):
+        """
+        Chunk the documents and materialize the chunks as Documents.
+        """
+        return list(self.split(documents))
+
+
+# Process-wide registry of loaded tokenizers
+_TOKENIZERS = {}
+_TOKENIZERS_LOCK = threading.Lock()
+
+
+# Function for registering a tokenizer
+def register_tokenizer(key, tokenizer):
+    """
+    Register an already loaded tokenizer under a key, e.g. ("tiktoken", "gpt2").
+    """
+    with _TOKENIZERS_LOCK:
+        _TOKENIZERS[key] = tokenizer
+
+
+# Function for getting a tokenizer from the registry
+def get_tokenizer(key, factory):
+    """
+    Get a tokenizer from the registry, loading it with factory() the first time it is asked for.
+
+    The tokenizer is loaded once per process, so chunking calls do not reload the tokenizer or model state.
+
+    Args:
+    key (tuple): The key of the tokenizer, e.g. ("tiktoken", "gpt2").
+    factory (callable): The function that loads the tokenizer.
+
+    Returns:
+    object: The tokenizer.
+    """
+    tokenizer = _TOKENIZERS.get(key)
+    if tokenizer is None:
+        with _TOKENIZERS_LOCK:
+            tokenizer = _TOKENIZERS.get(key)
+            if tokenizer is None:
+                tokenizer = _TOKENIZERS[key] = factory()
+    return tokenizer
+
+
+# Function for loading a tiktoken encoding
+def _load_tiktoken(encoding_name):
+    """
+    Load a tiktoken encoding together with the byte length of each of its tokens.
+    """
+    import tiktoken
+
+    encoding = tiktoken.get_encoding(encoding_name)
+    return _with_token_lengths(encoding)
+
+
+# Function for computing the byte length of each token of an encoding
+def _with_token_lengths(encoding):
+    lengths = array("q", [0]) * encoding.n_vocab
+    for token in range(encoding.n_vocab):
+        try:
+            lengths[token] = len(encoding.decode_single_token_bytes(token))
+        except KeyError:
+            pass
+    return encoding, lengths
+
+
+# Function for loading a sentence-transformers model
+def _load_sentence_transformer(model_name):
+    """
+    Load the tokenizer and the maximum sequence length of a sentence-transformers model.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name)
+    return model.tokenizer, model.max_seq_length
+
+
+# Function for converting byte offsets into character offsets
+def _byte_to_char_offsets(text, data, byte_offsets):
+    """
+    Convert sorted byte offsets into the UTF-8 encoding of text into character offsets. An offset that falls inside
+    a multi-byte character is moved back to the start of that character.
+    """
+
+    # ASCII text (bytes and characters line up)
+    if len(data) == len(text):
+        return list(byte_offsets)
+
+    char_offsets = []
+    previous_byte, previous_char = 0, 0
+    for offset in byte_offsets:
+
+        # Move back to the start of the character
+        while 0 < offset < len(data) and data[offset] & 0xC0 == 0x80:
+            offset -= 1
+        previous_char += len(data[previous_byte:offset].decode("utf-8"))
+        previous_byte = offset
+        char_offsets.append(previous_char)
+
+    return char_offsets
+
+
+# Class for chunking text on token offsets
+class TokenChunker:
+    """
+    Chunker that splits text into windows of tokens and returns the windows as character spans.
+
+    Tokenizers are taken from the process-wide registry, and the documents are encoded in batches (one tokenizer
+    call per batch). The windows follow langchain's TokenTextSplitter and SentenceTransformersTokenTextSplitter:
+    chunk_size tokens per chunk, each chunk starting chunk_size - chunk_overlap tokens after the previous one.
+    The chunks are slices of the source text, so they are never re-decoded from tokens.
+    """
+
+    # Constructor function
+    def __init__(self, mode="token", chunk_size=None, chunk_overlap=None, encoding_name="gpt2", model_name="sentence-transformers/all-mpnet-base-v2", batch_size=64):
+        """
+        Initialize the TokenChunker class.
+
+        Args:
+        mode (str): "token" (tiktoken encoding) or "sentence" (sentence-transformers tokenizer).
+        chunk_size (int): The number of tokens per chunk (defaults to 4000 for "token" and to the maximum sequence
+            length of the model for "sentence").
+        chunk_overlap (int): The number of overlapping tokens (defaults to 200 for "token" and 50 for "sentence").
+        encoding_name (str): The tiktoken encoding ("token" mode).
+        model_name (str): The sentence-transformers model ("sentence" mode).
+        batch_size (int): The number of documents encoded per tokenizer call.
+
+        Returns:
+        None
+        """
+        if mode not in ("token", "sentence"):
+            raise ValueError(f"Unsupported token chunking mode: {mode}")
+        self.mode = mode
+        self.encoding_name = encoding_name
+        self.model_name = model_name
+        self.batch_size = batch_size
+
+        # Token mode
+        if mode == "token":
+            self.chunk_size = chunk_size or 4000
+            self.chunk_overlap = 200 if chunk_overlap is None else chunk_overlap
+
+        # Sentence mode
+        else:
+            tokenizer, max_seq_length = self.tokenizer
+            self.chunk_size = chunk_size or max_seq_length
+            self.chunk_overlap = 50 if chunk_overlap is None else chunk_overlap
+            if self.chunk_size > max_seq_length:
+                raise ValueError(f"The token limit of the model '{model_name}' is: {max_seq_length}. Argument chunk_size={self.chunk_size} > maximum token limit.")
+
+        if self.chunk_overlap >= self.chunk_size:
+            raise ValueError(f"chunk_overlap ({self.chunk_overlap}) must be smaller than chunk_size ({self.chunk_size})")
+
+    # Property for getting the tokenizer from the registry
+    @property
+    def tokenizer(self):
+        if self.mode == "token":
+            return get_tokenizer(("tiktoken", self.encoding_name), lambda: _load_tiktoken(self.encoding_name))
+        return get_tokenizer(("sentence-transformers", self.model_name), lambda: _load_sentence_transformer(self.model_name))
+
+    # Function for getting the token windows
+    def _windows(self, n_tokens):
+        """
+        Yield the (start, end) token indices of the windows over n_tokens tokens.
+        """
+        start = 0
+        while start < n_tokens:
+            end = min(start + self.chunk_size, n_tokens)
+            yield start, end
+            if end == n_tokens:
+                return
+            start += self.chunk_size - self.chunk_overlap
+
+    # Function for computing the spans of a batch of texts (tiktoken)
+    def _token_spans(self, texts):
+        encoding, lengths = self.tokenizer
+        spans = []
+        for text, tokens in zip(texts, encoding.encode_ordinary_batch(texts)):
+
+            # Byte offset of the start of every token, plus the end of the text
+            offsets = list(accumulate(map(lengths.__getitem__, tokens), initial=0))
+            windows = list(self._windows(len(tokens)))
+            boundaries = sorted({offsets[i] for window in windows for i in window})
+            data = text.encode("utf-8")
+            to_char = dict(zip(boundaries, _byte_to_char_offsets(text, data, boundaries)))
+            spans.append([(to_char[offsets[start]], to_char[offsets[end]]) for start, end in windows])
+        return spans
+
+    # Function for computing the spans of a batch of texts (sentence-transformers)
+    def _sentence_spans(self, texts):
+        tokenizer, max_seq_length = self.tokenizer
+        encoded = tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True, return_attention_mask=False, verbose=False)
+        spans = []
+        for offsets in encoded["offset_mapping"]:
+            spans.append([(offsets[start][0], offsets[end - 1][1]) for start, end in self._windows(len(offsets))])
+        return spans
+
+    # Function for chunking documents
+    def split(self, documents):
+        """
+        Chunk the documents into spans, encoding batch_size documents per tokenizer call.
+
+        Args:
+        documents (list): The documents to chunk.
+
+        Returns:
+        SpanChunks: The chunks.
+        """
+        chunks = SpanChunks(documents)
+        compute_spans = self._token_spans if self.mode == "token" else self._sentence_spans
+        for batch_start in range(0, len(documents), self.batch_size):
+            texts = [document.page_content for document in documents[batch_start:batch_start + self.batch_size]]
+            for doc_id, spans in enumerate(compute_spans(texts), start=batch_start):
+                for start, end in spans:
+                    chunks.append(doc_id, start, end)
+        return chunks
+
+    # Function for chunking documents into Documents
+    def split_documents(self, documents):
+        """
+        Chunk the documents and materialize the chunks as Documents.
+        """
+        return list(self.split(documents))
@@ -0,0 +1,193 @@
+# Import the libraries
+import itertools
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from langchain.schema import Document
+
+
+# Separator used to clean a batch of texts in one pass (removed from the texts beforehand)
+_SEPARATOR = "\x00"
+
+# Control characters (except tab, newline and carriage return) and zero-width characters
+_CONTROL_CHARACTERS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f\u200b-\u200f\u2060\ufeff]")
+
+# Runs of exclamation or question marks (e.g. "!!!"). Other marks are kept: they carry markdown structure
+# ("###", "|---|") or meaning ("...")
+_REPEATED_PUNCTUATION = re.compile(r"([!?])\1{2,}")
+
+# Whitespace
+_HORIZONTAL_WHITESPACE = re.compile(r"[ \t\f\v\xa0]+")
+_TRAILING_WHITESPACE = re.compile(r" *\r?\n *")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+# Digits (page numbers in headers and footers)
+_DIGITS = re.compile(r"\d+")
+
+# Words and punctuation
+_TOKENS = re.compile(r"\w+|[^\w\s]")
+
+
+# Class for cleaning text
+class TextCleaner:
+    """
+    Configurable pipeline of text normalization stages, applied in this order:
+        1. unicode normalization (e.g. NFKC),
+        2. character filtering (control and zero-width characters, runs of repeated punctuation),
+        3. boilerplate stripping (lines matching boilerplate_patterns, and headers and footers repeated across the
+           pages of the same source; only paged documents, e.g. PDF pages, are compared, as the rows of a CSV file or
+           the blocks of a text file repeat their first and last lines by design),
+        4. whitespace collapse (runs of spaces, trailing spaces, more than one blank line).
+
+    The regular expressions are compiled once, and a batch of texts is joined and run through each regex in a single
+    call instead of once per text.
+    """
+
+    # Constructor function
+    def __init__(self, unicode_form="NFKC", filter_characters=True, strip_boilerplate=True, collapse_whitespace=True, boilerplate_patterns=(), header_footer_ratio=0.5, header_footer_min_pages=3, batch_size=256):
+        """
+        Initialize the TextCleaner class.
+
+        Args:
+        unicode_form (str): The unicode normalization form (NFC, NFKC, NFD, NFKD), or None to skip it.
+        filter_characters (bool): Whether to remove control characters and collapse repeated punctuation.
+        strip_boilerplate (bool): Whether to remove boilerplate lines and repeated headers and footers.
+        collapse_whitespace (bool): Whether to collapse the whitespace.
+        boilerplate_patterns (list): Regular expressions of lines to remove (e.g. r"Confidential.*").
+        header_footer_ratio (float): The share of the pages of a source a first or last line must appear on to be
+            removed as a header or footer.
+        header_footer_min_pages (int): The minimum number of pages of a source to look for headers and footers.
+        batch_size (int): The number of documents cleaned together.
+
+        Returns:
+        None
+        """
+        self.unicode_form = unicode_form
+        self.filter_characters = filter_characters
+        self.strip_boilerplate = strip_boilerplate
+        self.collapse_whitespace = collapse_whitespace
+        self.header_footer_ratio = header_footer_ratio
+        self.header_footer_min_pages = header_footer_min_pages
+        self.batch_size = batch_size
+        self.boilerplate = re.compile("|".join(f"(?:{pattern})" for pattern in boilerplate_patterns)) if boilerplate_patterns else None
+
+    # Function for cleaning a batch of texts
+    def clean_texts(self, texts, sources=None):
+        """
+        Clean a batch of texts.
+
+        Args:
+        texts (list): The texts.
+        sources (list): The source of each text, used to find headers and footers repeated across pages (None for
+            texts that are not pages, which are never compared).
+
+        Returns:
+        list: The cleaned texts.
+        """
+        if not texts:
+            return []
+
+        # Join the batch
+        text = _SEPARATOR.join(t.replace(_SEPARATOR, "") for t in texts)
+
+        # Unicode normalization
+        if self.unicode_form:
+            text = unicodedata.normalize(self.unicode_form, text)
+
+        # Character filtering
+        if self.filter_characters:
+            text = _CONTROL_CHARACTERS.sub(lambda m: m.group() if m.group() == _SEPARATOR else "", text)
+            text = _REPEATED_PUNCTUATION.sub(r"\1", text)
+
+        # Boilerplate stripping (line based, so done per text)
+        if self.strip_boilerplate:
+            texts = self._strip_boilerplate(text.split(_SEPARATOR), sources)
+            text = _SEPARATOR.join(texts)
+
+        # Whitespace collapse
+        if self.collapse_whitespace:
+            text = _HORIZONTAL_WHITESPACE.sub(" ", text)
+            text = _TRAILING_WHITESPACE.sub("\n", text)
+            text = _BLANK_LINES.sub("\n\n", text)
+
+        return [t.strip() for t in text.split(_SEPARATOR)]
+
+    # Function for stripping the boilerplate
+    def _strip_boilerplate(self, texts, sources):
+        """
+        Remove the lines matching the boilerplate patterns and the first and last lines repeated across the pages of
+        the same source. Page numbers are ignored when comparing lines.
+        """
+        pages = [text.split("\n") for text in texts]
+
+        # Boilerplate patterns
+        if self.boilerplate is not None:
+            pages = [[line for line in lines if not self.boilerplate.fullmatch(line.strip())] for lines in pages]
+
+        # Headers and footers
+        if sources is not None:
+            by_source = defaultdict(list)
+            for index, source in enumerate(sources):
+                if source is not None:
+                    by_source[source].append(index)
+
+            for indices in by_source.values():
+                if len(indices) < self.header_footer_min_pages:
+                    continue
+
+                # Count the first and last lines of each page
+                counts = Counter()
+                for index in indices:
+                    edges = self._edge_lines(pages[index])
+                    counts.update(set(_DIGITS.sub("#", pages[index][i].strip()) for i in edges))
+                repeated = {line for line, count in counts.items() if line and count >= self.header_footer_ratio * len(indices)}
+
+                # Remove them
+                if repeated:
+                    for index in indices:
+                        edges = {i for i in self._edge_lines(pages[index]) if _DIGITS.sub("#", pages[index][i].strip()) in repeated}
+                        pages[index] = [line for i, line in enumerate(pages[index]) if i not in edges]
+
+        return ["\n".join(lines) for lines in pages]
+
+    # Function for getting the indices of the first and last non-empty lines of a page
+    @staticmethod
+    def _edge_lines(lines):
+        non_empty = [i for i, line in enumerate(lines) if line.strip()]
+        return set(non_empty[:1] + non_empty[-1:])
+
+    # Function for cleaning documents
+    def clean_documents(self, documents):
+        """
+        Clean documents batch_size at a time. A list gives a list, any other iterable gives a generator.
+
+        Args:
+        documents (list | Iterator[Document]): The documents.
+
+        Returns:
+        list | Iterator[Document]: The cleaned documents (with the same metadata).
+        """
+        if isinstance(documents, (list, tuple)):
+            return list(self._iter_clean(documents))
+        return self._iter_clean(documents)
+
+    # Function for cleaning a stream of documents
+    def _iter_clean(self, documents):
+        documents = iter(documents)
+        while True:
+            batch = list(itertools.islice(documents, self.batch_size))
+            if not batch:
+                return
+            # Only the pages of a document can share headers and footers
+            sources = [document.metadata.get("source") if "page" in document.metadata else None for document in batch]
+            texts = self.clean_texts([document.page_content for document in batch], sources)
+            for document, text in zip(batch, texts):
+                yield Document(page_content=text, metadata=document.metadata)
+
+
+# Function for tokenizing a text
+def tokenize(text):
+    """
+    Split a text into lowercase word and punctuation tokens.
+    """
+    return _TOKENS.findall(text.lower())
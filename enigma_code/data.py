@@ -1,5 +1,13 @@
 
 # Import the libraries
+import csv
+import glob
+import itertools
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 import langchain
 import langchain_community
 from langchain.document_loaders import *
@@ -8,74 +16,386 @@ import mysql.connector
 from sqlalchemy import create_engine
 from sqlalchemy import text
 from langchain.schema import Document
+from langchain_core.document_loaders import BaseLoader
+from enigma_code.chunking import SpanChunker, TokenChunker
+from enigma_code.cleaning import TextCleaner, tokenize
+from enigma_code.dedup import MinHashDeduplicator
+from enigma_code.text_source import MappedTextFile
+
+
+# Whitespace between JSON values
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+# Function for ingesting a single file (runs inside the worker processes)
+def _ingest_file(file_path, chunk_type, chunk_size, chunk_overlap, cleaner=None):
+    """
+    Load, clean (with the cleaner of the calling DataHandler) and chunk a single file.
+
+    Returns:
+    tuple: The chunks, the elapsed time in seconds and the error message (None on success).
+    """
+    start = time.perf_counter()
+    try:
+        handler = DataHandler(cleaner=cleaner)
+        documents = handler.load_dataset(file_path)
+        documents = handler.clean_dataset(documents)
+        chunks = handler.chunk_dataset(documents, chunk_type, chunk_size, chunk_overlap)
+        return chunks, time.perf_counter() - start, None
+    except Exception as e:
+        return [], time.perf_counter() - start, f"{type(e).__name__}: {e}"
 
 
 # Class for handling data
 class DataHandler:
 
+    # File extensions that can be ingested from a directory
+    SUPPORTED_EXTENSIONS = ("pdf", "docx", "txt", "csv", "json", "xml")
+
     # Constructor function 
-    def __init__(self):
-        pass
+    def __init__(self, cleaner=None):
+        """
+        Initialize the DataHandler class.
 
-    # Function for loading dataset from various sources
-    def load_dataset(self, file_path):
+        Args:
+        cleaner (TextCleaner): The cleaning pipeline used by clean_dataset (defaults to TextCleaner()).
+
+        Returns:
+        None
         """
-        Load the dataset based on the extension of the file.
+        self.cleaner = cleaner or TextCleaner()
+        self.ingestion_report = []
+        self.dedup_report = {}
+
+    # Function for getting the loader of a file
+    def _get_loader(self, file_path):
         """
-        
+        Get the document loader based on the extension of the file.
+
+        Args:
+        file_path (str): The path to the file.
+
+        Returns:
+        BaseLoader: The document loader.
+        """
+
         # Get the extension of the file
         extension = file_path.split(".")[-1]
 
         # PDF file
         if extension == "pdf":
-            loader = langchain.document_loaders.PDFLoader(file_path)                             
+            loader = PyPDFLoader(file_path)
 
         # Word file
         elif extension == "docx":
-            loader = langchain.document_loaders.DocxLoader(file_path)                          
+            loader = Docx2txtLoader(file_path)
 
         # Text file
         elif extension == "txt":
-            loader = langchain.document_loaders.TextLoader(file_path)                           
+            loader = TextLoader(file_path)
 
         # CSV file
         elif extension == "csv":
-            loader = langchain.data_loaders.CSVLoader(file_path)                               
+            loader = CSVLoader(file_path)
 
         # JSON file
         elif extension == "json":
-            loader = langchain.data_loaders.JSONLoader(file_path)                               
+            loader = JSONLoader(file_path, jq_schema=".", text_content=False)
 
         # XML file
         elif extension == "xml":
-            loader = langchain.data_loaders.XMLLoader(file_path)                               
-
-        # Database
-        elif extension == "db":
-            loader = langchain.data_loaders.DatabaseLoader(file_path)                           
+            loader = UnstructuredXMLLoader(file_path)
 
         # Else
         else:
-            raise Exception("Unsupported file format")                                         
-        
+            raise Exception("Unsupported file format")
+
+        return loader
+
+    # Function for loading dataset from various sources
+    def load_dataset(self, file_path, lazy=False):
+        """
+        Load the dataset based on the extension of the file.
+
+        Args:
+        file_path (str): The path to the file.
+        lazy (bool): Whether to return a generator that yields the documents one at a time instead of a list.
+
+        Returns:
+        list | Iterator[Document]: The loaded documents.
+        """
+
+        # Streaming mode
+        if lazy:
+            return self.iter_dataset(file_path)
+
+        # Get the loader of the file
+        loader = self._get_loader(file_path)
+
         # Load the dataset
-        dataset = loader.load()                                                                
+        dataset = loader.load()
+
+        return dataset
+
+    # Function for lazily loading the dataset
+    def iter_dataset(self, file_path):
+        """
+        Yield the documents of a file one at a time, so that only the current page, row or record is held in memory.
+
+        PDF, CSV and JSON files are iterated page by page, row by row and record by record, and text files are
+        memory-mapped and read block by block. Other formats use the loader's own lazy_load, and fall back to load()
+        only when the loader has no lazy implementation.
+
+        Args:
+        file_path (str): The path to the file.
+
+        Yields:
+        Document: The next document of the file.
+        """
+
+        # Get the extension of the file
+        extension = file_path.split(".")[-1]
+
+        # PDF file (one document per page)
+        if extension == "pdf":
+            yield from self._iter_pdf_pages(file_path)
+
+        # CSV file (one document per row)
+        elif extension == "csv":
+            yield from self._iter_csv_rows(file_path)
+
+        # JSON file (one document per top-level record)
+        elif extension in ("json", "jsonl"):
+            yield from self._iter_json_records(file_path)
+
+        # Text file (memory-mapped, one document per block of paragraphs)
+        elif extension == "txt":
+            yield from MappedTextFile(file_path).iter_documents()
+
+        # Other files
+        else:
+            loader = self._get_loader(file_path)
+
+            # Use the native lazy loader if there is one
+            if type(loader).lazy_load is not BaseLoader.lazy_load:
+                yield from loader.lazy_load()
+            else:
+                yield from loader.load()
+
+    # Function for iterating over the pages of a PDF file
+    def _iter_pdf_pages(self, file_path):
+        """
+        Yield one document per page of a PDF file.
+        """
+        import pypdf
+
+        # Read the pages one at a time
+        with open(file_path, "rb") as f:
+            reader = pypdf.PdfReader(f)
+            for page_number, page in enumerate(reader.pages):
+                yield Document(page_content=page.extract_text(), metadata={"source": file_path, "page": page_number})
+
+    # Function for iterating over the rows of a CSV file
+    def _iter_csv_rows(self, file_path):
+        """
+        Yield one document per row of a CSV file, formatted like CSVLoader ("column: value" lines).
+        """
+
+        # Read the rows one at a time
+        with open(file_path, newline="") as f:
+            for row_number, row in enumerate(csv.DictReader(f)):
+                content = "\n".join(f"{str(key).strip()}: {str(value).strip()}" for key, value in row.items())
+                yield Document(page_content=content, metadata={"source": file_path, "row": row_number})
+
+    # Function for iterating over the records of a JSON file
+    def _iter_json_records(self, file_path, block_size=1 << 16, max_record_size=64 << 20):
+        """
+        Yield one document per record of a JSON file without parsing the whole file at once.
+
+        A top-level array yields one document per element, JSON lines (or concatenated JSON values) yield one
+        document per value, and any other top-level value yields a single document. The buffer is decoded from a
+        moving position and only compacted once its records are consumed, and when a record is incomplete the next
+        read is as large as the pending text, so a large record is decoded a logarithmic number of times instead of
+        once per block. A record (or invalid text) longer than max_record_size characters raises a ValueError
+        instead of buffering the rest of the file.
+        """
+        decoder = json.JSONDecoder()
+        buffer = ""
+        position = 0
+        record_number = 0
+        in_array = None
+        read_size = block_size
+
+        with open(file_path, "r") as f:
+            while True:
+                block = f.read(read_size)
+                buffer = buffer[position:] + block
+                position = 0
+
+                # Decode as many complete values as the buffer holds
+                while True:
+                    position = _JSON_WHITESPACE.match(buffer, position).end()
+                    if in_array is None and position < len(buffer):
+                        in_array = buffer[position] == "["
+                        if in_array:
+                            position += 1
+                            continue
+                    if in_array and buffer[position:position + 1] in (",", "]"):
+                        position += 1
+                        continue
+                    if position == len(buffer):
+                        break
+                    try:
+                        record, end = decoder.raw_decode(buffer, position)
+                    except json.JSONDecodeError:
+                        # Incomplete value, read more of the file (or fail at the end of the file)
+                        if not block:
+                            raise
+                        break
+                    # A value ending at the end of the buffer may continue in the next block (e.g. a number)
+                    if end == len(buffer) and block:
+                        break
+                    position = end
+                    content = record if isinstance(record, str) else json.dumps(record)
+                    yield Document(page_content=content, metadata={"source": file_path, "seq_num": record_number})
+                    record_number += 1
+
+                # End of the file
+                if not block:
+                    break
+
+                # Read at least as much as is pending, so an incomplete record is not decoded once per block
+                pending = len(buffer) - position
+                if pending > max_record_size:
+                    raise ValueError(f"{file_path}: record {record_number} is longer than {max_record_size} characters or is not valid JSON")
+                read_size = max(block_size, pending)
+
+    # Function for listing the files of a directory or glob pattern
+    def list_files(self, path):
+        """
+        List the supported files of a directory (recursively) or of a glob pattern, in a deterministic order.
 
-        return dataset                                                                         
+        Args:
+        path (str): A directory or a glob pattern (e.g. "docs/**/*.pdf").
+
+        Returns:
+        list: The sorted file paths.
+        """
+
+        # Directory
+        if os.path.isdir(path):
+            path = os.path.join(path, "**", "*")
+
+        # Keep the supported files only
+        files = [f for f in glob.glob(path, recursive=True) if os.path.isfile(f) and f.split(".")[-1] in self.SUPPORTED_EXTENSIONS]
+
+        return sorted(files)
+
+    # Function for ingesting a directory in parallel
+    def ingest_directory(self, path, chunk_type, chunk_size, chunk_overlap, max_workers=None):
+        """
+        Load, clean and chunk every file of a directory or glob pattern in a pool of worker processes.
+
+        The chunks are yielded file by file in the order of list_files, regardless of which worker finishes first.
+        A file that fails is recorded in self.ingestion_report and skipped, the rest of the batch carries on.
+
+        Args:
+        path (str): A directory or a glob pattern.
+        chunk_type (str): The type of chunking to be performed (see chunk_dataset).
+        chunk_size (int): The size of the chunks.
+        chunk_overlap (int): The overlap between the chunks.
+        max_workers (int): The number of worker processes (defaults to the number of CPUs).
+
+        Yields:
+        Document: The chunks of the files.
+        """
+
+        # List the files and reset the report
+        files = self.list_files(path)
+        self.ingestion_report = []
+
+        for file_path, chunks, seconds, error in self.ingest_files(files, chunk_type, chunk_size, chunk_overlap, max_workers):
+
+            # Report the file
+            self.ingestion_report.append({"file_path": file_path, "seconds": seconds, "chunks": len(chunks), "error": error})
+
+            yield from chunks
+
+    # Function for ingesting a list of files in parallel
+    def ingest_files(self, files, chunk_type, chunk_size, chunk_overlap, max_workers=None):
+        """
+        Load, clean and chunk the given files in a pool of worker processes.
+
+        Args:
+        files (list): The file paths.
+        chunk_type (str): The type of chunking to be performed (see chunk_dataset).
+        chunk_size (int): The size of the chunks.
+        chunk_overlap (int): The overlap between the chunks.
+        max_workers (int): The number of worker processes (defaults to the number of CPUs).
+
+        Yields:
+        tuple: (file_path, chunks, seconds, error) for each file, in the order of files.
+        """
+        max_workers = max_workers or os.cpu_count() or 1
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+
+            # Keep a bounded window of files in flight so finished files do not pile up in memory
+            window = 2 * max_workers
+            futures = [executor.submit(_ingest_file, f, chunk_type, chunk_size, chunk_overlap, self.cleaner) for f in files[:window]]
+            next_file = len(futures)
+
+            for index, file_path in enumerate(files):
+                chunks, seconds, error = futures[index].result()
+                futures[index] = None
+
+                # Refill the window
+                if next_file < len(files):
+                    futures.append(executor.submit(_ingest_file, files[next_file], chunk_type, chunk_size, chunk_overlap, self.cleaner))
+                    next_file += 1
+
+                yield file_path, chunks, seconds, error
 
     # Function for cleaning the dataset
     def clean_dataset(self, dataset):
         """
         Clean the dataset by removing the unwanted characters.
+
+        Args:
+        dataset (str | list | Iterator[Document]): A text, a list of documents or a stream of documents.
+
+        Returns:
+        str | list | Iterator[Document]: The cleaned text or documents (a stream stays a stream).
         """
-        pass
+
+        # Text
+        if isinstance(dataset, str):
+            return self.cleaner.clean_texts([dataset])[0]
+
+        # Documents
+        return self.cleaner.clean_documents(dataset)
 
     # Function for preprocessing the dataset
     def preprocess_dataset(self, dataset):
         """
         Preprocess the dataset by tokenizing the text.
+
+        Args:
+        dataset (str | list | Iterator[Document]): A text, a list of documents or a stream of documents.
+
+        Returns:
+        list | Iterator[list]: The tokens of the cleaned text, or the tokens of each cleaned document.
         """
-        pass
+
+        # Text
+        if isinstance(dataset, str):
+            return tokenize(self.clean_dataset(dataset))
+
+        # Documents
+        tokens = (tokenize(document.page_content) for document in self.clean_dataset(dataset))
+        if isinstance(dataset, (list, tuple)):
+            return list(tokens)
+        return tokens
 
     # Function for chunking the dataset
     def chunk_dataset(self, documents, chunk_type, chunk_size, chunk_overlap):
@@ -83,47 +403,123 @@ class DataHandler:
         This function chunks the dataset.
 
         Args:
-        dataset (str): The dataset to be chunked.
+        dataset (list | Iterator[Document]): The dataset to be chunked. If an iterator is given (e.g. from
+            load_dataset(..., lazy=True)), a generator is returned that yields the chunks as they are produced.
         chunk_type (str): The type of chunking to be performed (e.g., char, word, sentence).
 
         """
-        
+
+        # Get the chunker
+        chunker = self._get_chunker(chunk_type, chunk_size, chunk_overlap)
+
+        # Streaming mode
+        if not isinstance(documents, (list, tuple)):
+            return self._iter_chunks(chunker, documents)
+
+        # Chunk the dataset
+        chunks = chunker(documents)
+
+        return chunks
+
+    # Function for chunking the dataset into offset spans
+    def chunk_spans(self, documents, chunk_type, chunk_size=None, chunk_overlap=None):
+        """
+        Chunk the dataset into (doc_id, start, end) spans without copying the text of the chunks.
+
+        Args:
+        documents (list): The documents to be chunked.
+        chunk_type (str): The type of chunking to be performed ("char" or "newline").
+        chunk_size (int): The size of the chunks ("char" only).
+        chunk_overlap (int): The overlap between the chunks ("char" only).
+
+        Returns:
+        SpanChunks: The chunks, materialized as Documents only when they are accessed.
+        """
+        if chunk_type == "char":
+            return SpanChunker("char", chunk_size=chunk_size, chunk_overlap=chunk_overlap).split(documents)
+        return SpanChunker(chunk_type).split(documents)
+
+    # Function for removing near-duplicate chunks
+    def deduplicate_dataset(self, chunks, threshold=0.8, **kwargs):
+        """
+        Remove the near-duplicate chunks before they are embedded (see MinHashDeduplicator).
+
+        Args:
+        chunks (list | Iterator[Document]): The chunks.
+        threshold (float): The estimated Jaccard similarity from which two chunks are duplicates.
+        **kwargs: The other arguments of MinHashDeduplicator.
+
+        Returns:
+        list: The kept chunks. The counts and the dedup ratio are stored in self.dedup_report.
+        """
+        deduplicator = MinHashDeduplicator(threshold=threshold, **kwargs)
+        kept_chunks = deduplicator.deduplicate(list(chunks))
+        self.dedup_report = deduplicator.stats
+        return kept_chunks
+
+    # Function for getting the chunker of a chunk type
+    def _get_chunker(self, chunk_type, chunk_size, chunk_overlap):
+        """
+        Build the splitter once and return a function that chunks a list of documents with it.
+        """
+
         # Character chunking
         if chunk_type == "char":
-            splitter = langchain.text_splitter.CharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)          
-            chunks = splitter.split_documents(documents)  
+            splitter = SpanChunker("char", chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            chunker = splitter.split_documents
 
         # Token chunking
         elif chunk_type == "token":
-            splitter = langchain.text_splitter.TokenTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-            chunks = splitter.split_documents(documents)  
+            splitter = TokenChunker("token", chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            chunker = splitter.split_documents
 
         # Sentence chunking
         elif chunk_type == "sentence":
-            splitter = langchain.text_splitter.SentenceTransformersTokenTextSplitter()
-            chunks = splitter.split_documents(documents)  
+            splitter = TokenChunker("sentence", chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            chunker = splitter.split_documents
 
         # HTML-Headers chunking
         elif chunk_type == "html-headers":
             splitter = langchain.text_splitter.HTMLHeaderTextSplitter(headers_to_split_on=["h1", "h2", "h3", "h4", "h5", "h6"])
-            chunks = [splitter.split_text(doc.page_content) for doc in documents]
+            chunker = lambda documents: self._split_headers(splitter, documents)
 
         # Markdown-Headers chunking
         elif chunk_type == "markdown-headers":
             splitter = langchain.text_splitter.MarkdownHeaderTextSplitter(headers_to_split_on=[("#", "h1"), ("##", "h2"), ("###", "h3"), ("####", "h4"), ("#####", "h5"), ("######", "h6")])
-            chunks = [splitter.split_text(doc.page_content) for doc in documents]
+            chunker = lambda documents: self._split_headers(splitter, documents)
 
         # Newline chunking
         elif chunk_type == "newline":
-            chunks = [i.page_content.split("\n") for i in documents]
-            chunks = [Document(page_content=chunk) for chunk in chunks[0]]
+            splitter = SpanChunker("newline")
+            chunker = splitter.split_documents
 
         # Else
         else:
-            raise Exception("Unsupported chunk type")                                                                                   
-        
-        return chunks                                                                                                                                                                                                    
-   
+            raise Exception("Unsupported chunk type")
+
+        return chunker
+
+    # Function for chunking documents with a header splitter
+    @staticmethod
+    def _split_headers(splitter, documents):
+        """
+        Split each document on its headers and return the chunks of all the documents in one flat list. Each chunk
+        keeps the metadata of its document (e.g. the source) next to its headers.
+        """
+        return [Document(page_content=chunk.page_content, metadata={**doc.metadata, **chunk.metadata}) for doc in documents for chunk in splitter.split_text(doc.page_content)]
+
+    # Function for chunking a stream of documents
+    def _iter_chunks(self, chunker, documents, batch_size=64):
+        """
+        Chunk the documents batch_size at a time and yield the chunks as they are produced.
+        """
+        documents = iter(documents)
+        while True:
+            batch = list(itertools.islice(documents, batch_size))
+            if not batch:
+                return
+            yield from chunker(batch)
+
 
 
 from sqlalchemy import create_engine, text
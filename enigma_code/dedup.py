@@ -0,0 +1,148 @@
+# Import the libraries
+import json
+import re
+import zlib
+from collections import defaultdict
+import numpy as np
+from langchain.schema import Document
+
+
+# Mersenne prime used by the permutations (2^61 - 1)
+_PRIME = np.uint64((1 << 61) - 1)
+
+# Words
+_WORDS = re.compile(r"\w+")
+
+# Metadata fields used to point at the source of a chunk
+_POINTER_FIELDS = ("source", "page", "row", "seq_num", "doc_id", "start_index", "end_index")
+
+
+# Class for removing near-duplicate chunks
+class MinHashDeduplicator:
+    """
+    Near-duplicate chunk elimination with MinHash signatures and LSH banding.
+
+    Each chunk is reduced to the set of its word shingles, and a MinHash signature of num_perm values estimates the
+    Jaccard similarity between two chunks as the share of equal values. The signatures are cut into bands, chunks
+    sharing a band are candidates, and candidates whose estimated similarity reaches the threshold are duplicates.
+
+    The first chunk of a group of duplicates is kept. Its metadata gets the number of duplicates dropped in its
+    favour ("duplicate_count") and a JSON list of pointers to their sources ("duplicate_sources"), so every source
+    stays citable. JSON is used because some vector stores (e.g. Chroma) only accept scalar metadata.
+    """
+
+    # Constructor function
+    def __init__(self, threshold=0.8, num_perm=128, bands=32, shingle_size=5, seed=1):
+        """
+        Initialize the MinHashDeduplicator class.
+
+        Args:
+        threshold (float): The estimated Jaccard similarity from which two chunks are duplicates.
+        num_perm (int): The number of hash permutations (length of the signatures).
+        bands (int): The number of LSH bands (must divide num_perm). More bands find more candidates.
+        shingle_size (int): The number of words per shingle.
+        seed (int): The seed of the permutations.
+
+        Returns:
+        None
+        """
+        if num_perm % bands:
+            raise ValueError(f"bands ({bands}) must divide num_perm ({num_perm})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.stats = {}
+
+        # Permutations a * x + b mod prime (a and b below 2^32 so that a * x fits in 64 bits)
+        generator = np.random.RandomState(seed)
+        self._a = generator.randint(1, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self._b = generator.randint(0, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+
+    # Function for computing the shingle hashes of a text
+    def _shingles(self, text):
+        words = _WORDS.findall(text.lower())
+        if len(words) < self.shingle_size:
+            shingles = {" ".join(words)}
+        else:
+            shingles = {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+        return np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+
+    # Function for computing the signature of a text
+    def signature(self, text):
+        """
+        Compute the MinHash signature of a text.
+
+        Returns:
+        np.ndarray: The signature (num_perm uint64 values).
+        """
+        hashes = self._shingles(text)
+        return ((self._a * hashes + self._b) % _PRIME).min(axis=1)
+
+    # Function for finding the duplicates
+    def find_duplicates(self, texts):
+        """
+        Find the near-duplicate texts.
+
+        Args:
+        texts (list): The texts.
+
+        Returns:
+        list: For each text, the index of the text it duplicates (itself if it is kept).
+        """
+        signatures = np.stack([self.signature(text) for text in texts]) if texts else np.empty((0, self.num_perm), dtype=np.uint64)
+        representative = list(range(len(texts)))
+
+        # Band buckets
+        buckets = defaultdict(list)
+        for index in range(len(texts)):
+            candidates = set()
+            keys = [(band, signatures[index, band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+            for key in keys:
+                candidates.update(buckets[key])
+
+            # Compare with the kept candidates, in order
+            for candidate in sorted(candidates):
+                if np.mean(signatures[index] == signatures[candidate]) >= self.threshold:
+                    representative[index] = candidate
+                    break
+            else:
+                for key in keys:
+                    buckets[key].append(index)
+
+        return representative
+
+    # Function for removing the duplicates
+    def deduplicate(self, chunks):
+        """
+        Remove the near-duplicate chunks.
+
+        Args:
+        chunks (list): The chunks (Documents).
+
+        Returns:
+        list: The kept chunks, with pointers to the sources of their duplicates. The counts and the dedup ratio
+        (share of chunks dropped) are stored in self.stats.
+        """
+        representative = self.find_duplicates([chunk.page_content for chunk in chunks])
+
+        # Gather the pointers of the duplicates
+        duplicates = defaultdict(list)
+        for index, kept in enumerate(representative):
+            if kept != index:
+                duplicates[kept].append({field: chunks[index].metadata[field] for field in _POINTER_FIELDS if field in chunks[index].metadata})
+
+        # Keep the representatives
+        kept_chunks = []
+        for index, chunk in enumerate(chunks):
+            if representative[index] != index:
+                continue
+            if index in duplicates:
+                metadata = {**chunk.metadata, "duplicate_count": len(duplicates[index]), "duplicate_sources": json.dumps(duplicates[index], default=str)}
+                chunk = Document(page_content=chunk.page_content, metadata=metadata)
+            kept_chunks.append(chunk)
+
+        self.stats = {"total": len(chunks), "kept": len(kept_chunks), "dropped": len(chunks) - len(kept_chunks), "dedup_ratio": (len(chunks) - len(kept_chunks)) / len(chunks) if chunks else 0.0}
+
+        return kept_chunks
@@ -0,0 +1,176 @@
+# Import the libraries
+import hashlib
+import sqlite3
+import threading
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from enigma_code.query_cache import embed_queries
+
+
+# Class for caching embeddings on disk
+class CachedEmbeddings(Embeddings):
+    """
+    Embedding model wrapper that caches the embeddings on disk, keyed by (model name, text hash).
+
+    The cache is a SQLite database, so it is shared safely between threads and processes (WAL journal, one
+    connection per thread). Vectors are stored as raw float32 (or float16) bytes. Every lookup is a bulk query and
+    every miss of a call is embedded in a single request to the underlying model. When the stored vectors exceed
+    max_bytes, the least recently used ones are evicted. The size of the stored vectors is kept as a running total
+    (updated in the transaction of each insert and delete), so checking it does not scan the table.
+    """
+
+    # Number of parameters per SQL statement
+    BATCH_SIZE = 500
+
+    # Constructor function
+    def __init__(self, embedding, cache_path, model_name=None, max_bytes=1 << 30, dtype="float32"):
+        """
+        Initialize the CachedEmbeddings class.
+
+        Args:
+        embedding (Embeddings): The embedding model to cache.
+        cache_path (str): The path to the SQLite cache file.
+        model_name (str): The name the embeddings are cached under (defaults to the class and model of embedding).
+        max_bytes (int): The maximum size of the stored vectors in bytes.
+        dtype (str): The storage type of the vectors ("float32" or "float16").
+
+        Returns:
+        None
+        """
+        self.embedding = embedding
+        self.cache_path = cache_path
+        self.model_name = model_name or self._default_model_name(embedding)
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+
+        # Create the table
+        with self._connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS embeddings (model TEXT NOT NULL, text_hash BLOB NOT NULL, vector BLOB NOT NULL, last_access REAL NOT NULL, PRIMARY KEY (model, text_hash))")
+            connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+            connection.execute("CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)")
+            connection.execute("INSERT OR IGNORE INTO cache_size SELECT 0, COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings")
+
+    # Function for getting the default model name
+    @staticmethod
+    def _default_model_name(embedding):
+        model = getattr(embedding, "model", None) or getattr(embedding, "model_name", None)
+        return f"{type(embedding).__name__}:{model}" if model else type(embedding).__name__
+
+    # Function for getting the connection of the current thread
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.cache_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    # Function for hashing a text
+    @staticmethod
+    def _hash(text):
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    # Function for embedding texts through the cache
+    def _embed(self, texts, kind, embed):
+        """
+        Look the texts up in bulk, embed the misses in one call and store them.
+
+        Args:
+        texts (list): The texts.
+        kind (str): "document" or "query" (some models embed queries differently).
+        embed (callable): The function embedding a list of texts.
+
+        Returns:
+        list: The embeddings.
+        """
+        model = f"{self.model_name}:{kind}"
+        hashes = [self._hash(text) for text in texts]
+        connection = self._connection()
+        now = time.time()
+
+        # Bulk lookup
+        found = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+        for start in range(0, len(unique_hashes), self.BATCH_SIZE):
+            batch = unique_hashes[start:start + self.BATCH_SIZE]
+            rows = connection.execute(f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})", [model, *batch])
+            for text_hash, vector in rows:
+                found[text_hash] = np.frombuffer(vector, dtype=self.dtype).astype(np.float32).tolist()
+
+        # Refresh the last access of the hits
+        if found:
+            with connection:
+                connection.executemany("UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?", [(now, model, text_hash) for text_hash in found])
+
+        # Embed the misses in one call
+        missing = {text_hash: text for text_hash, text in zip(hashes, texts) if text_hash not in found}
+        misses = sum(1 for text_hash in hashes if text_hash in missing)
+        self.hits += len(texts) - misses
+        self.misses += misses
+        if missing:
+            vectors = embed(list(missing.values()))
+            rows = []
+            for text_hash, vector in zip(missing, vectors):
+                found[text_hash] = list(vector)
+                rows.append((model, text_hash, np.asarray(vector, dtype=self.dtype).tobytes(), now))
+            # Rows inserted meanwhile by another thread or process are kept, so the size only grows by the new rows
+            with connection:
+                before = connection.total_changes
+                connection.executemany("INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_access) VALUES (?, ?, ?, ?)", rows)
+                inserted = connection.total_changes - before
+                connection.execute("UPDATE cache_size SET bytes = bytes + ?", (inserted * len(rows[0][2]),))
+            self._evict()
+
+        return [found[text_hash] for text_hash in hashes]
+
+    # Function for evicting the least recently used vectors
+    def _evict(self):
+        """
+        Delete the least recently used vectors until the stored vectors fit in 90% of max_bytes.
+        """
+        connection = self._connection()
+        total = connection.execute("SELECT bytes FROM cache_size").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Delete the least recently used vectors one by one until enough bytes are freed (rows sharing a last access
+        # time, e.g. a batch inserted together, are not deleted all at once)
+        target = total - int(0.9 * self.max_bytes)
+        with connection:
+            freed = 0
+            while freed < target:
+                rows = connection.execute("SELECT model, text_hash, LENGTH(vector) FROM embeddings ORDER BY last_access LIMIT ?", (self.BATCH_SIZE,)).fetchall()
+                if not rows:
+                    break
+                for model, text_hash, size in rows:
+                    if freed >= target:
+                        break
+                    freed += size * connection.execute("DELETE FROM embeddings WHERE model = ? AND text_hash = ?", (model, text_hash)).rowcount
+            connection.execute("UPDATE cache_size SET bytes = bytes - ?", (freed,))
+
+    # Function for embedding documents
+    def embed_documents(self, texts):
+        return self._embed(texts, "document", self.embedding.embed_documents)
+
+    # Function for embedding a query
+    def embed_query(self, text):
+        return self._embed([text], "query", lambda texts: [self.embedding.embed_query(texts[0])])[0]
+
+    # Function for embedding several queries
+    def embed_queries(self, texts):
+        return self._embed(texts, "query", lambda texts: embed_queries(self.embedding, texts))
+
+    # Function for getting the cache statistics
+    def stats(self):
+        """
+        Get the number of hits and misses of this instance and the number and size of the stored vectors.
+        """
+        connection = self._connection()
+        count = connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        size = connection.execute("SELECT bytes FROM cache_size").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": count, "bytes": size}
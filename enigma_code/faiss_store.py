@@ -0,0 +1,144 @@
+# Import the libraries
+import json
+import os
+import uuid
+import faiss
+import numpy as np
+from langchain.schema import Document
+from langchain_community.vectorstores import FAISS
+
+
+# Class for updating a FAISS index in place
+class IDMapFAISS(FAISS):
+    """
+    FAISS vector store with an ID-mapped index (IndexIDMap2), updatable in place by document ID.
+
+    The rows of a plain FAISS index are renumbered by each deletion, so the langchain wrapper rebuilds its row to
+    document mapping by position. Here every document keeps its FAISS row ID until it is deleted: adding documents
+    with the IDs of stored documents replaces them (upsert), deleting removes their rows, and new rows get IDs from
+    a counter that only grows (saved with the store), so row IDs are never reused. The row of each document ID is
+    kept in a dictionary, so upserts and deletes cost the number of IDs they touch, not the size of the store. The
+    row IDs are also what a search with an ID selector filters on (see VectorStoreManager.search). The version
+    attribute is incremented by every change, so caches of the results (see QueryCache) know when to empty
+    themselves.
+    """
+
+    # Number of changes
+    version = 0
+
+    # Next row ID and row of each document ID (built by _ensure_id_map)
+    _next_row = None
+    _rows = None
+
+    # Function for converting the index to an ID-mapped index
+    def _ensure_id_map(self):
+        """
+        Wrap the index in an IndexIDMap2 if it is a plain index (the existing rows keep their positions as IDs), and
+        build the row of each document ID.
+        """
+        index = self.index
+        if not isinstance(index, faiss.IndexIDMap2):
+            vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else None
+            inner = faiss.clone_index(index)
+            inner.reset()
+            id_map = faiss.IndexIDMap2(inner)
+            if vectors is not None:
+                id_map.add_with_ids(vectors, np.arange(index.ntotal, dtype=np.int64))
+            self.index = id_map
+        if self._rows is None:
+            self._rows = {id_: row for row, id_ in self.index_to_docstore_id.items()}
+        if self._next_row is None:
+            self._next_row = max(self.index_to_docstore_id, default=-1) + 1
+
+    # Function for adding embeddings
+    def add_embeddings(self, text_embeddings, metadatas=None, ids=None, **kwargs):
+        """
+        Add (or replace) texts with their precomputed embeddings.
+
+        Returns:
+        list: The IDs of the texts.
+        """
+        text_embeddings = list(text_embeddings)
+        if not text_embeddings:
+            return []
+        texts = [text for text, _ in text_embeddings]
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in texts]
+        self._ensure_id_map()
+        self.delete(ids)
+
+        # New row IDs are never reused
+        rows = np.arange(self._next_row, self._next_row + len(ids), dtype=np.int64)
+        self._next_row += len(ids)
+        vectors = np.array([vector for _, vector in text_embeddings], dtype=np.float32)
+        if self._normalize_L2:
+            faiss.normalize_L2(vectors)
+        self.index.add_with_ids(vectors, rows)
+        documents = {id_: Document(page_content=text, metadata=metadata or {}) for id_, text, metadata in zip(ids, texts, metadatas)}
+        # The IDs were just deleted, so the overlap check of InMemoryDocstore.add (a scan of the docstore) is skipped
+        if isinstance(getattr(self.docstore, "_dict", None), dict):
+            self.docstore._dict.update(documents)
+        else:
+            self.docstore.add(documents)
+        self.index_to_docstore_id.update(zip(rows.tolist(), ids))
+        self._rows.update(zip(ids, rows.tolist()))
+        self.version += 1
+        return ids
+
+    # Function for adding texts
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        return self.add_embeddings(zip(texts, self._embed_documents(texts)), metadatas=metadatas, ids=ids)
+
+    # Function for deleting documents
+    def delete(self, ids=None, **kwargs):
+        """
+        Delete documents by ID (missing IDs are ignored).
+        """
+        if not ids:
+            return True
+        self._ensure_id_map()
+        rows = [self._rows.pop(id_) for id_ in set(ids) if id_ in self._rows]
+        if rows:
+            self.index.remove_ids(np.asarray(rows, dtype=np.int64))
+            self.docstore.delete([self.index_to_docstore_id.pop(row) for row in rows])
+            self.version += 1
+        return True
+
+    # Function for creating a store from embeddings
+    @classmethod
+    def from_embeddings(cls, text_embeddings, embedding, metadatas=None, ids=None, **kwargs):
+        store = super().from_embeddings(text_embeddings, embedding, metadatas=metadatas, ids=ids, **kwargs)
+        store._ensure_id_map()
+        return store
+
+    # Function for creating a store from texts
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, **kwargs):
+        store = super().from_texts(texts, embedding, metadatas=metadatas, ids=ids, **kwargs)
+        store._ensure_id_map()
+        return store
+
+    # Function for saving the store
+    def save_local(self, folder_path, index_name="index"):
+        """
+        Save the store, and the next row ID to {index_name}.rows.json.
+        """
+        self._ensure_id_map()
+        super().save_local(folder_path, index_name=index_name)
+        with open(os.path.join(folder_path, f"{index_name}.rows.json"), "w") as f:
+            json.dump({"next_row": self._next_row}, f)
+
+    # Function for loading a saved store
+    @classmethod
+    def load_local(cls, folder_path, embeddings, index_name="index", **kwargs):
+        """
+        Load a saved store (stores saved before with a plain index are converted to an ID-mapped index).
+        """
+        store = super().load_local(folder_path, embeddings, index_name=index_name, **kwargs)
+        rows_path = os.path.join(folder_path, f"{index_name}.rows.json")
+        if os.path.exists(rows_path):
+            with open(rows_path, "r") as f:
+                store._next_row = json.load(f)["next_row"]
+        store._ensure_id_map()
+        return store
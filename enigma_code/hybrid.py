@@ -0,0 +1,98 @@
+# Import the libraries
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from langchain.schema import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+# Threads running the dense leg of the searches
+_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid-dense")
+
+
+# Function for fusing rankings
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse rankings of documents with reciprocal-rank fusion: a document scores the sum of 1 / (k + rank) over the
+    rankings it appears in. Documents are matched by their content.
+
+    Args:
+    rankings (list): The rankings (lists of documents, best first).
+    k (int): The rank constant (higher values flatten the weight of the top ranks).
+
+    Returns:
+    list: The (document, score) pairs, best first.
+    """
+    scores, documents = {}, {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            scores[document.page_content] = scores.get(document.page_content, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(document.page_content, document)
+    return sorted(((documents[key], score) for key, score in scores.items()), key=lambda result: -result[1])
+
+
+# Class for retrieving with BM25 and embeddings
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever fusing a sparse BM25 search and a dense vector search with reciprocal-rank fusion.
+
+    The dense leg (an embedding call) runs in a worker thread while the sparse leg runs in the calling thread, so a
+    search takes about as long as the dense leg alone. Exact tokens such as flight, ticket or policy numbers are
+    found by the sparse leg, which calls no model.
+
+    The dense leg can be a VectorStore, a retriever, or the notebook retriever (query(query, k) returning dicts),
+    and query() keeps the interface of the notebook retriever, so the retriever of lookup_policy can be replaced by
+    a HybridRetriever. Its version is the version of the dense leg, so caches of its results (see QueryCache) are
+    emptied when the dense index changes.
+    """
+
+    dense: Any
+    """The dense leg (VectorStore, retriever, or object with query(query, k))."""
+    sparse: Any
+    """The sparse leg (BM25Index)."""
+    k: int = 4
+    """The number of documents returned."""
+    fetch_k: int = 20
+    """The number of documents fetched from each leg (at least the number of documents asked for)."""
+    rrf_k: int = 60
+    """The rank constant of the fusion."""
+
+    # Property for getting the version of the dense leg
+    @property
+    def version(self):
+        return getattr(self.dense, "version", None)
+
+    # Function for searching the dense leg
+    def _dense_search(self, query, fetch_k):
+        if hasattr(self.dense, "similarity_search"):
+            return self.dense.similarity_search(query, k=fetch_k)
+        if hasattr(self.dense, "query"):
+            return [Document(page_content=result["page_content"]) for result in self.dense.query(query, k=fetch_k)]
+        return self.dense.invoke(query)[:fetch_k]
+
+    # Function for searching both legs
+    def search_with_score(self, query, k=None):
+        """
+        Search both legs concurrently and fuse them.
+
+        Returns:
+        list: The (document, fused score) pairs, best first.
+        """
+        k = k or self.k
+        fetch_k = max(k, self.fetch_k)
+        dense = _EXECUTOR.submit(self._dense_search, query, fetch_k)
+        sparse = self.sparse.search(query, k=fetch_k)
+        return reciprocal_rank_fusion([dense.result(), sparse], k=self.rrf_k)[:k]
+
+    # Function for getting the relevant documents
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return [document for document, _ in self.search_with_score(query)]
+
+    # Function for querying like the notebook retriever
+    def query(self, query, k=5):
+        """
+        Find the k chunks of the fused ranking.
+
+        Returns:
+        list: Dictionaries with the page_content and fused score (as similarity) of each chunk, best first.
+        """
+        return [{"page_content": document.page_content, "similarity": score} for document, score in self.search_with_score(query, k)]
@@ -0,0 +1,134 @@
+# Import the libraries
+import os
+import threading
+import time
+
+
+# Function for getting the stamp of an index folder
+def folder_stamp(path):
+    """
+    Get a stamp of the files of an index folder, which changes when the index is saved again: the resolved path
+    (a new version directory for atomic saves) and the number, total size and last modification time of the files.
+    Returns None when the folder does not exist.
+    """
+    if path is None or not os.path.exists(path):
+        return None
+    real_path = os.path.realpath(path)
+    count, size, mtime = 0, 0, 0
+    for root, _, names in os.walk(real_path):
+        for name in names:
+            stat = os.stat(os.path.join(root, name))
+            count, size, mtime = count + 1, size + stat.st_size, max(mtime, stat.st_mtime_ns)
+    return (real_path, count, size, mtime)
+
+
+# Class for sharing loaded indexes
+class IndexRegistry:
+    """
+    Process-wide registry of loaded vector stores, so that every session using the same index shares one copy.
+
+    Stores are keyed by (backend, path or index name, embedding model). acquire() returns the loaded store and
+    increments its reference count, release() decrements it. When the stamp of the files on disk changed since the
+    store was loaded, the next acquire() loads it again (sessions holding the previous copy keep it until they
+    release it). Stores nobody holds are evicted once they have been idle for idle_seconds, and closed if they have
+    a close() method (e.g. the worker processes of the sharded store).
+    """
+
+    # Constructor function
+    def __init__(self, idle_seconds=600.0):
+        """
+        Initialize the IndexRegistry class.
+
+        Args:
+        idle_seconds (float): The number of seconds an unreferenced store is kept.
+
+        Returns:
+        None
+        """
+        self.idle_seconds = idle_seconds
+        self.loads = 0
+        self.reloads = 0
+        self.evictions = 0
+        self._entries = {}
+        self._keys = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    # Function for getting the number of loaded stores
+    def __len__(self):
+        return len(self._entries)
+
+    # Function for getting a store
+    def acquire(self, key, loader, stamp=None):
+        """
+        Get the store of a key, loading it with loader() if it is not loaded or its stamp changed.
+
+        Args:
+        key (tuple): The key, e.g. (backend, path or index name, embedding model).
+        loader (callable): The function loading the store.
+        stamp (hashable): The stamp of the files of the store (see folder_stamp), or None.
+
+        Returns:
+        VectorStore: The store.
+        """
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Stores are loaded outside the registry lock, one load per key at a time
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry["stamp"] == stamp:
+                    entry["refs"] += 1
+                    entry["last_used"] = time.monotonic()
+                    return entry["store"]
+            store = loader()
+            with self._lock:
+                refs = entry["refs"] if entry is not None else 0
+                self._entries[key] = {"store": store, "stamp": stamp, "refs": refs + 1, "last_used": time.monotonic()}
+                self._keys[id(store)] = key
+                self.loads += 1
+                self.reloads += entry is not None
+        self.evict_idle()
+        return store
+
+    # Function for releasing a store
+    def release(self, store):
+        """
+        Release a store returned by acquire() (stores that are not in the registry are ignored).
+        """
+        with self._lock:
+            entry = self._entries.get(self._keys.get(id(store)))
+            if entry is not None:
+                entry["refs"] = max(0, entry["refs"] - 1)
+                entry["last_used"] = time.monotonic()
+        self.evict_idle()
+
+    # Function for evicting the idle stores
+    def evict_idle(self):
+        """
+        Drop the stores that nobody holds and that have been idle for idle_seconds.
+
+        Returns:
+        int: The number of evicted stores.
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = [key for key, entry in self._entries.items() if entry["refs"] == 0 and now - entry["last_used"] >= self.idle_seconds]
+            evicted = [self._entries.pop(key)["store"] for key in idle]
+            if idle:
+                self._keys = {store_id: key for store_id, key in self._keys.items() if key in self._entries}
+            self.evictions += len(idle)
+        for store in evicted:
+            if hasattr(store, "close"):
+                store.close()
+        return len(idle)
+
+    # Function for getting the registry statistics
+    def stats(self):
+        with self._lock:
+            return {"indexes": len(self._entries), "references": sum(entry["refs"] for entry in self._entries.values()), "loads": self.loads, "reloads": self.reloads, "evictions": self.evictions}
+
+
+# Registry of the process
+registry = IndexRegistry()
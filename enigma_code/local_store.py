@@ -0,0 +1,465 @@
+# Import the libraries
+import json
+import os
+import uuid
+import numpy as np
+from langchain.schema import Document
+from langchain_core.vectorstores import VectorStore
+from enigma_code.metadata_index import MetadataIndex
+from enigma_code.query_cache import embed_queries
+
+
+# Class for storing vectors locally
+class LocalVectorStore(VectorStore):
+    """
+    In-process dense vector store backed by a contiguous float32 matrix.
+
+    The vectors are normalized when they are added, so a cosine search is a single matrix-vector product. Searches
+    scan the matrix in blocks of block_size rows and keep the top k of each block, so the scores of the whole corpus
+    are never materialized at once. The store is saved as vectors.npy and docstore.json, and loaded with a memory
+    map: startup does not read the vectors, and processes loading the same folder share the same pages.
+
+    With storage="float16" or "int8", the first pass of a search runs against a compressed copy of the vectors
+    (half precision, or 8-bit codes with a per-dimension scale and offset) and the rerank_factor * k best candidates
+    are re-scored against the full-precision vectors. Once saved and loaded with mmap, only the compressed copy is
+    held in memory, the full-precision rows are read from the memory map for the candidates only.
+
+    Searches take a metadata filter (see MetadataIndex). The rows matching the filter are found in an inverted index
+    of the metadata, built on the first filtered search after a change, and only those rows are scored (a filter
+    matching more than DENSE_FILTER of the rows masks the other rows of a full scan instead).
+
+    It also keeps the query(query, k) method of the notebook retriever used by lookup_policy. Every change increments
+    version, so caches of its results (see QueryCache) know when to empty themselves.
+    """
+
+    # Storage types of the first pass
+    STORAGES = ("float32", "float16", "int8")
+
+    # Number of compressed rows converted to float32 at a time
+    CONVERSION_ROWS = 8192
+
+    # Fraction of matching rows above which a filtered search scans contiguous blocks and masks the other rows
+    # (gathering scattered rows costs more than scanning them)
+    DENSE_FILTER = 0.25
+
+    # Constructor function
+    def __init__(self, embedding, block_size=65536, storage="float32", rerank_factor=4):
+        """
+        Initialize the LocalVectorStore class.
+
+        Args:
+        embedding (Embeddings): The embedding model.
+        block_size (int): The number of rows scored at a time by a search.
+        storage (str): The storage of the first pass ("float32", "float16" or "int8").
+        rerank_factor (int): The number of candidates per result re-scored in full precision ("float16", "int8").
+
+        Returns:
+        None
+        """
+        if storage not in self.STORAGES:
+            raise ValueError(f"Unsupported storage: {storage}")
+        self.embedding = embedding
+        self.block_size = block_size
+        self.storage = storage
+        self.rerank_factor = rerank_factor
+        self._codes = None
+        self._n_codes = 0
+        self._scale = None
+        self._offset = None
+        self.texts = []
+        self.metadatas = []
+        self.ids = []
+        self._id_to_row = {}
+        self._matrix = None
+        self._size = 0
+        self._metadata_index = None
+        self.version = 0
+
+    # Property for getting the embedding model
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    # Property for getting the stored vectors
+    @property
+    def vectors(self):
+        """
+        The normalized vectors (a view of the first rows of the matrix).
+        """
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._matrix[:self._size]
+
+    # Function for getting the number of vectors
+    def __len__(self):
+        return self._size
+
+    # Function for normalizing vectors
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    # Function for making room in the matrix
+    def _reserve(self, n_rows, dim):
+        """
+        Make room for n_rows more rows, doubling the capacity when it runs out. A memory-mapped (read-only) matrix is
+        copied into memory first.
+        """
+        if self._matrix is None or (self._size == 0 and self._matrix.shape[1] != dim):
+            self._matrix = np.empty((max(n_rows, 1024), dim), dtype=np.float32)
+            return
+        if self._matrix.shape[1] != dim:
+            raise ValueError(f"Expected vectors of dimension {self._matrix.shape[1]}, got {dim}")
+        needed = self._size + n_rows
+        if needed > len(self._matrix) or not self._matrix.flags.writeable or isinstance(self._matrix, np.memmap):
+            capacity = max(needed, 2 * len(self._matrix)) if needed > len(self._matrix) else len(self._matrix)
+            matrix = np.empty((capacity, dim), dtype=np.float32)
+            matrix[:self._size] = self._matrix[:self._size]
+            self._matrix = matrix
+
+    # Function for adding embeddings
+    def add_embeddings(self, text_embeddings, metadatas=None, ids=None, **kwargs):
+        """
+        Add texts with their precomputed embeddings.
+
+        Args:
+        text_embeddings (list): The (text, embedding) pairs.
+        metadatas (list): The metadata of each text.
+        ids (list): The IDs of the texts (random UUIDs by default).
+
+        Returns:
+        list: The IDs of the texts.
+        """
+        text_embeddings = list(text_embeddings)
+        if not text_embeddings:
+            return []
+        texts = [text for text, _ in text_embeddings]
+        vectors = self._normalize([vector for _, vector in text_embeddings])
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in texts]
+
+        # Check the IDs
+        duplicates = [i for i in ids if i in self._id_to_row]
+        if duplicates or len(set(ids)) != len(ids):
+            raise ValueError(f"Duplicate IDs: {duplicates or ids}")
+
+        # Append the rows
+        self._reserve(len(texts), vectors.shape[1])
+        self._matrix[self._size:self._size + len(texts)] = vectors
+        for offset, id_ in enumerate(ids):
+            self._id_to_row[id_] = self._size + offset
+        self._size += len(texts)
+        self.texts.extend(texts)
+        self.metadatas.extend(dict(metadata) for metadata in metadatas)
+        self.ids.extend(ids)
+        self._metadata_index = None
+        self.version += 1
+
+        return ids
+
+    # Function for adding texts
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        return self.add_embeddings(zip(texts, self.embedding.embed_documents(texts)), metadatas=metadatas, ids=ids)
+
+    # Function for deleting vectors
+    def delete(self, ids=None, **kwargs):
+        """
+        Delete vectors by ID. Each deleted row is replaced by the last row, so the matrix stays contiguous.
+
+        Returns:
+        bool: True.
+        """
+        for id_ in ids or []:
+            row = self._id_to_row.pop(id_, None)
+            if row is None:
+                continue
+            self._reserve(0, self._matrix.shape[1])
+            last = self._size - 1
+            if row != last:
+                self._matrix[row] = self._matrix[last]
+                if last < self._n_codes:
+                    self._codes[row] = self._codes[last]
+                else:
+                    self._n_codes = min(self._n_codes, row)
+                self.texts[row], self.metadatas[row], self.ids[row] = self.texts[last], self.metadatas[last], self.ids[last]
+                self._id_to_row[self.ids[row]] = row
+            self.texts.pop()
+            self.metadatas.pop()
+            self.ids.pop()
+            self._size -= 1
+            self._n_codes = min(self._n_codes, self._size)
+            self._metadata_index = None
+            self.version += 1
+        return True
+
+    # Function for encoding vectors for the first pass
+    def _encode(self, vectors):
+        if self.storage == "float16":
+            return vectors.astype(np.float16)
+        codes = np.rint((vectors - self._offset) / self._scale) - 128
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    # Function for bringing the compressed vectors up to date
+    def _update_codes(self):
+        """
+        Encode the rows added since the last search. The int8 scale and offset are fitted on the rows present the
+        first time (min and max of each dimension), later rows are clipped to that range.
+        """
+        if self._n_codes >= self._size:
+            return
+
+        # Fit the int8 range
+        if self.storage == "int8" and self._scale is None:
+            low = np.full(self._matrix.shape[1], np.inf, dtype=np.float32)
+            high = np.full(self._matrix.shape[1], -np.inf, dtype=np.float32)
+            for start in range(0, self._size, self.block_size):
+                block = self._matrix[start:start + self.block_size]
+                low, high = np.minimum(low, block.min(axis=0)), np.maximum(high, block.max(axis=0))
+            self._offset = low
+            self._scale = np.maximum(high - low, 1e-12) / 255
+
+        # Encode the new rows block by block
+        new_codes = [self._encode(self._matrix[start:min(start + self.block_size, self._size)]) for start in range(self._n_codes, self._size, self.block_size)]
+        kept = [] if self._codes is None else [self._codes[:self._n_codes]]
+        self._codes = np.concatenate(kept + new_codes)
+        self._n_codes = self._size
+
+    # Function for getting the rows matching a metadata filter
+    def _filter_rows(self, filter):
+        if self._metadata_index is None:
+            self._metadata_index = MetadataIndex(self.metadatas)
+        return self._metadata_index.rows(filter)
+
+    # Function for scoring a block of the first pass
+    def _score_block(self, rows, queries):
+        """
+        Score a block of rows, given as a slice or as an array of row numbers (filtered search), against a matrix of
+        queries (one per row).
+
+        Returns:
+        np.ndarray: The scores, one row per block row and one column per query.
+        """
+        if self.storage == "float32":
+            return self._matrix[rows] @ queries.T
+
+        # The codes are converted to float32 in cache-sized pieces
+        if self.storage == "float16":
+            weights, bias = queries.T, 0.0
+        else:
+            # int8: ((codes + 128) * scale + offset) . query = codes . (scale * query) + (128 * scale + offset) . query
+            weights = self._scale[:, None] * queries.T
+            bias = (128 * self._scale + self._offset) @ queries.T
+        codes = self._codes[rows]
+        scores = np.empty((len(codes), len(queries)), dtype=np.float32)
+        for piece in range(0, len(codes), self.CONVERSION_ROWS):
+            scores[piece:piece + self.CONVERSION_ROWS] = codes[piece:piece + self.CONVERSION_ROWS].astype(np.float32) @ weights
+        return scores + bias
+
+    # Function for searching the top k rows of several vectors
+    def _search_many(self, vectors, k, filter=None):
+        """
+        Find the k rows most similar to each of several vectors, scanning the matrix block by block. Each block is
+        scored against all the vectors with one matrix-matrix product.
+
+        Args:
+        vectors (list): The query vectors.
+        k (int): The number of rows per vector.
+        filter (dict): The metadata filter; only the matching rows are scored.
+
+        Returns:
+        list: The rows and their cosine similarities of each vector, best first.
+        """
+        queries = self._normalize(np.atleast_2d(np.asarray(vectors, dtype=np.float32)))
+        candidates = self._filter_rows(filter) if filter and self._size else None
+        n_rows = self._size if candidates is None else len(candidates)
+        k = min(k, n_rows)
+
+        # Dense filters mask the rows of a full scan
+        mask = None
+        if candidates is not None and n_rows > self.DENSE_FILTER * self._size:
+            mask = np.zeros(self._size, dtype=bool)
+            mask[candidates] = True
+            candidates = None
+        n_scanned = self._size if candidates is None else n_rows
+        if k <= 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+
+        # Number of candidates of the first pass
+        n_candidates = k if self.storage == "float32" else min(n_rows, k * self.rerank_factor)
+        if self.storage != "float32":
+            self._update_codes()
+
+        # Keep the top candidates of each block, for each query
+        rows, scores = [], []
+        for start in range(0, n_scanned, self.block_size):
+            end = min(start + self.block_size, n_scanned)
+            block = slice(start, end) if candidates is None else candidates[start:end]
+            block_scores = self._score_block(block, queries)
+            if mask is not None:
+                block_scores[~mask[block]] = -np.inf
+            if len(block_scores) > n_candidates:
+                top = np.argpartition(-block_scores, n_candidates - 1, axis=0)[:n_candidates]
+            else:
+                top = np.broadcast_to(np.arange(len(block_scores))[:, None], block_scores.shape)
+            rows.append(top + start if candidates is None else block[top])
+            scores.append(np.take_along_axis(block_scores, top, axis=0))
+
+        # Merge the blocks
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+        order = np.argsort(-scores, axis=0, kind="stable")[:n_candidates]
+        rows, scores = np.take_along_axis(rows, order, axis=0), np.take_along_axis(scores, order, axis=0)
+
+        results = []
+        for query, query_rows, query_scores in zip(queries, rows.T, scores.T):
+            if mask is not None:
+                query_rows, query_scores = query_rows[mask[query_rows]], query_scores[mask[query_rows]]
+
+            # Re-score the candidates in full precision
+            if self.storage != "float32":
+                sorted_rows = np.sort(query_rows)
+                exact = self._matrix[sorted_rows] @ query
+                order = np.argsort(-exact, kind="stable")[:k]
+                query_rows, query_scores = sorted_rows[order], exact[order]
+
+            results.append((query_rows, query_scores))
+
+        return results
+
+    # Function for searching the top k rows of a vector
+    def _search(self, vector, k, filter=None):
+        """
+        Find the k rows most similar to a vector (see _search_many).
+
+        Returns:
+        tuple: The rows and their cosine similarities, best first.
+        """
+        return self._search_many([vector], k, filter=filter)[0]
+
+    # Function for searching by vector with scores
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        rows, scores = self._search(embedding, k, filter=filter)
+        return [(Document(page_content=self.texts[row], metadata=dict(self.metadatas[row])), float(score)) for row, score in zip(rows, scores)]
+
+    # Function for searching by vector
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    # Function for searching by text with scores
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    # Function for searching by text
+    def similarity_search(self, query, k=4, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    # Function for getting the relevance score function
+    def _select_relevance_score_fn(self):
+        # Cosine similarity in [-1, 1] to a relevance score in [0, 1]
+        return lambda score: (score + 1) / 2
+
+    # Function for querying like the notebook retriever
+    def query(self, query, k=5, filter=None):
+        """
+        Find the k chunks most similar to a query, optionally among the chunks matching a metadata filter.
+
+        Returns:
+        list: Dictionaries with the page_content and similarity of each chunk, best first.
+        """
+        rows, scores = self._search(self.embedding.embed_query(query), k, filter=filter)
+        return [{"page_content": self.texts[row], "similarity": float(score)} for row, score in zip(rows, scores)]
+
+    # Function for querying several queries at once
+    def query_many(self, queries, k=5, filter=None):
+        """
+        Find the k chunks most similar to each of several queries. The queries are embedded together (see
+        embed_queries) and scored together, block by block, with matrix-matrix products.
+
+        Returns:
+        list: For each query, dictionaries with the page_content and similarity of each chunk, best first.
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        results = self._search_many(embed_queries(self.embedding, queries), k, filter=filter)
+        return [[{"page_content": self.texts[row], "similarity": float(score)} for row, score in zip(rows, scores)] for rows, scores in results]
+
+    # Function for searching several vectors at once
+    def similarity_search_many_by_vector(self, embeddings, k=4, filter=None):
+        """
+        Find the k documents most similar to each of several vectors.
+
+        Returns:
+        list: For each vector, the (document, cosine similarity) pairs, best first.
+        """
+        return [[(Document(page_content=self.texts[row], metadata=dict(self.metadatas[row])), float(score)) for row, score in zip(rows, scores)] for rows, scores in self._search_many(embeddings, k, filter=filter)]
+
+    # Function for creating a store from texts
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, **kwargs):
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    # Function for creating a store from embeddings
+    @classmethod
+    def from_embeddings(cls, text_embeddings, embedding, metadatas=None, ids=None, **kwargs):
+        store = cls(embedding, **kwargs)
+        store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        return store
+
+    # Function for saving the store
+    def save_local(self, folder_path):
+        """
+        Save the vectors to vectors.npy and the texts, metadata and IDs to docstore.json. The compressed vectors of
+        the first pass are saved to codes.npy (and their int8 scale and offset to quantization.npz).
+        """
+        os.makedirs(folder_path, exist_ok=True)
+        np.save(os.path.join(folder_path, "vectors.npy"), np.ascontiguousarray(self.vectors))
+        if self.storage != "float32" and self._size:
+            self._update_codes()
+            np.save(os.path.join(folder_path, "codes.npy"), self._codes[:self._size])
+            if self.storage == "int8":
+                np.savez(os.path.join(folder_path, "quantization.npz"), scale=self._scale, offset=self._offset)
+        with open(os.path.join(folder_path, "docstore.json"), "w") as f:
+            json.dump({"texts": self.texts, "metadatas": self.metadatas, "ids": self.ids}, f)
+
+    # Function for loading a saved store
+    @classmethod
+    def load_local(cls, folder_path, embeddings, mmap=True, **kwargs):
+        """
+        Load a saved store. With mmap, the vectors are memory-mapped read-only instead of read into memory. The
+        compressed vectors of the first pass (storage="float16" or "int8") are read into memory.
+
+        Args:
+        folder_path (str): The folder the store was saved to.
+        embeddings (Embeddings): The embedding model.
+        mmap (bool): Whether to memory-map the vectors.
+
+        Returns:
+        LocalVectorStore: The store.
+        """
+        store = cls(embeddings, **kwargs)
+        with open(os.path.join(folder_path, "docstore.json"), "r") as f:
+            docstore = json.load(f)
+        store._matrix = np.load(os.path.join(folder_path, "vectors.npy"), mmap_mode="r" if mmap else None)
+        store._size = len(docstore["ids"])
+        store.texts, store.metadatas, store.ids = docstore["texts"], docstore["metadatas"], docstore["ids"]
+        store._id_to_row = {id_: row for row, id_ in enumerate(store.ids)}
+
+        # Compressed vectors saved with the same storage
+        codes_path = os.path.join(folder_path, "codes.npy")
+        if store.storage != "float32" and os.path.exists(codes_path):
+            codes = np.load(codes_path)
+            quantization_path = os.path.join(folder_path, "quantization.npz")
+            if codes.dtype == np.dtype(store.storage) and len(codes) == store._size:
+                if store.storage == "int8" and os.path.exists(quantization_path):
+                    with np.load(quantization_path) as quantization:
+                        store._scale, store._offset = quantization["scale"], quantization["offset"]
+                    store._codes, store._n_codes = codes, len(codes)
+                elif store.storage == "float16":
+                    store._codes, store._n_codes = codes, len(codes)
+
+        return store
@@ -0,0 +1,277 @@
+# Import the libraries
+import hashlib
+import json
+import os
+
+
+# Class for tracking what has already been ingested
+class IngestionManifest:
+    """
+    Persistent record of the content hash of every ingested source file and of each of its chunks.
+
+    The manifest lets a rebuild skip files that did not change, embed only the chunks that are new and delete the
+    vectors of the chunks that disappeared. It is stored as a JSON file:
+
+        {"files": {file_path: {"size": int, "mtime": float, "hash": str, "chunks": [chunk_id, ...]}}}
+
+    The file paths are absolute, so syncing the same files through a relative or an absolute path gives the same
+    keys (and chunk IDs). Changes made during a sync are appended to a journal next to the manifest
+    (<manifest_path>.journal, one JSON line per file) and folded into the manifest by save().
+    """
+
+    # Constructor function
+    def __init__(self, manifest_path):
+        """
+        Initialize the IngestionManifest class.
+
+        Args:
+        manifest_path (str): The path to the manifest file (created on the first save).
+
+        Returns:
+        None
+        """
+        self.manifest_path = manifest_path
+        self.journal_path = manifest_path + ".journal"
+        self.files = {}
+
+        # Load the existing manifest (paths recorded relative to the working directory are made absolute)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                self.files = {os.path.abspath(file_path): entry for file_path, entry in json.load(f)["files"].items()}
+
+        # Replay the journal of an interrupted sync (a line cut by the interruption is ignored)
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    if record["entry"] is None:
+                        self.files.pop(record["file"], None)
+                    else:
+                        self.files[record["file"]] = record["entry"]
+
+    # Function for hashing a file
+    @staticmethod
+    def file_hash(file_path, block_size=1 << 20):
+        """
+        Compute the SHA-256 of a file, reading it block by block.
+        """
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    # Metadata fields holding the position of a chunk in its file (they change when text before the chunk changes)
+    POSITIONAL_METADATA = ("start_index", "end_index")
+
+    # Function for hashing a chunk
+    @classmethod
+    def chunk_hash(cls, chunk):
+        """
+        Compute the SHA-256 of a chunk's content and metadata, leaving out its position, so that an edit earlier in
+        the file does not change the hash of the chunks after it.
+        """
+        metadata = {key: value for key, value in chunk.metadata.items() if key not in cls.POSITIONAL_METADATA}
+        payload = json.dumps([chunk.page_content, metadata], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # Function for computing the stable IDs of the chunks of a file
+    def chunk_ids(self, file_path, chunks):
+        """
+        Compute a stable ID for each chunk of a file from the file path and the chunk hash.
+
+        Identical chunks within the same file are told apart by their occurrence number, so that every chunk gets a
+        unique ID and an unchanged chunk keeps its ID across rebuilds.
+
+        Args:
+        file_path (str): The path to the source file.
+        chunks (list): The chunks of the file.
+
+        Returns:
+        list: The chunk IDs.
+        """
+        ids = []
+        seen = {}
+        for chunk in chunks:
+            chunk_hash = self.chunk_hash(chunk)
+            occurrence = seen.get(chunk_hash, 0)
+            seen[chunk_hash] = occurrence + 1
+            ids.append(hashlib.sha256(f"{file_path}\0{chunk_hash}\0{occurrence}".encode("utf-8")).hexdigest())
+        return ids
+
+    # Function for checking whether a file changed
+    def is_modified(self, file_path):
+        """
+        Check whether a file is new or changed since it was recorded.
+
+        The size and modification time are compared first, so unchanged files are not re-hashed.
+
+        Returns:
+        tuple: (modified, file_hash). file_hash is None when the file was not hashed.
+        """
+        file_path = os.path.abspath(file_path)
+        entry = self.files.get(file_path)
+        stat = os.stat(file_path)
+
+        # New file
+        if entry is None:
+            return True, self.file_hash(file_path)
+
+        # Same size and modification time
+        if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return False, None
+
+        # Touched but maybe not changed
+        file_hash = self.file_hash(file_path)
+        if file_hash == entry["hash"]:
+            entry["mtime"] = stat.st_mtime
+            return False, file_hash
+
+        return True, file_hash
+
+    # Function for recording a file
+    def record_file(self, file_path, file_hash, chunks):
+        """
+        Record the chunks of a new or changed file.
+
+        Args:
+        file_path (str): The path to the source file.
+        file_hash (str): The hash of the file.
+        chunks (list): The chunks of the file.
+
+        Returns:
+        tuple: (new_chunks, new_ids, removed_ids). The chunks whose ID was not recorded before and their IDs, and
+        the IDs recorded before that are not produced anymore.
+        """
+        file_path = os.path.abspath(file_path)
+        ids = self.chunk_ids(file_path, chunks)
+        old_ids = set(self.files.get(file_path, {}).get("chunks", []))
+
+        # Keep the chunks that changed
+        new_chunks = [chunk for chunk, chunk_id in zip(chunks, ids) if chunk_id not in old_ids]
+        new_ids = [chunk_id for chunk_id in ids if chunk_id not in old_ids]
+        removed_ids = sorted(old_ids.difference(ids))
+
+        # Record the file
+        stat = os.stat(file_path)
+        self.files[file_path] = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": file_hash, "chunks": ids}
+
+        return new_chunks, new_ids, removed_ids
+
+    # Function for forgetting a file
+    def remove_file(self, file_path):
+        """
+        Forget a file that was removed from the corpus.
+
+        Returns:
+        list: The IDs of its chunks.
+        """
+        return self.files.pop(os.path.abspath(file_path), {}).get("chunks", [])
+
+    # Function for journaling the entry of a file
+    def _log(self, journal, file_path, entry):
+        """
+        Append the entry of a file (None for a removed file) to the journal, flushed so it survives a crash of the
+        process.
+        """
+        journal.write(json.dumps({"file": file_path, "entry": entry}) + "\n")
+        journal.flush()
+
+    # Function for saving the manifest
+    def save(self):
+        """
+        Save the manifest atomically (write to a temporary file then rename it), and drop the journal it includes.
+        """
+        directory = os.path.dirname(os.path.abspath(self.manifest_path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"files": self.files}, f)
+        os.replace(tmp_path, self.manifest_path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+    # Function for synchronizing a vector store with a directory
+    def sync(self, data_handler, vectorstore, path, chunk_type, chunk_size, chunk_overlap, max_workers=None):
+        """
+        Bring a vector store up to date with a directory or glob pattern.
+
+        Only new or modified files are parsed and chunked, only chunks that were not indexed before are embedded,
+        and the vectors of chunks that disappeared (from changed or removed files) are deleted.
+
+        The sync can be interrupted at any point and run again. Before the vectors of a changed file are written,
+        its entry is journaled with the chunk IDs it had and the ones being added (and no hash, so it is processed
+        again); once they are written and the vectors of its removed chunks deleted, its final entry is journaled.
+        Removed files stay in the manifest until the vectors of their chunks are deleted. A sync after an
+        interruption therefore adds the same chunks again (an upsert by ID) and deletes every chunk that is not
+        produced anymore, so no vector is orphaned.
+
+        Args:
+        data_handler (DataHandler): The data handler used to list, load, clean and chunk the files.
+        vectorstore (VectorStore): The vector store to update (must support add_documents(ids=...) as an upsert
+            and delete ignoring missing IDs).
+        path (str): A directory or a glob pattern.
+        chunk_type (str): The type of chunking to be performed (see DataHandler.chunk_dataset).
+        chunk_size (int): The size of the chunks.
+        chunk_overlap (int): The overlap between the chunks.
+        max_workers (int): The number of worker processes used for parsing.
+
+        Returns:
+        dict: The number of changed, unchanged, removed and failed files, and of added and deleted chunks.
+        """
+        stats = {"changed_files": 0, "unchanged_files": 0, "removed_files": 0, "failed_files": 0, "added_chunks": 0, "deleted_chunks": 0}
+
+        # Find the new and modified files
+        files = [os.path.abspath(file_path) for file_path in data_handler.list_files(path)]
+        hashes = {}
+        for file_path in files:
+            modified, file_hash = self.is_modified(file_path)
+            if modified:
+                hashes[file_path] = file_hash
+            else:
+                stats["unchanged_files"] += 1
+
+        with open(self.journal_path, "a") as journal:
+
+            # Parse the changed files only
+            for file_path, chunks, seconds, error in data_handler.ingest_files(list(hashes), chunk_type, chunk_size, chunk_overlap, max_workers):
+
+                # Keep the previous vectors of a file that failed to parse
+                if error is not None:
+                    stats["failed_files"] += 1
+                    continue
+
+                # Journal the chunks about to be written, then embed the new chunks only
+                old_ids = self.files.get(file_path, {}).get("chunks", [])
+                new_chunks, new_ids, removed_ids = self.record_file(file_path, hashes[file_path], chunks)
+                entry = self.files[file_path]
+                self.files[file_path] = {"size": -1, "mtime": -1, "hash": None, "chunks": sorted(set(old_ids).union(new_ids))}
+                self._log(journal, file_path, self.files[file_path])
+                if new_chunks:
+                    vectorstore.add_documents(new_chunks, ids=new_ids)
+                if removed_ids:
+                    vectorstore.delete(ids=removed_ids)
+                self.files[file_path] = entry
+                self._log(journal, file_path, entry)
+                stats["changed_files"] += 1
+                stats["added_chunks"] += len(new_ids)
+                stats["deleted_chunks"] += len(removed_ids)
+
+            # Delete the vectors of the removed files, then forget them
+            removed_files = sorted(set(self.files).difference(files))
+            deleted_ids = [chunk_id for file_path in removed_files for chunk_id in self.files[file_path].get("chunks", [])]
+            if deleted_ids:
+                vectorstore.delete(ids=deleted_ids)
+            for file_path in removed_files:
+                self.remove_file(file_path)
+                self._log(journal, file_path, None)
+            stats["removed_files"] += len(removed_files)
+            stats["deleted_chunks"] += len(deleted_ids)
+
+        # Save the manifest
+        self.save()
+
+        return stats
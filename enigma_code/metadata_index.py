@@ -0,0 +1,159 @@
+# Import the libraries
+import operator
+from collections import defaultdict
+import numpy as np
+
+
+# Comparison operators of the filters
+_OPERATORS = {
+    "$eq": operator.eq,
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+}
+
+
+# Class for indexing metadata
+class MetadataIndex:
+    """
+    Inverted index of chunk metadata, used to filter a vector search before scoring.
+
+    Every (field, value) pair maps to the sorted array of the rows that have it (list values, e.g. tags, index each
+    element). A filter maps fields to conditions:
+        - a value: the field equals the value (or contains it, for list fields),
+        - a list: the field equals any of the values,
+        - a dict of operators: "$eq", "$in", "$gt", "$gte", "$lt", "$lte" (e.g. {"date": {"$gte": "2024-01-01"}}).
+    The fields are combined with AND, starting from the smallest posting list, so the cost of a filter follows its
+    selectivity rather than the size of the corpus.
+    """
+
+    # Constructor function
+    def __init__(self, metadatas=()):
+        """
+        Initialize the MetadataIndex class.
+
+        Args:
+        metadatas (list): The metadata of each row.
+
+        Returns:
+        None
+        """
+        postings = defaultdict(lambda: defaultdict(list))
+        for row, metadata in enumerate(metadatas):
+            for field, value in metadata.items():
+                for element in (value if isinstance(value, (list, tuple, set)) else [value]):
+                    try:
+                        postings[field][element].append(row)
+                    except TypeError:
+                        continue
+        self.size = len(metadatas)
+        self.postings = {field: {value: np.asarray(rows, dtype=np.int64) for value, rows in values.items()} for field, values in postings.items()}
+
+    # Function for getting the rows of a condition
+    def _condition_rows(self, field, condition):
+        values = self.postings.get(field, {})
+
+        # Operators
+        if isinstance(condition, dict):
+            rows = None
+            for name, argument in condition.items():
+                if name == "$in":
+                    matched = [values[v] for v in argument if v in values]
+                elif name in _OPERATORS:
+                    matched = [postings for value, postings in values.items() if self._compare(_OPERATORS[name], value, argument)]
+                else:
+                    raise ValueError(f"Unsupported filter operator: {name}")
+                matched = self._union(matched)
+                rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+            return rows if rows is not None else np.arange(self.size)
+
+        # Any of a list of values
+        if isinstance(condition, list):
+            return self._union([values[v] for v in condition if v in values])
+
+        # A single value
+        return values.get(condition, np.empty(0, dtype=np.int64))
+
+    # Function for comparing a value, ignoring values of another type
+    @staticmethod
+    def _compare(compare, value, argument):
+        try:
+            return compare(value, argument)
+        except TypeError:
+            return False
+
+    # Function for merging posting lists
+    @staticmethod
+    def _union(postings):
+        if not postings:
+            return np.empty(0, dtype=np.int64)
+        if len(postings) == 1:
+            return postings[0]
+        return np.unique(np.concatenate(postings))
+
+    # Function for getting the rows matching a filter
+    def rows(self, filter):
+        """
+        Get the rows matching a filter.
+
+        Args:
+        filter (dict): The filter (see the class docstring).
+
+        Returns:
+        np.ndarray: The sorted rows.
+        """
+        conditions = sorted((self._condition_rows(field, condition) for field, condition in filter.items()), key=len)
+        if not conditions:
+            return np.arange(self.size)
+        rows = conditions[0]
+        for other in conditions[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    # Function for checking a single metadata against a filter
+    @staticmethod
+    def matches(metadata, filter):
+        """
+        Check whether a metadata dict matches a filter, e.g. to post-filter the results of a store without filters.
+        """
+        for field, condition in filter.items():
+            value = metadata.get(field)
+            elements = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            if isinstance(condition, dict):
+                for name, argument in condition.items():
+                    if name == "$in":
+                        ok = any(element in argument for element in elements)
+                    elif name in _OPERATORS:
+                        ok = any(MetadataIndex._compare(_OPERATORS[name], element, argument) for element in elements)
+                    else:
+                        raise ValueError(f"Unsupported filter operator: {name}")
+                    if not ok:
+                        return False
+            elif isinstance(condition, list):
+                if not any(element in condition for element in elements):
+                    return False
+            elif condition not in elements:
+                return False
+        return True
+
+    # Function for converting a filter to a where clause
+    @staticmethod
+    def to_where(filter):
+        """
+        Convert a filter to the where clause of Chroma and Pinecone (a list of values becomes "$in", several fields
+        are combined with "$and").
+        """
+        clauses = []
+        for field, condition in filter.items():
+            if isinstance(condition, dict):
+                clauses.extend({field: {name: argument}} for name, argument in condition.items())
+            elif isinstance(condition, list):
+                clauses.append({field: {"$in": condition}})
+            else:
+                clauses.append({field: {"$eq": condition}})
+        if len(clauses) == 1:
+            return clauses[0]
+        return {"$and": clauses}
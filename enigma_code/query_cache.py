@@ -0,0 +1,218 @@
+# Import the libraries
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from langchain_core.embeddings import Embeddings
+
+
+# Runs of whitespace
+_WHITESPACE = re.compile(r"\s+")
+
+
+# Function for embedding several queries
+def embed_queries(embedding, queries):
+    """
+    Embed several queries through the query path of the embedding model (some models, e.g. Cohere, embed queries
+    and documents differently, so embed_documents would give other vectors). Models with an embed_queries method,
+    and Cohere, embed the queries in one request, other models get one embed_query call per query.
+
+    Returns:
+    list: The embeddings of the queries.
+    """
+    queries = list(queries)
+    if hasattr(embedding, "embed_queries"):
+        return embedding.embed_queries(queries)
+    if type(embedding).__name__ == "CohereEmbeddings":
+        return embedding.embed(queries, input_type="search_query")
+    return [embedding.embed_query(query) for query in queries]
+
+
+# Function for normalizing a query
+def normalize_query(query):
+    """
+    Normalize a query for cache lookups: NFKC, lowercase, and single spaces.
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", query)).strip().lower()
+
+
+# Class for caching query results in memory
+class QueryCache:
+    """
+    Bounded, thread-safe LRU cache with a time to live, for query embeddings and search results.
+
+    Entries expire ttl seconds after they were stored, and the least recently used entry is evicted when the cache
+    holds max_entries. A lookup can pass the version of the index it reads (e.g. LocalVectorStore.version): when the
+    version changes, the cache is emptied, so results of a rebuilt index are never served from the old one.
+    """
+
+    # Constructor function
+    def __init__(self, max_entries=1024, ttl=3600.0):
+        """
+        Initialize the QueryCache class.
+
+        Args:
+        max_entries (int): The maximum number of entries.
+        ttl (float): The number of seconds an entry is valid (None for no expiry).
+
+        Returns:
+        None
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    # Function for getting the number of entries
+    def __len__(self):
+        return len(self._entries)
+
+    # Function for emptying the cache when the version changes
+    def _check_version(self, version):
+        if version is not None and version != self._version:
+            if self._version is not None:
+                self._entries.clear()
+                self.invalidations += 1
+            self._version = version
+
+    # Function for getting an entry
+    def get(self, key, version=None):
+        """
+        Get the value of a key.
+
+        Args:
+        key (hashable): The key.
+        version (hashable): The version of the index, or None.
+
+        Returns:
+        The value, or None if the key is missing or expired.
+        """
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    # Function for storing an entry
+    def put(self, key, value, version=None):
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # Function for getting an entry or computing it
+    def get_or_compute(self, key, compute, version=None):
+        """
+        Get the value of a key, or compute it with compute() and store it. The computation runs outside the lock.
+        """
+        value = self.get(key, version)
+        if value is None:
+            value = compute()
+            self.put(key, value, version)
+        return value
+
+    # Function for emptying the cache
+    def invalidate(self):
+        """
+        Empty the cache, e.g. after the index was rebuilt.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    # Function for getting the cache statistics
+    def stats(self):
+        """
+        Get the number of hits, misses, evictions, expirations and invalidations, the hit rate and the size.
+        """
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0, "evictions": self.evictions, "expirations": self.expirations, "invalidations": self.invalidations, "entries": len(self._entries)}
+
+
+# Class for caching query embeddings
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Embedding model wrapper that caches the query embeddings in a QueryCache, keyed on the normalized query.
+    Document embeddings are passed through (see CachedEmbeddings for a persistent cache of document embeddings).
+    """
+
+    # Constructor function
+    def __init__(self, embedding, cache=None):
+        self.embedding = embedding
+        self.cache = cache if cache is not None else QueryCache()
+
+    # Function for embedding documents
+    def embed_documents(self, texts):
+        return self.embedding.embed_documents(texts)
+
+    # Function for embedding a query
+    def embed_query(self, text):
+        return self.cache.get_or_compute(normalize_query(text), lambda: self.embedding.embed_query(text))
+
+    # Function for embedding several queries (the misses in one batch)
+    def embed_queries(self, texts):
+        keys = [normalize_query(text) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        missing = {key: text for key, text, vector in zip(keys, texts, vectors) if vector is None}
+        if missing:
+            computed = dict(zip(missing, embed_queries(self.embedding, list(missing.values()))))
+            for key, vector in computed.items():
+                self.cache.put(key, vector)
+            vectors = [computed[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        return vectors
+
+
+# Class for caching the results of a retriever
+class CachedRetriever:
+    """
+    Wrapper caching the top-k results of a retriever with a query(query, k) method (the notebook retriever,
+    LocalVectorStore or HybridRetriever), keyed on the normalized query and k. A cached lookup makes no embedding
+    call. The cache is emptied when the version attribute of the retriever changes (the index was rebuilt), when
+    rebind() replaces the retriever, or by invalidate().
+    """
+
+    # Constructor function
+    def __init__(self, retriever, cache=None):
+        self.retriever = retriever
+        self.cache = cache if cache is not None else QueryCache()
+
+    # Function for querying through the cache
+    def query(self, query, k=5):
+        version = getattr(self.retriever, "version", None)
+        return self.cache.get_or_compute((normalize_query(query), k), lambda: self.retriever.query(query, k=k), version)
+
+    # Function for replacing the retriever
+    def rebind(self, retriever):
+        """
+        Query another retriever, emptying the cache if it is not the current one. The retriever is compared by
+        identity on the reference held here, so a new retriever is never mistaken for a collected one.
+        """
+        if retriever is not self.retriever:
+            self.retriever = retriever
+            self.cache.invalidate()
+
+    # Function for emptying the cache
+    def invalidate(self):
+        self.cache.invalidate()
+
+    # Function for getting the cache statistics
+    def stats(self):
+        return self.cache.stats()
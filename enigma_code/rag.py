@@ -1,26 +1,153 @@
 
 
 # Import the libraries
+import asyncio
+import time
 import langchain
+from langchain.chains.conversational_retrieval.base import _get_chat_history
+from langchain_core.prompts import format_document
 
 # TODO: Add docs and create seperate module for RAG
 # TODO: Maybe optimize this
 class RAG:
     
-    def __init__(self, llm, vectorstore):
+    # With history_tokens, the chat history is a TokenBudgetHistory (recent turns plus a rolling summary) instead of
+    # a list of every turn, and with context_tokens the retrieved chunks are packed into that budget (see
+    # enigma_code.chat_memory), so the cost of a turn does not grow with the length of the session. With an
+    # answer_cache (enigma_code.answer_cache.SemanticAnswerCache), paraphrases of a question already answered are
+    # answered from the cache. Its entries are tied to the version of the index: index_version() when given (e.g.
+    # lambda: manager.version for a VectorStoreManager, needed for Chroma and Pinecone), else the version attribute
+    # of the vector store
+    def __init__(self, llm, vectorstore, sparse_index=None, history_tokens=None, context_tokens=None, answer_cache=None, index_version=None):
         self.llm = llm
         self.vectorstore = vectorstore
+        self.sparse_index = sparse_index
+        self.context_tokens = context_tokens
+        self.answer_cache = answer_cache
+        self.index_version = index_version
+        self.history_tokens = history_tokens
         self.setup_chat_chain()
-        self.chat_history = []        
+        self.chat_history = self.new_chat_history()
 
     def setup_chat_chain(self):
+        # With a BM25 index (enigma_code.bm25.BM25Index), fuse keyword and vector search
+        if self.sparse_index is not None:
+            from enigma_code.hybrid import HybridRetriever
+            retriever = HybridRetriever(dense=self.vectorstore, sparse=self.sparse_index)
+        else:
+            retriever = self.vectorstore.as_retriever()
+        if self.context_tokens is not None:
+            from enigma_code.chat_memory import PackedRetriever
+            retriever = PackedRetriever(source=retriever if self.sparse_index is not None else self.vectorstore, max_tokens=self.context_tokens)
         self.chat_chain = langchain.chains.ConversationalRetrievalChain.from_llm(
             self.llm, 
-            self.vectorstore.as_retriever(), 
+            retriever, 
             return_source_documents=True
         )
 
-    def chat_query(self, question):
-        result = self.chat_chain({"question": question, "chat_history": self.chat_history})
-        self.chat_history.append((question, result["answer"]))
-        return result['answer']
\ No newline at end of file
+    # Create an empty chat history (the queries take a chat_history argument, so one RAG can serve many sessions,
+    # see enigma_code.rag_service.RAGService)
+    def new_chat_history(self):
+        if self.history_tokens is not None:
+            from enigma_code.chat_memory import TokenBudgetHistory
+            return TokenBudgetHistory(max_tokens=self.history_tokens, summary_tokens=self.history_tokens // 4, llm=self.llm)
+        return []
+
+    def _history(self, chat_history):
+        return chat_history if isinstance(chat_history, list) else chat_history.as_chat_history()
+
+    def _remember(self, chat_history, question, answer):
+        if isinstance(chat_history, list):
+            chat_history.append((question, answer))
+        else:
+            chat_history.append(question, answer)
+
+    def _version(self):
+        if self.index_version is not None:
+            return self.index_version()
+        return getattr(self.vectorstore, "version", None)
+
+    def _standalone_question(self, question, chat_history):
+        chat_history = (self.chat_chain.get_chat_history or _get_chat_history)(self._history(chat_history))
+        if not chat_history:
+            return question
+        generator = self.chat_chain.question_generator
+        return generator.invoke({"question": question, "chat_history": chat_history})[generator.output_key]
+
+    def chat_query(self, question, chat_history=None):
+        chat_history = self.chat_history if chat_history is None else chat_history
+        if self.answer_cache is None:
+            result = self.chat_chain({"question": question, "chat_history": self._history(chat_history)})
+        else:
+            # Look the standalone question up, and on a miss answer it without the history (it is already condensed)
+            standalone = self._standalone_question(question, chat_history)
+            vector = self.answer_cache.embed(standalone)
+            version = self._version()
+            result = self.answer_cache.lookup(vector, version)
+            if result is None:
+                start = time.perf_counter()
+                result = self.chat_chain({"question": standalone, "chat_history": []})
+                self.answer_cache.store(vector, standalone, result["answer"], result["source_documents"], version, time.perf_counter() - start)
+        self._remember(chat_history, question, result["answer"])
+        return result['answer']
+
+    # Stream the answer of a question: a "sources" event with the retrieved documents, "token" events as the LLM
+    # generates the answer, and an "end" event with the whole answer. Retrieval runs without blocking the event loop
+    # (in a worker thread for synchronous retrievers), so many sessions can share one event loop.
+    async def astream_query(self, question, chat_history=None):
+        chain = self.chat_chain
+        chat_history = self.chat_history if chat_history is None else chat_history
+
+        # Condense the question with the chat history into a standalone question
+        history = (chain.get_chat_history or _get_chat_history)(self._history(chat_history))
+        standalone = question
+        if history:
+            generator = chain.question_generator
+            standalone = (await generator.ainvoke({"question": question, "chat_history": history}))[generator.output_key]
+
+        # Answer from the answer cache
+        loop = asyncio.get_running_loop()
+        if self.answer_cache is not None:
+            start = time.perf_counter()
+            vector = await loop.run_in_executor(None, self.answer_cache.embed, standalone)
+            version = self._version()
+            cached = self.answer_cache.lookup(vector, version)
+            if cached is not None:
+                yield {"type": "sources", "documents": cached["sources"]}
+                yield {"type": "token", "content": cached["answer"]}
+                await loop.run_in_executor(None, self._remember, chat_history, question, cached["answer"])
+                yield {"type": "end", "answer": cached["answer"]}
+                return
+
+        # Retrieve the documents and send them before the answer
+        documents = await chain.retriever.ainvoke(standalone)
+        yield {"type": "sources", "documents": documents}
+
+        # Stream the answer of the "stuff" chain prompt
+        combine = chain.combine_docs_chain
+        context = combine.document_separator.join(format_document(document, combine.document_prompt) for document in documents)
+        prompt = combine.llm_chain.prompt.format_prompt(**{combine.document_variable_name: context, "question": standalone if chain.rephrase_question else question})
+        tokens = []
+        async for chunk in combine.llm_chain.llm.astream(prompt):
+            token = getattr(chunk, "content", chunk)
+            if token:
+                tokens.append(token)
+                yield {"type": "token", "content": token}
+        answer = "".join(tokens)
+        if self.answer_cache is not None:
+            self.answer_cache.store(vector, standalone, answer, documents, version, time.perf_counter() - start)
+        # Folding old turns into the summary calls the LLM, so it runs in a worker thread
+        await loop.run_in_executor(None, self._remember, chat_history, question, answer)
+        yield {"type": "end", "answer": answer}
+
+    async def achat_query(self, question, chat_history=None):
+        answer = None
+        async for event in self.astream_query(question, chat_history):
+            if event["type"] == "end":
+                answer = event["answer"]
+        return answer
+
+    # Release a vector store shared through the IndexRegistry (VectorStoreManager.load_vectorstore(shared=True))
+    def close(self):
+        from enigma_code.index_registry import registry
+        registry.release(self.vectorstore)
@@ -0,0 +1,355 @@
+# Import the libraries
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from enigma_code.rag import RAG
+
+
+# Class for a chat session
+class Session:
+    """
+    Chat history of a session, with the lock serializing its queries (sync and async) and the number of queries
+    using it. ready is set once the history is loaded (a session restored from SQLite is a placeholder until then).
+    """
+
+    # Constructor function
+    def __init__(self, session_id, chat_history=None):
+        self.session_id = session_id
+        self.chat_history = chat_history
+        self.last_used = time.monotonic()
+        self.users = 0
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        if chat_history is not None:
+            self.ready.set()
+
+
+# Class for storing the sessions
+class SessionStore:
+    """
+    Bounded, thread-safe store of chat sessions: an in-memory LRU of at most max_sessions sessions, with an optional
+    SQLite spill.
+
+    When the store is full, the least recently used session leaves the memory, and sessions idle for idle_seconds
+    are evicted by evict_idle(). With sqlite_path, evicted sessions are written to SQLite and loaded back when they
+    are used again; without it, they are dropped. Sessions with a running query are never evicted.
+
+    The SQLite reads and writes run outside the lock of the store, so spilling or restoring a session does not block
+    the other sessions. A session being restored is a placeholder in the store until its history is read (other
+    gets of it wait for it), and a session being spilled is taken back from memory if it is used again before its
+    write is done.
+    """
+
+    # Constructor function
+    def __init__(self, new_history, max_sessions=10000, idle_seconds=1800.0, sqlite_path=None, encode=None, decode=None):
+        """
+        Initialize the SessionStore class.
+
+        Args:
+        new_history (callable): The function creating an empty chat history.
+        max_sessions (int): The maximum number of sessions in memory.
+        idle_seconds (float): The number of seconds after which an unused session is evicted.
+        sqlite_path (str): The path of the SQLite database of the evicted sessions, or None.
+        encode (callable): The function converting a chat history to a JSON-serializable state.
+        decode (callable): The function converting a state back to a chat history.
+
+        Returns:
+        None
+        """
+        self.new_history = new_history
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.encode = encode or (lambda chat_history: chat_history)
+        self.decode = decode or (lambda state: state)
+        self.evictions = 0
+        self.spills = 0
+        self.restores = 0
+        self._sessions = OrderedDict()
+        self._spilling = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = None
+        if sqlite_path is not None:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)")
+            self._db.commit()
+
+    # Function for getting the number of sessions in memory
+    def __len__(self):
+        return len(self._sessions)
+
+    # Function for getting a session
+    def get(self, session_id, use=False):
+        """
+        Get a session, from memory, from SQLite, or new.
+
+        Args:
+        session_id (str): The ID of the session.
+        use (bool): Whether to mark the session as used until release(), so it is not evicted during a query.
+
+        Returns:
+        Session: The session.
+        """
+        restore = False
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                # A session being spilled is taken back, else a placeholder is restored outside the lock
+                spilling = self._spilling.pop(session_id, None)
+                if spilling is not None:
+                    session = spilling[0]
+                else:
+                    session = Session(session_id)
+                    restore = True
+                self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            session.last_used = time.monotonic()
+            session.users += use
+            spills = self._evict_lru(keep=session_id)
+        self._spill(spills)
+
+        if restore:
+            try:
+                session.chat_history = self._restore(session_id)
+            except BaseException:
+                with self._lock:
+                    if self._sessions.get(session_id) is session:
+                        del self._sessions[session_id]
+                raise
+            finally:
+                session.ready.set()
+        else:
+            session.ready.wait()
+            # The restore of the placeholder failed, try again
+            if session.chat_history is None:
+                return self.get(session_id, use)
+        return session
+
+    # Function for releasing a session used by a query
+    def release(self, session):
+        with self._lock:
+            session.users -= 1
+            session.last_used = time.monotonic()
+            spills = self._evict_lru(keep=session.session_id)
+        self._spill(spills)
+
+    # Function for loading a spilled session
+    def _restore(self, session_id):
+        if self._db is not None:
+            with self._db_lock:
+                row = self._db.execute("SELECT state FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+                if row is not None:
+                    self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                    self._db.commit()
+            if row is not None:
+                with self._lock:
+                    self.restores += 1
+                return self.decode(json.loads(row[0]))
+        return self.new_history()
+
+    # Function for removing a session from memory (called with the lock held)
+    def _evict(self, session_id):
+        """
+        Remove a session from memory. With SQLite, the eviction (a new tuple, so that each eviction of the session is
+        told apart) is returned to be written by _spill once the lock is released.
+        """
+        session = self._sessions.pop(session_id)
+        self.evictions += 1
+        if self._db is not None:
+            spilling = self._spilling[session_id] = (session, self.evictions)
+            return spilling
+        return None
+
+    # Function for writing evicted sessions to SQLite (called without the lock)
+    def _spill(self, spills):
+        for spilling in spills:
+            if spilling is None:
+                continue
+            session = spilling[0]
+            with self._db_lock:
+                # Skip the sessions taken back (or deleted) since this eviction
+                with self._lock:
+                    if self._spilling.get(session.session_id) is not spilling:
+                        continue
+                state = json.dumps(self.encode(session.chat_history))
+                self._db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", (session.session_id, state, time.time()))
+                self._db.commit()
+                with self._lock:
+                    # A session taken back meanwhile stays in memory (its row is replaced by its next spill)
+                    if self._spilling.get(session.session_id) is spilling:
+                        del self._spilling[session.session_id]
+                    self.spills += 1
+
+    # Function for evicting the least recently used sessions over the limit (the sessions in use or being restored
+    # can keep the store over the limit until they are released)
+    def _evict_lru(self, keep=None):
+        spills = []
+        for session_id in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions:
+                break
+            session = self._sessions[session_id]
+            if session_id != keep and not session.users and session.ready.is_set():
+                spills.append(self._evict(session_id))
+        return spills
+
+    # Function for evicting the idle sessions
+    def evict_idle(self):
+        """
+        Evict the sessions idle for idle_seconds.
+
+        Returns:
+        int: The number of evicted sessions.
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = [session_id for session_id, session in self._sessions.items() if now - session.last_used >= self.idle_seconds and not session.users and session.ready.is_set()]
+            spills = [self._evict(session_id) for session_id in idle]
+        self._spill(spills)
+        return len(idle)
+
+    # Function for deleting a session
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._spilling.pop(session_id, None)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                self._db.commit()
+
+    # Function for getting the store statistics
+    def stats(self):
+        spilled = 0
+        if self._db is not None:
+            with self._db_lock:
+                spilled = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        with self._lock:
+            return {"sessions": len(self._sessions), "spilled": spilled, "evictions": self.evictions, "spills": self.spills, "restores": self.restores}
+
+    # Function for closing the store
+    def close(self):
+        """
+        Spill the sessions in memory (with SQLite) and close the database.
+        """
+        if self._db is None:
+            return
+        with self._lock:
+            spills = [self._evict(session_id) for session_id in list(self._sessions) if self._sessions[session_id].ready.is_set()]
+        self._spill(spills)
+        with self._db_lock:
+            self._db.close()
+            self._db = None
+
+
+# Class for serving many chat sessions
+class RAGService:
+    """
+    Session-aware RAG: one chain and retriever shared by every session, with the chat history of each session in a
+    SessionStore.
+
+    Queries of different sessions run concurrently, and queries of one session are serialized by its lock (the same
+    lock for chat_query and astream_query, taken in an executor thread by the async path), so its history stays
+    consistent. evict_idle() should be called periodically (e.g. by a background task) to release the
+    idle sessions.
+    """
+
+    # Constructor function
+    def __init__(self, llm, vectorstore, sparse_index=None, history_tokens=None, context_tokens=None, answer_cache=None, index_version=None, max_sessions=10000, idle_seconds=1800.0, sqlite_path=None):
+        """
+        Initialize the RAGService class.
+
+        Args:
+        llm (BaseLanguageModel): The language model.
+        vectorstore (VectorStore): The vector store.
+        sparse_index, history_tokens, context_tokens, answer_cache, index_version: The options of RAG.
+        max_sessions (int): The maximum number of sessions in memory.
+        idle_seconds (float): The number of seconds after which an unused session is evicted.
+        sqlite_path (str): The path of the SQLite database of the evicted sessions, or None to drop them.
+
+        Returns:
+        None
+        """
+        self.rag = RAG(llm, vectorstore, sparse_index=sparse_index, history_tokens=history_tokens, context_tokens=context_tokens, answer_cache=answer_cache, index_version=index_version)
+        self.sessions = SessionStore(self.rag.new_chat_history, max_sessions=max_sessions, idle_seconds=idle_seconds, sqlite_path=sqlite_path, encode=self._encode, decode=self._decode)
+
+    # Function for converting a chat history to a state
+    @staticmethod
+    def _encode(chat_history):
+        if isinstance(chat_history, list):
+            return {"turns": [list(turn) for turn in chat_history]}
+        return chat_history.to_dict()
+
+    # Function for converting a state to a chat history
+    def _decode(self, state):
+        chat_history = self.rag.new_chat_history()
+        if isinstance(chat_history, list):
+            chat_history.extend(tuple(turn) for turn in state["turns"])
+        else:
+            chat_history.load_dict(state)
+        return chat_history
+
+    # Function for answering a question of a session
+    def chat_query(self, session_id, question):
+        session = self.sessions.get(session_id, use=True)
+        try:
+            with session.lock:
+                return self.rag.chat_query(question, chat_history=session.chat_history)
+        finally:
+            self.sessions.release(session)
+
+    # Function for taking the lock of a session without blocking the event loop
+    @staticmethod
+    async def _acquire(session):
+        if session.lock.acquire(blocking=False):
+            return
+        acquired = asyncio.get_running_loop().run_in_executor(None, session.lock.acquire)
+        try:
+            await asyncio.shield(acquired)
+        except asyncio.CancelledError:
+            # The executor thread still takes the lock: give it back when it does
+            acquired.add_done_callback(lambda _: session.lock.release())
+            raise
+
+    # Function for streaming the answer of a question of a session (see RAG.astream_query)
+    async def astream_query(self, session_id, question):
+        """
+        Stream the answer of a question of a session. The session is released (and its lock given back) when the
+        stream ends, fails, or is closed before its end.
+        """
+        session = self.sessions.get(session_id, use=True)
+        try:
+            await self._acquire(session)
+            try:
+                async for event in self.rag.astream_query(question, chat_history=session.chat_history):
+                    yield event
+            finally:
+                session.lock.release()
+        finally:
+            self.sessions.release(session)
+
+    # Function for answering a question of a session asynchronously
+    async def achat_query(self, session_id, question):
+        answer = None
+        async for event in self.astream_query(session_id, question):
+            if event["type"] == "end":
+                answer = event["answer"]
+        return answer
+
+    # Function for getting the chat history of a session
+    def chat_history(self, session_id):
+        return self.sessions.get(session_id).chat_history
+
+    # Function for ending a session
+    def end_session(self, session_id):
+        self.sessions.delete(session_id)
+
+    # Function for evicting the idle sessions
+    def evict_idle(self):
+        return self.sessions.evict_idle()
+
+    # Function for closing the service
+    def close(self):
+        self.sessions.close()
@@ -0,0 +1,359 @@
+# Import the libraries
+import heapq
+import itertools
+import json
+import os
+import uuid
+import weakref
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from langchain.schema import Document
+from langchain_core.vectorstores import VectorStore
+from enigma_code.local_store import LocalVectorStore
+from enigma_code.query_cache import embed_queries
+
+
+# Shards loaded by the current worker process, by folder: (stamp, arguments, shard)
+_WORKER_SHARDS = {}
+
+
+# Function for shutting down the executors of a store (also its finalizer, so it must not hold the store)
+def _shutdown(executors):
+    for executor in executors:
+        executor.shutdown(wait=False, cancel_futures=True)
+    executors.clear()
+
+
+# Function for searching a saved shard in a worker process
+def _search_saved_shard(folder_path, shard_kwargs, vectors, k, filter, pinned=None):
+    """
+    Search a saved shard, loading it (memory-mapped) the first time the worker process sees it. A shard saved again
+    since is loaded again in place of the old copy, and the shards of other folders than pinned (the folders of the
+    shards assigned to this worker) are dropped.
+
+    Returns:
+    list: The (score, text, metadata, ID) results of each vector, best first.
+    """
+    if pinned is not None:
+        for stale in set(_WORKER_SHARDS) - set(pinned):
+            del _WORKER_SHARDS[stale]
+    stamp = os.stat(os.path.join(folder_path, "docstore.json")).st_mtime_ns
+    arguments = tuple(sorted(shard_kwargs.items()))
+    if folder_path not in _WORKER_SHARDS or _WORKER_SHARDS[folder_path][:2] != (stamp, arguments):
+        _WORKER_SHARDS.pop(folder_path, None)
+        _WORKER_SHARDS[folder_path] = (stamp, arguments, LocalVectorStore.load_local(folder_path, None, **shard_kwargs))
+    shard = _WORKER_SHARDS[folder_path][2]
+    return [[(float(score), shard.texts[row], shard.metadatas[row], shard.ids[row]) for row, score in zip(rows, scores)] for rows, scores in shard._search_many(vectors, k, filter=filter)]
+
+
+# Class for storing vectors in shards
+class ShardedVectorStore(VectorStore):
+    """
+    Dense vector store split into n_shards LocalVectorStore shards, for indexes that do not fit in one process.
+
+    Documents are assigned to a shard by a hash of their ID, so a document always lives in the same shard and
+    upserts and deletes touch one shard. A search runs on all the shards in parallel and the per-shard top k are
+    merged with a heap. Saved shards are memory-mapped, so with workers="threads" the shards are searched by
+    threads of this process (numpy releases the GIL), and with workers="processes" by worker processes that each
+    map the shard files (the pages are shared through the page cache). Changes that are not saved yet are
+    searched with threads.
+
+    With workers="processes", each shard is pinned to one worker process (shard i to worker i % max_workers), so
+    every shard is loaded by a single worker, and a store loaded with load_local only loads a shard in this process
+    when it is changed or searched with threads.
+
+    rebalance(n_shards) redistributes the documents over a new number of shards, e.g. when the machine gets more
+    cores.
+
+    close() shuts the threads and worker processes down (the store can still be used, they are started again when
+    needed); the store is also a context manager, and the executors of a store that is garbage collected without
+    being closed are shut down by a finalizer.
+    """
+
+    # Constructor function
+    def __init__(self, embedding, n_shards=None, workers="threads", max_workers=None, **shard_kwargs):
+        """
+        Initialize the ShardedVectorStore class.
+
+        Args:
+        embedding (Embeddings): The embedding model.
+        n_shards (int): The number of shards (the number of CPUs by default).
+        workers (str): How the shards are searched ("threads" or "processes").
+        max_workers (int): The number of threads or processes (n_shards by default).
+        shard_kwargs: Arguments of the LocalVectorStore shards (e.g. storage="int8").
+
+        Returns:
+        None
+        """
+        if workers not in ("threads", "processes"):
+            raise ValueError(f"Unsupported workers: {workers}")
+        self.embedding = embedding
+        self.n_shards = n_shards or os.cpu_count() or 1
+        self.workers = workers
+        self.max_workers = max_workers
+        self.shard_kwargs = shard_kwargs
+        self._shards = [LocalVectorStore(embedding, **shard_kwargs) for _ in range(self.n_shards)]
+        self.folder_path = None
+        self._saved_versions = None
+        self._saved_sizes = None
+        self._mmap = True
+        self._generation = 0
+        self._threads = None
+        self._processes = []
+        self._executors = []
+        self._finalizer = weakref.finalize(self, _shutdown, self._executors)
+
+    # Property for getting the shards
+    @property
+    def shards(self):
+        """
+        The LocalVectorStore shards (the saved shards not loaded yet are loaded).
+        """
+        return [self._shard(index) for index in range(self.n_shards)]
+
+    # Setter for the shards
+    @shards.setter
+    def shards(self, shards):
+        self._shards = list(shards)
+
+    # Function for getting a shard, loading it if needed
+    def _shard(self, index):
+        if self._shards[index] is None:
+            self._shards[index] = LocalVectorStore.load_local(self._shard_path(self.folder_path, index), self.embedding, mmap=self._mmap, **self.shard_kwargs)
+        return self._shards[index]
+
+    # Function for getting the number of vectors of a shard
+    def _shard_size(self, index):
+        shard = self._shards[index]
+        return self._saved_sizes[index] if shard is None else len(shard)
+
+    # Property for getting the embedding model
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    # Property for getting the version of the store
+    @property
+    def version(self):
+        return (self._generation, sum(shard.version for shard in self._shards if shard is not None))
+
+    # Function for getting the number of vectors
+    def __len__(self):
+        return sum(self._shard_size(index) for index in range(self.n_shards))
+
+    # Function for getting the shard of an ID
+    def shard_of(self, id_):
+        return zlib.crc32(str(id_).encode("utf-8")) % self.n_shards
+
+    # Function for adding embeddings
+    def add_embeddings(self, text_embeddings, metadatas=None, ids=None, **kwargs):
+        """
+        Add (or replace) texts with their precomputed embeddings, each in the shard of its ID.
+
+        Returns:
+        list: The IDs of the texts.
+        """
+        text_embeddings = list(text_embeddings)
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in text_embeddings]
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in text_embeddings]
+        groups = {}
+        for index, id_ in enumerate(ids):
+            groups.setdefault(self.shard_of(id_), []).append(index)
+        for shard, indices in groups.items():
+            shard_ids = [ids[i] for i in indices]
+            self._shard(shard).delete(shard_ids)
+            self._shard(shard).add_embeddings([text_embeddings[i] for i in indices], metadatas=[metadatas[i] for i in indices], ids=shard_ids)
+        return ids
+
+    # Function for adding texts
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        return self.add_embeddings(zip(texts, self.embedding.embed_documents(texts)), metadatas=metadatas, ids=ids)
+
+    # Function for deleting vectors
+    def delete(self, ids=None, **kwargs):
+        groups = {}
+        for id_ in ids or []:
+            groups.setdefault(self.shard_of(id_), []).append(id_)
+        for shard, shard_ids in groups.items():
+            self._shard(shard).delete(shard_ids)
+        return True
+
+    # Function for redistributing the documents over a new number of shards
+    def rebalance(self, n_shards):
+        """
+        Move the documents to n_shards shards, by the hash of their ID. Save the store afterwards to write the new
+        shards (and to search them with worker processes again).
+        """
+        old_shards = self.shards
+        self.n_shards = n_shards
+        self._shards = [LocalVectorStore(self.embedding, **self.shard_kwargs) for _ in range(n_shards)]
+        for shard in old_shards:
+            if len(shard):
+                self.add_embeddings(zip(shard.texts, shard.vectors), metadatas=shard.metadatas, ids=shard.ids)
+        self._generation += 1
+        self._saved_versions = None
+        self._saved_sizes = None
+
+    # Function for getting the thread pool
+    def _thread_pool(self):
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(max_workers=self.max_workers or self.n_shards, thread_name_prefix="shard")
+            self._executors.append(self._threads)
+        return self._threads
+
+    # Function for getting the worker process of a shard
+    def _process_pool(self, index):
+        """
+        Get the single-process pool the shard is pinned to. The pools are created again when the number of shards
+        changes the number of workers.
+        """
+        n_workers = min(self.max_workers or self.n_shards, self.n_shards)
+        if len(self._processes) != n_workers:
+            for pool in self._processes:
+                pool.shutdown(wait=False)
+                self._executors.remove(pool)
+            self._processes = [ProcessPoolExecutor(max_workers=1) for _ in range(n_workers)]
+            self._executors.extend(self._processes)
+        return self._processes[index % n_workers]
+
+    # Function for shutting down the threads and worker processes
+    def close(self):
+        _shutdown(self._executors)
+        self._threads = None
+        self._processes = []
+
+    # Function for entering the context of the store
+    def __enter__(self):
+        return self
+
+    # Function for exiting the context of the store
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Function for searching all the shards
+    def _search_many(self, vectors, k, filter=None):
+        """
+        Search the shards in parallel and merge their top k with a heap.
+
+        Returns:
+        list: The (score, text, metadata, ID) results of each vector, best first.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+
+        # Saved and unchanged shards are searched by the worker processes
+        saved = self._saved_versions is not None and all(shard is None or shard.version == version for shard, version in zip(self._shards, self._saved_versions))
+        if self.workers == "processes" and saved:
+            futures = []
+            for index in range(self.n_shards):
+                if self._shard_size(index):
+                    pool = self._process_pool(index)
+                    pinned = [self._shard_path(self.folder_path, other) for other in range(index % len(self._processes), self.n_shards, len(self._processes))]
+                    futures.append(pool.submit(_search_saved_shard, self._shard_path(self.folder_path, index), self.shard_kwargs, vectors, k, filter, pinned))
+        else:
+            def search(shard):
+                return [[(float(score), shard.texts[row], shard.metadatas[row], shard.ids[row]) for row, score in zip(rows, scores)] for rows, scores in shard._search_many(vectors, k, filter=filter)]
+            futures = [self._thread_pool().submit(search, shard) for shard in self.shards if len(shard)]
+        shard_results = [future.result() for future in futures]
+
+        # Merge the sorted results of the shards
+        return [list(itertools.islice(heapq.merge(*(results[query] for results in shard_results), key=lambda result: -result[0]), k)) for query in range(len(vectors))]
+
+    # Function for searching several vectors at once
+    def similarity_search_many_by_vector(self, embeddings, k=4, filter=None):
+        return [[(Document(page_content=text, metadata=dict(metadata)), score) for score, text, metadata, _ in results] for results in self._search_many(embeddings, k, filter=filter)]
+
+    # Function for searching by vector with scores
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return self.similarity_search_many_by_vector([embedding], k, filter=filter)[0]
+
+    # Function for searching by vector
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    # Function for searching by text with scores
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    # Function for searching by text
+    def similarity_search(self, query, k=4, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    # Function for getting the relevance score function
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1) / 2
+
+    # Function for querying like the notebook retriever
+    def query(self, query, k=5, filter=None):
+        results = self._search_many([self.embedding.embed_query(query)], k, filter=filter)[0]
+        return [{"page_content": text, "similarity": score} for score, text, _, _ in results]
+
+    # Function for querying several queries at once
+    def query_many(self, queries, k=5, filter=None):
+        queries = list(queries)
+        if not queries:
+            return []
+        return [[{"page_content": text, "similarity": score} for score, text, _, _ in results] for results in self._search_many(embed_queries(self.embedding, queries), k, filter=filter)]
+
+    # Function for creating a store from texts
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, **kwargs):
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    # Function for creating a store from embeddings
+    @classmethod
+    def from_embeddings(cls, text_embeddings, embedding, metadatas=None, ids=None, **kwargs):
+        store = cls(embedding, **kwargs)
+        store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        return store
+
+    # Function for getting the folder of a shard
+    @staticmethod
+    def _shard_path(folder_path, index):
+        return os.path.join(folder_path, f"shard_{index:04d}")
+
+    # Function for saving the store
+    def save_local(self, folder_path):
+        """
+        Save every shard to its own folder (shard_0000, shard_0001, ...) and the number of shards to shards.json.
+        The shards that were not loaded are already saved there when the folder is the one the store was loaded from.
+        """
+        os.makedirs(folder_path, exist_ok=True)
+        same_folder = self.folder_path == os.path.realpath(folder_path)
+        for index in range(self.n_shards):
+            if self._shards[index] is not None or not same_folder:
+                self._shard(index).save_local(self._shard_path(folder_path, index))
+        with open(os.path.join(folder_path, "shards.json"), "w") as f:
+            json.dump({"n_shards": self.n_shards}, f)
+        self.folder_path = os.path.realpath(folder_path)
+        self._saved_versions = [0 if shard is None else shard.version for shard in self._shards]
+        self._saved_sizes = [self._shard_size(index) for index in range(self.n_shards)]
+
+    # Function for loading a saved store
+    @classmethod
+    def load_local(cls, folder_path, embeddings, mmap=True, **kwargs):
+        """
+        Load a saved store, memory-mapping the vectors of every shard. The store keeps its saved number of shards
+        (an n_shards argument is ignored, see rebalance). With workers="processes", the shards are searched by the
+        worker processes, so they are only loaded here when they are changed (or searched with threads).
+
+        Returns:
+        ShardedVectorStore: The store.
+        """
+        with open(os.path.join(folder_path, "shards.json"), "r") as f:
+            n_shards = json.load(f)["n_shards"]
+        kwargs.pop("n_shards", None)
+        store = cls(embeddings, n_shards=n_shards, **kwargs)
+        store.folder_path = os.path.realpath(folder_path)
+        store._mmap = mmap
+        if store.workers == "processes":
+            store._shards = [None] * n_shards
+            store._saved_sizes = [len(np.load(os.path.join(cls._shard_path(folder_path, index), "vectors.npy"), mmap_mode="r")) for index in range(n_shards)]
+        else:
+            store._shards = [LocalVectorStore.load_local(cls._shard_path(folder_path, index), embeddings, mmap=mmap, **store.shard_kwargs) for index in range(n_shards)]
+            store._saved_sizes = [len(shard) for shard in store._shards]
+        store._saved_versions = [0 if shard is None else shard.version for shard in store._shards]
+        return store
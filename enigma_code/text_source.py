@@ -0,0 +1,142 @@
+# Import the libraries
+import codecs
+import mmap
+import os
+from langchain.schema import Document
+
+
+# Byte order marks and their encodings
+_BOMS = [
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+
+# Class for reading a large text file through a memory map
+class MappedTextFile:
+    """
+    Memory-mapped text source for very large plain-text files.
+
+    The file is never read into a single string: it is mapped, decoded block by block with an incremental decoder
+    (so a multi-byte character cut by a block boundary is decoded with the next block), and handed out as documents
+    of about block_size bytes that end on a paragraph or line break. The mapped pages are backed by the file, so the
+    resident memory stays close to one block whatever the size of the file.
+    """
+
+    # Constructor function
+    def __init__(self, file_path, encoding=None, errors="replace", sample_size=1 << 20):
+        """
+        Initialize the MappedTextFile class.
+
+        Args:
+        file_path (str): The path to the text file.
+        encoding (str): The encoding of the file, detected from a sample of the file when None.
+        errors (str): How to handle bytes that cannot be decoded ("strict", "replace" or "ignore").
+        sample_size (int): The number of bytes used to detect the encoding.
+
+        Returns:
+        None
+        """
+        self.file_path = file_path
+        self.errors = errors
+        self.size = os.path.getsize(file_path)
+        self.encoding = encoding or self.detect_encoding(file_path, sample_size)
+
+    # Function for detecting the encoding of a file
+    @staticmethod
+    def detect_encoding(file_path, sample_size=1 << 20):
+        """
+        Detect the encoding of a file from its first sample_size bytes.
+
+        The byte order mark is checked first, then UTF-8, then charset_normalizer (if it is installed), and latin-1
+        is the last resort since it decodes any byte.
+
+        Returns:
+        str: The encoding.
+        """
+        with open(file_path, "rb") as f:
+            sample = f.read(sample_size)
+
+        # Byte order mark
+        for bom, encoding in _BOMS:
+            if sample.startswith(bom):
+                return encoding
+
+        # UTF-8 (the sample may end in the middle of a character)
+        try:
+            codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+            return "utf-8"
+        except UnicodeDecodeError:
+            pass
+
+        # Statistical detection
+        try:
+            from charset_normalizer import from_bytes
+            match = from_bytes(sample).best()
+            if match is not None:
+                return match.encoding
+        except ImportError:
+            pass
+
+        return "latin-1"
+
+    # Function for iterating over the decoded blocks
+    def iter_blocks(self, block_size=1 << 20):
+        """
+        Yield the text of the file block by block.
+
+        Args:
+        block_size (int): The number of bytes decoded at a time.
+
+        Yields:
+        str: The decoded text of the next block.
+        """
+        if self.size == 0:
+            return
+
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors=self.errors)
+        with open(self.file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+
+            # The file is read front to back
+            if hasattr(mapped, "madvise"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+
+            for position in range(0, self.size, block_size):
+                final = position + block_size >= self.size
+                yield decoder.decode(mapped[position:position + block_size], final=final)
+
+    # Function for iterating over the documents
+    def iter_documents(self, block_size=1 << 20):
+        """
+        Yield the file as documents of about block_size bytes, cut after the last paragraph break of a block (or the
+        last line break if there is none). Text without any line break is cut at four times block_size.
+
+        Args:
+        block_size (int): The number of bytes decoded at a time.
+
+        Yields:
+        Document: The next part of the file, with its source and its character offset (start_index).
+        """
+        pending = ""
+        start_index = 0
+        for text in self.iter_blocks(block_size):
+            pending += text
+
+            # Cut on a paragraph or line break
+            cut = pending.rfind("\n\n")
+            cut = cut + 2 if cut != -1 else pending.rfind("\n") + 1
+            if cut == 0 and len(pending) >= 4 * block_size:
+                cut = len(pending)
+            if cut == 0:
+                continue
+
+            yield Document(page_content=pending[:cut], metadata={"source": self.file_path, "start_index": start_index})
+            start_index += cut
+            pending = pending[cut:]
+
+        # Rest of the file
+        if pending:
+            yield Document(page_content=pending, metadata={"source": self.file_path, "start_index": start_index})
@@ -7,6 +7,12 @@ sys.path.append(os.path.abspath(os.path.join('./../..')))
 
 # Import all modules
 from imports import *
+from enigma_code.query_cache import CachedRetriever, QueryCache
+
+# Cache of the policy lookups, keyed on the normalized query (emptied when the retriever is replaced or its version
+# changes, see policy_cache.stats() for the hit rate)
+policy_cache = QueryCache(max_entries=256, ttl=3600)
+policy_retriever = CachedRetriever(retriever, policy_cache)
 
 # Function to lookup a policy based on a query
 @tool
@@ -14,5 +20,8 @@ def lookup_policy(query: str) -> str:
     """Consult the company policies to check whether certain options are permitted.
     Use this before making any flight changes performing other 'write' events.
     """
-    # Query the retriever for the top 2 most similar documents and join their content
-    return "\n\n".join([doc["page_content"] for doc in retriever.query(query, k=2)])
\ No newline at end of file
+    # Query the retriever (the notebook retriever, or a HybridRetriever to also match policy codes exactly) for the
+    # top 2 most similar documents, through the cache, and join their content
+    policy_retriever.rebind(retriever)
+    results = policy_retriever.query(query, k=2)
+    return "\n\n".join([doc["page_content"] for doc in results])
\ No newline at end of file
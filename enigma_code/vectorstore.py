@@ -1,29 +1,75 @@
 
 # Import the libraries
-from langchain.embeddings import *
-from langchain.vectorstores import *
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from enigma_code.metadata_index import MetadataIndex
+
+
+# Function for importing a backend from its import path
+def import_backend(path):
+    """
+    Import a backend from its import path ("package.module:attribute"), so that a backend's integration is only
+    imported when it is selected.
+    """
+    module_name, _, attribute = path.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+# Class for limiting the rate of requests
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces requests evenly to stay under a number of requests per minute.
+    """
+
+    # Constructor function
+    def __init__(self, requests_per_minute=None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Function for waiting for the next request slot
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
 
 # Class for handling vector stores
 class VectorStoreManager:
 
-    # Dictionary of embedding models
+    # Dictionary of embedding models (import path and keyword arguments, imported when selected)
     EMBEDDING_MODELS = {
-        "openai": OpenAIEmbeddings,
-        "ollama": lambda: OllamaEmbeddings(model="llama3"),
-        "huggingface": lambda: HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"),
-        "cohere": lambda: CohereEmbeddings(user_agent="langchain"),
+        "openai": ("langchain_community.embeddings:OpenAIEmbeddings", {}),
+        "ollama": ("langchain_community.embeddings:OllamaEmbeddings", {"model": "llama3"}),
+        "huggingface": ("langchain_community.embeddings:HuggingFaceEmbeddings", {"model_name": "sentence-transformers/all-MiniLM-L6-v2"}),
+        "cohere": ("langchain_community.embeddings:CohereEmbeddings", {"user_agent": "langchain"}),
     }
 
-    # Dictionary of vector stores
+    # Dictionary of vector stores (import paths, imported when selected)
     VECTOR_STORES = {
-        "pinecone": Pinecone,
-        "faiss": FAISS,
-        "annoy": Annoy,
-        "chroma": Chroma,
+        "pinecone": "langchain_community.vectorstores:Pinecone",
+        "faiss": "enigma_code.faiss_store:IDMapFAISS",
+        "annoy": "enigma_code.annoy_store:DeltaAnnoy",
+        "chroma": "langchain_community.vectorstores:Chroma",
+        "local": "enigma_code.local_store:LocalVectorStore",
+        "sharded": "enigma_code.sharded_store:ShardedVectorStore",
     }
 
     # Constructor function
-    def __init__(self, vectorstore_name, embedding_model, index_name=None, vectorstore_path=None):
+    def __init__(self, vectorstore_name, embedding_model, index_name=None, vectorstore_path=None, embedding_cache_path=None, embedding_cache_bytes=1 << 30, query_cache_entries=0, vectorstore_kwargs=None):
         """
         Initialize the VectorStoreHandler class.
 
@@ -31,7 +77,14 @@ class VectorStoreManager:
         vectorstore_name (str): The name of the vector store.
         embedding_model (str): The name of the embedding model.
         index_name (str): The name of the index (for Pinecone).
-        vectorstore_path (str): The path to the vector store (for FAISS and Annoy).
+        vectorstore_path (str): The path to the vector store (for FAISS, Annoy, local and sharded).
+        embedding_cache_path (str): The path to a persistent embedding cache (see CachedEmbeddings), or None.
+        embedding_cache_bytes (int): The maximum size of the embedding cache in bytes.
+        query_cache_entries (int): The number of query embeddings cached in memory (see CachedQueryEmbeddings), or 0.
+        vectorstore_kwargs (dict): Extra arguments of the local and sharded vector stores (e.g. {"storage": "int8"} or {"n_shards": 8}).
+
+        The version attribute is incremented whenever the vector store is loaded or changed, to invalidate the caches
+        of its results (see QueryCache).
 
         Returns:
         None
@@ -40,8 +93,15 @@ class VectorStoreManager:
         self.embedding_model = embedding_model.lower()
         self.index_name = index_name
         self.vectorstore_path = vectorstore_path
+        self.embedding_cache_path = embedding_cache_path
+        self.embedding_cache_bytes = embedding_cache_bytes
+        self.query_cache_entries = query_cache_entries
+        self.vectorstore_kwargs = vectorstore_kwargs or {}
         self.embedding = self._load_embedding_model()
         self.vectorstore = None
+        self.version = 0
+        self._shared = False
+        self._faiss_metadata = None
 
     # Function to load the embedding model
     def _load_embedding_model(self):
@@ -52,39 +112,450 @@ class VectorStoreManager:
         Embeddings: The embedding model
         """
 
+        # Load the embedding model (an import path with its arguments, or a factory function)
+        entry = self.EMBEDDING_MODELS[self.embedding_model]
+        if isinstance(entry, tuple):
+            path, kwargs = entry
+            embedding = import_backend(path)(**kwargs)
+        elif isinstance(entry, str):
+            embedding = import_backend(entry)()
+        else:
+            embedding = entry()
+
+        # Cache the embeddings on disk
+        if self.embedding_cache_path is not None:
+            from enigma_code.embedding_cache import CachedEmbeddings
+            model_name = CachedEmbeddings._default_model_name(embedding)
+            embedding = CachedEmbeddings(embedding, self.embedding_cache_path, model_name=f"{self.embedding_model}:{model_name}", max_bytes=self.embedding_cache_bytes)
+
+        # Cache the query embeddings in memory (repeated questions make no embedding call)
+        if self.query_cache_entries:
+            from enigma_code.query_cache import CachedQueryEmbeddings, QueryCache
+            embedding = CachedQueryEmbeddings(embedding, QueryCache(max_entries=self.query_cache_entries))
+
         # Return the embedding model
-        return self.EMBEDDING_MODELS[self.embedding_model]()
+        return embedding
     
     
+    # Function to get the vector store class
+    def _vectorstore_class(self):
+        """
+        Get the class of the vector store, importing it the first time it is used.
+
+        Returns:
+        type: The VectorStore class.
+        """
+        entry = self.VECTOR_STORES[self.vectorstore_name]
+        return import_backend(entry) if isinstance(entry, str) else entry
+
     # Function to load an existing vector store
-    def load_vectorstore(self):
+    def load_vectorstore(self, shared=False):
         """
         Load an existing vector store
 
+        Args:
+        shared (bool): Whether to share the loaded store with the other managers of the same index through the
+        process-wide IndexRegistry (see release()), instead of loading a private copy.
+
         Returns:
         VectorStore: The vector store object.
 
         """
+        self.release()
+        if shared:
+            from enigma_code.index_registry import folder_stamp, registry
+            stamp = folder_stamp(self.vectorstore_path) if self.vectorstore_name in ("faiss", "annoy", "local", "sharded") else None
+            self.vectorstore = registry.acquire(self.registry_key(), self._load_vectorstore, stamp)
+        else:
+            self.vectorstore = self._load_vectorstore()
+        self._shared = shared
+        self.version += 1
+        return self.vectorstore
+
+    # Function for getting the key of the index in the registry
+    def registry_key(self):
+        """
+        Get the key of the index in the IndexRegistry: the backend, the path (or index name) and the embedding model.
+        """
+        location = os.path.abspath(self.vectorstore_path) if self.vectorstore_path else self.index_name
+        return (self.vectorstore_name, location, self.embedding_model, repr(sorted(self.vectorstore_kwargs.items())))
+
+    # Function for releasing a shared vector store
+    def release(self):
+        """
+        Release the vector store. A store loaded with load_vectorstore(shared=True) is released to the registry, so
+        that it can evict it once no manager uses it; a private store is closed (e.g. the worker processes of the
+        sharded store are shut down).
+        """
+        if self.vectorstore is None:
+            return
+        if self._shared:
+            from enigma_code.index_registry import registry
+            registry.release(self.vectorstore)
+        elif hasattr(self.vectorstore, "close"):
+            self.vectorstore.close()
+        self.vectorstore = None
+        self._shared = False
+
+    # Function for deserializing the vector store
+    def _load_vectorstore(self):
 
         # Get the VectorStore class
-        VectorStore = self.VECTOR_STORES[self.vectorstore_name]
+        VectorStore = self._vectorstore_class()
         
         # Pinecone
         if self.vectorstore_name == "pinecone":
-            self.vectorstore = VectorStore.from_existing_index(index_name=self.index_name, embedding=self.embedding)
+            return VectorStore.from_existing_index(index_name=self.index_name, embedding=self.embedding)
         
-        # FAISS
+        # FAISS (the saved version is resolved once, so all its files come from the same save)
         elif self.vectorstore_name == "faiss":
-            self.vectorstore = VectorStore.load_local(folder_path=self.vectorstore_path, embeddings=self.embedding, allow_dangerous_deserialization=True)
+            return VectorStore.load_local(folder_path=os.path.realpath(self.vectorstore_path), embeddings=self.embedding, allow_dangerous_deserialization=True)
         
         # Annoy
         elif self.vectorstore_name == "annoy":
-            self.vectorstore = VectorStore.load_local(folder_path=self.vectorstore_path, embeddings=self.embedding)
+            return VectorStore.load_local(folder_path=os.path.realpath(self.vectorstore_path), embeddings=self.embedding)
         
+        # Local and sharded
+        elif self.vectorstore_name in ("local", "sharded"):
+            return VectorStore.load_local(folder_path=os.path.realpath(self.vectorstore_path), embeddings=self.embedding, **self.vectorstore_kwargs)
+
         # Chroma
         elif self.vectorstore_name == "chroma":
-            self.vectorstore = VectorStore(collection_name="your_collection_name", embedding_function=self.embedding, persist_directory="./chroma_db")
-        
+            return VectorStore(collection_name=self.index_name or "your_collection_name", embedding_function=self.embedding, persist_directory=self.vectorstore_path or "./chroma_db")
+
+    # Function for embedding a single batch
+    def _embed_batch(self, texts, rate_limiter, max_retries):
+        """
+        Embed a batch of texts, waiting for the rate limiter and retrying with exponential backoff on errors (e.g.
+        the provider's rate limit errors).
+        """
+        for attempt in range(max_retries + 1):
+            rate_limiter.acquire()
+            try:
+                return np.asarray(self.embedding.embed_documents(texts), dtype=np.float32)
+            except Exception:
+                if attempt == max_retries:
+                    raise
+                time.sleep(min(60, 2 ** attempt))
+
+    # Function for embedding texts in concurrent batches
+    def _embed_batches(self, texts, batch_size, max_workers, requests_per_minute, max_retries, checkpoint_path):
+        """
+        Embed the texts in batches of batch_size, max_workers batches at a time, and yield the batches in order.
+
+        When checkpoint_path is given, every embedded batch is saved there (batch_<start>.npy) so that an interrupted
+        build resumes with the batches that are missing. The checkpoint is tied to the texts and the batch size.
+
+        Yields:
+        tuple: The start index of the batch and its embeddings (float32 array).
+        """
+        rate_limiter = RateLimiter(requests_per_minute)
+        starts = list(range(0, len(texts), batch_size))
+
+        # Load the checkpoint
+        if checkpoint_path is not None:
+            fingerprint = hashlib.sha256("\0".join(texts).encode("utf-8")).hexdigest()
+            progress_path = os.path.join(checkpoint_path, "progress.json")
+            if os.path.exists(progress_path):
+                with open(progress_path, "r") as f:
+                    progress = json.load(f)
+                if progress != {"fingerprint": fingerprint, "batch_size": batch_size}:
+                    raise ValueError(f"The checkpoint at {checkpoint_path} belongs to other documents or another batch size")
+            else:
+                os.makedirs(checkpoint_path, exist_ok=True)
+                with open(progress_path, "w") as f:
+                    json.dump({"fingerprint": fingerprint, "batch_size": batch_size}, f)
+
+        # Function for embedding a batch and saving it to the checkpoint
+        def embed(start):
+            if checkpoint_path is not None:
+                batch_path = os.path.join(checkpoint_path, f"batch_{start}.npy")
+                if os.path.exists(batch_path):
+                    return None
+            vectors = self._embed_batch(texts[start:start + batch_size], rate_limiter, max_retries)
+            if checkpoint_path is not None:
+                np.save(batch_path + ".tmp.npy", vectors)
+                os.replace(batch_path + ".tmp.npy", batch_path)
+            return vectors
+
+        # Keep a bounded window of batches in flight and yield them in order
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            window = 2 * max_workers
+            futures = [executor.submit(embed, start) for start in starts[:window]]
+            for index, start in enumerate(starts):
+                vectors = futures[index].result()
+                futures[index] = None
+                if index + window < len(starts):
+                    futures.append(executor.submit(embed, starts[index + window]))
+                if vectors is None:
+                    vectors = np.load(os.path.join(checkpoint_path, f"batch_{start}.npy"))
+                yield start, vectors
+
+    # Function for writing embedded batches to the vector store
+    def _write_batches(self, batches, texts, metadatas, ids):
+        """
+        Write embedded batches to the vector store, creating it if there is none.
+        """
+        VectorStore = self._vectorstore_class()
+
+        # Local and sharded (upsert the batches as they come)
+        if self.vectorstore_name in ("local", "sharded"):
+            if self.vectorstore is None:
+                self.vectorstore = VectorStore(self.embedding, **self.vectorstore_kwargs)
+            for start, vectors in batches:
+                end = start + len(vectors)
+                self.vectorstore.delete(ids[start:end])
+                self.vectorstore.add_embeddings(zip(texts[start:end], vectors), metadatas=metadatas[start:end], ids=ids[start:end])
+
+        # FAISS (upsert the batches as they come)
+        elif self.vectorstore_name == "faiss":
+            for start, vectors in batches:
+                end = start + len(vectors)
+                if self.vectorstore is None:
+                    self.vectorstore = VectorStore.from_embeddings(list(zip(texts[start:end], vectors.tolist())), self.embedding, metadatas=metadatas[start:end], ids=ids[start:end])
+                else:
+                    self.vectorstore.add_embeddings(zip(texts[start:end], vectors), metadatas=metadatas[start:end], ids=ids[start:end])
+
+        # Annoy (a new index is built from all the batches, later batches go to the delta until the next merge)
+        elif self.vectorstore_name == "annoy":
+            vectors = np.concatenate([vectors for _, vectors in batches])
+            if self.vectorstore is None:
+                self.vectorstore = VectorStore.from_embeddings(list(zip(texts, vectors)), self.embedding, metadatas=metadatas, ids=ids)
+            else:
+                self.vectorstore.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+
+        # Chroma (upsert the batches as they come)
+        elif self.vectorstore_name == "chroma":
+            if self.vectorstore is None:
+                self.vectorstore = VectorStore(collection_name=self.index_name or "your_collection_name", embedding_function=self.embedding, persist_directory=self.vectorstore_path or "./chroma_db")
+            for start, vectors in batches:
+                end = start + len(vectors)
+                self.vectorstore._collection.upsert(ids=ids[start:end], embeddings=vectors.tolist(), metadatas=[m or None for m in metadatas[start:end]], documents=texts[start:end])
+
+        # Else
+        else:
+            raise ValueError(f"Building is not supported for the {self.vectorstore_name} vector store")
+
+    # Function for deleting documents from the vector store
+    def delete(self, ids):
+        """
+        Delete documents by ID, in place, and save the vector store.
+
+        Args:
+        ids (list): The IDs of the documents.
+
+        Returns:
+        bool: True.
+        """
+        if self.vectorstore is None:
+            self.load_vectorstore()
+        self.vectorstore.delete(ids=list(ids))
+        self._faiss_metadata = None
+        self.version += 1
+        self.save_vectorstore()
+        return True
+
+    # Function for adding documents to the vector store
+    def add_documents(self, documents, ids=None, batch_size=256, max_workers=4, requests_per_minute=None, max_retries=5, checkpoint_path=None):
+        """
+        Embed documents in concurrent batches and add them to the vector store (loaded from vectorstore_path if it
+        was saved, created if there is none). Documents with the IDs of stored documents replace them.
+
+        Args:
+        documents (list): The documents (chunks) to add.
+        ids (list): The IDs of the documents (random UUIDs by default).
+        batch_size (int): The number of documents embedded per request.
+        max_workers (int): The number of batches embedded in parallel.
+        requests_per_minute (int): The provider's rate limit, or None.
+        max_retries (int): The number of retries of a failed batch.
+        checkpoint_path (str): A directory to checkpoint the embedded batches in, so an interrupted call can resume.
+
+        Returns:
+        list: The IDs of the documents.
+        """
+        # Add to the saved vector store rather than replacing it with a new one
+        if self.vectorstore is None and self.vectorstore_path is not None and os.path.exists(self.vectorstore_path):
+            self.load_vectorstore()
+        return self._add_documents(documents, ids, batch_size, max_workers, requests_per_minute, max_retries, checkpoint_path)
+
+    # Function for embedding and writing documents
+    def _add_documents(self, documents, ids=None, batch_size=256, max_workers=4, requests_per_minute=None, max_retries=5, checkpoint_path=None):
+        texts = [document.page_content for document in documents]
+        metadatas = [document.metadata for document in documents]
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in documents]
+        if not texts:
+            return ids
+
+        # Embed and write the batches
+        batches = self._embed_batches(texts, batch_size, max_workers, requests_per_minute, max_retries, checkpoint_path)
+        self._write_batches(batches, texts, metadatas, ids)
+        self._faiss_metadata = None
+        self.version += 1
+
+        # Save the vector store and drop the checkpoint
+        self.save_vectorstore()
+        if checkpoint_path is not None:
+            shutil.rmtree(checkpoint_path, ignore_errors=True)
+
+        return ids
+
+    # Function for building a new vector store
+    def build(self, documents, ids=None, **kwargs):
+        """
+        Build a new vector store from documents (see add_documents for the arguments).
+
+        Returns:
+        VectorStore: The vector store object.
+        """
+        self.release()
+        self._add_documents(documents, ids=ids, **kwargs)
         return self.vectorstore
-    
 
+    # Function for saving the vector store
+    def save_vectorstore(self):
+        """
+        Save the vector store to vectorstore_path (FAISS, Annoy, local and sharded). Chroma persists by itself.
+
+        The save is atomic: the store is written to a new version directory next to vectorstore_path
+        (<vectorstore_path>.versions/) and vectorstore_path, a symbolic link, is then switched to it in one rename.
+        Readers see either the previous or the new version, never a half-written one. The previous version is kept
+        for the readers that are still loading it, older versions are deleted.
+        """
+        if self.vectorstore_name not in ("faiss", "annoy", "local", "sharded") or self.vectorstore_path is None:
+            return
+        path = os.path.abspath(self.vectorstore_path)
+        versions = path + ".versions"
+        os.makedirs(versions, exist_ok=True)
+        version = os.path.join(versions, f"{time.time_ns()}-{uuid.uuid4().hex[:8]}")
+        self.vectorstore.save_local(version)
+
+        # Move a directory saved by an older version out of the way
+        if os.path.isdir(path) and not os.path.islink(path):
+            os.rename(path, os.path.join(versions, f"0-{uuid.uuid4().hex[:8]}"))
+
+        # Switch the link
+        link = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            os.symlink(os.path.relpath(version, os.path.dirname(path)), link, target_is_directory=True)
+        except OSError:
+            # No symbolic links (e.g. Windows without the privilege): replace the directory
+            shutil.rmtree(path, ignore_errors=True)
+            os.rename(version, path)
+            return
+        os.replace(link, path)
+
+        # Delete the older versions
+        for name in sorted(os.listdir(versions), key=lambda name: int(name.split("-")[0]))[:-2]:
+            shutil.rmtree(os.path.join(versions, name), ignore_errors=True)
+
+
+    # Function for getting the metadata index of a FAISS store
+    def _faiss_metadata_index(self):
+        """
+        Get the inverted index of the metadata of the FAISS store and the FAISS row IDs of its rows. It is rebuilt
+        when the store changes, through the manager or not (the version of the store is incremented by every add,
+        upsert and delete).
+        """
+        store = self.vectorstore
+        if self._faiss_metadata is None or self._faiss_metadata[0] is not store or self._faiss_metadata[1] != store.version:
+            docstore, index_to_id = store.docstore, store.index_to_docstore_id
+            rows = np.fromiter(index_to_id, dtype=np.int64, count=len(index_to_id))
+            metadatas = [docstore.search(index_to_id[row]).metadata for row in rows.tolist()]
+            self._faiss_metadata = (store, store.version, MetadataIndex(metadatas), rows)
+        return self._faiss_metadata[2], self._faiss_metadata[3]
+
+    # Function for searching a FAISS store with a metadata filter
+    def _faiss_search(self, vectors, k, filter=None):
+        """
+        Search the FAISS index for several vectors in one batch. With a filter, only the rows matching it are
+        searched, by passing them to FAISS as an ID selector (the filter of the langchain wrapper is applied after the
+        search, to fetch_k results).
+
+        Returns:
+        list: The documents of each vector, best first.
+        """
+        import faiss
+        vectors = np.array(vectors, dtype=np.float32)
+        parameters = None
+        if filter:
+            metadata_index, row_ids = self._faiss_metadata_index()
+            rows = row_ids[metadata_index.rows(filter)]
+            if not len(rows):
+                return [[] for _ in vectors]
+            k = min(k, len(rows))
+            parameters = faiss.SearchParameters(sel=faiss.IDSelectorBatch(rows))
+        if self.vectorstore._normalize_L2:
+            faiss.normalize_L2(vectors)
+        _, indices = self.vectorstore.index.search(vectors, k, params=parameters)
+        docstore, index_to_id = self.vectorstore.docstore, self.vectorstore.index_to_docstore_id
+        return [[docstore.search(index_to_id[row]) for row in rows if row != -1] for rows in indices]
+
+    # Function for searching the vector store
+    def search(self, query, k=4, filter=None, fetch_factor=10):
+        """
+        Search the vector store, optionally among the documents matching a metadata filter.
+
+        The filter maps metadata fields to a value, a list of values (any of them) or operators ("$eq", "$in", "$gt",
+        "$gte", "$lt", "$lte"), see MetadataIndex. The local and FAISS stores find the matching rows in an inverted
+        index and only score those, Chroma and Pinecone get the filter as a where clause. Other stores fetch
+        fetch_factor * k results and filter them afterwards.
+
+        Args:
+        query (str): The query.
+        k (int): The number of documents.
+        filter (dict): The metadata filter, or None.
+        fetch_factor (int): The over-fetch factor of the stores without filters.
+
+        Returns:
+        list: The documents, best first.
+        """
+        if self.vectorstore is None:
+            self.load_vectorstore()
+        if not filter:
+            return self.vectorstore.similarity_search(query, k=k)
+
+        # Native filters
+        if self.vectorstore_name in ("local", "sharded"):
+            return self.vectorstore.similarity_search(query, k=k, filter=filter)
+        if self.vectorstore_name == "faiss":
+            return self._faiss_search([self.embedding.embed_query(query)], k, filter)[0]
+        if self.vectorstore_name in ("chroma", "pinecone"):
+            return self.vectorstore.similarity_search(query, k=k, filter=MetadataIndex.to_where(filter))
+
+        # Over-fetch and filter
+        documents = self.vectorstore.similarity_search(query, k=k * fetch_factor)
+        return [document for document in documents if MetadataIndex.matches(document.metadata, filter)][:k]
+
+    # Function for searching several queries at once
+    def query_many(self, queries, k=4, filter=None):
+        """
+        Search the vector store for several queries: the queries are embedded together (see embed_queries), and
+        the local and FAISS stores score them in one batch (matrix-matrix products, or one FAISS batch search).
+        Other stores are searched by vector, one query at a time.
+
+        Args:
+        queries (list): The queries.
+        k (int): The number of documents per query.
+        filter (dict): The metadata filter (local and FAISS stores), or None.
+
+        Returns:
+        list: The documents of each query, best first.
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        if self.vectorstore is None:
+            self.load_vectorstore()
+        from enigma_code.query_cache import embed_queries
+        vectors = embed_queries(self.embedding, queries)
+
+        # Batch search
+        if self.vectorstore_name in ("local", "sharded"):
+            return [[document for document, _ in results] for results in self.vectorstore.similarity_search_many_by_vector(vectors, k, filter=filter)]
+        if self.vectorstore_name == "faiss":
+            return self._faiss_search(vectors, k, filter)
+
+        # One query at a time
+        if filter:
+            raise ValueError(f"Filtered batch queries are not supported for the {self.vectorstore_name} vector store")
+        return [self.vectorstore.similarity_search_by_vector(vector, k=k) for vector in vectors]
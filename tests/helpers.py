@@ -0,0 +1,21 @@
+# Import the libraries
+from langchain_core.embeddings import Embeddings
+
+# Embedding model that counts the letters a, b and c (plus an offset, for indexes that cannot store zero vectors)
+class LetterEmbeddings(Embeddings):
+	def __init__(self, offset=0):
+		self.offset = offset
+		self.calls = 0
+	def embed_documents(self, texts):
+		return [self.embed_query(text) for text in texts]
+	def embed_query(self, text):
+		self.calls += 1
+		return [text.count("a") + self.offset, text.count("b") + self.offset, text.count("c") + self.offset]
+
+# Embedding model that maps a text to a vector of its keywords
+class KeywordEmbeddings(Embeddings):
+	def embed_documents(self, texts):
+		return [self.embed_query(text) for text in texts]
+	def embed_query(self, text):
+		text = text.lower()
+		return [float("baggage" in text), float("refund" in text), float("pet" in text), 0.1]
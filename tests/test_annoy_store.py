@@ -0,0 +1,34 @@
+# Import the libraries
+import numpy as np
+import pytest
+
+pytest.importorskip("annoy")
+from enigma_code.annoy_store import DeltaAnnoy
+from tests.helpers import LetterEmbeddings
+
+# Function for testing the delta, the deleted documents and the merge against an exact search
+def test_delta_and_merge(tmp_path):
+	texts = ["a" * i + "b" * (i % 3) + "c" * (i % 5) for i in range(1, 41)]
+	store = DeltaAnnoy.from_texts(texts, LetterEmbeddings(offset=0.1), ids=texts, merge_ratio=0.5)
+	version = store.version
+	store.add_texts(["bbbbbbbb", "cccccccc"], ids=["b", "c"])
+	store.delete([texts[0], texts[1]])
+	assert len(store.delta) == 2 and len(store.deleted) == 2 and len(store) == 40
+	assert store.version > version
+
+	# Results match an exact search over the live documents
+	live = texts[2:] + ["bbbbbbbb", "cccccccc"]
+	vectors = np.array(LetterEmbeddings(offset=0.1).embed_documents(live))
+	query = np.array(LetterEmbeddings(offset=0.1).embed_query("bbbbb"))
+	expected = vectors @ query / np.linalg.norm(vectors, axis=1) / np.linalg.norm(query)
+	results = store.similarity_search_with_score("bbbbb", k=3)
+	assert [document.page_content for document, _ in results][0] == "bbbbbbbb"
+	assert np.allclose([score for _, score in results], np.sort(expected)[::-1][:3], atol=1e-4)
+
+	# The delta survives a save and is merged once it is large enough
+	store.save_local(str(tmp_path))
+	loaded = DeltaAnnoy.load_local(str(tmp_path), LetterEmbeddings(offset=0.1), merge_ratio=0.5)
+	assert len(loaded.delta) == 2 and loaded.deleted == {texts[0], texts[1]}
+	loaded.delete(texts[2:20])
+	assert len(loaded.delta) == 0 and not loaded.deleted and len(loaded) == 22
+	assert loaded.similarity_search("ccccccc", k=1)[0].page_content == "cccccccc"
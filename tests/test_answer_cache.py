@@ -0,0 +1,25 @@
+# Import the libraries
+import time
+from enigma_code.answer_cache import SemanticAnswerCache
+from tests.helpers import KeywordEmbeddings
+
+# Function for testing the hits of paraphrases and the counters
+def test_lookup():
+	cache = SemanticAnswerCache(KeywordEmbeddings(), threshold=0.9)
+	cache.store(cache.embed("How long do refunds take?"), "How long do refunds take?", "7 days.", seconds=2.0)
+	assert cache.lookup(cache.embed("When will my refund arrive?"))["answer"] == "7 days."
+	assert cache.lookup(cache.embed("Can I bring my pet?")) is None
+	assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1 and cache.stats()["seconds_saved"] == 2.0
+
+# Function for testing the LRU bound, the expiry and the version
+def test_eviction():
+	cache = SemanticAnswerCache(KeywordEmbeddings(), threshold=0.9, max_entries=2, ttl=0.05)
+	for question in ("baggage?", "refund?"):
+		cache.store(cache.embed(question), question, question.upper(), version=1)
+	assert cache.lookup(cache.embed("baggage?"), version=1)["answer"] == "BAGGAGE?"
+	cache.store(cache.embed("pet?"), "pet?", "PET?", version=1)
+	assert len(cache) == 2 and cache.lookup(cache.embed("refund?"), version=1) is None
+	assert cache.lookup(cache.embed("pet?"), version=2) is None and len(cache) == 0
+	cache.store(cache.embed("pet?"), "pet?", "PET?", version=2)
+	time.sleep(0.1)
+	assert cache.lookup(cache.embed("pet?"), version=2) is None and cache.stats()["expirations"] == 1
@@ -0,0 +1,42 @@
+# Import the libraries
+import numpy as np
+from langchain.schema import Document
+from enigma_code.bm25 import BM25Index, tokenize
+
+# Chunks used by the tests
+CHUNKS = [
+	Document(page_content="Flight LX-0112 to Zurich can be changed up to 24 hours before departure.", metadata={"n": 0}),
+	Document(page_content="Refunds are issued for cancelled flights within 7 days.", metadata={"n": 1}),
+	Document(page_content="Policy POL-4.2: pets are allowed in the cabin on short flights.", metadata={"n": 2}),
+	Document(page_content="Ticket 7240005432906569 was issued for flight LX-0112.", metadata={"n": 3}),
+]
+
+# Function for testing that codes are kept whole and split
+def test_tokenize():
+	assert tokenize("Flight LX-0112, POL-4.2!") == ["flight", "lx-0112", "lx", "0112", "pol-4.2", "pol", "4", "2"]
+
+# Function for testing the search against a direct BM25 computation
+def test_search(tmp_path):
+	index = BM25Index.from_documents(CHUNKS)
+	assert [document.metadata["n"] for document in index.search("ticket 7240005432906569", k=2)] == [3]
+	assert sorted(document.metadata["n"] for document in index.search("LX 0112", k=2)) == [0, 3]
+	assert index.search("unknown words", k=2) == []
+
+	# Scores match the BM25 formula
+	terms = [tokenize(chunk.page_content) for chunk in CHUNKS]
+	average = np.mean([len(t) for t in terms])
+	def bm25(query, doc):
+		score = 0.0
+		for term in set(tokenize(query)):
+			df = sum(term in t for t in terms)
+			tf = terms[doc].count(term)
+			if tf:
+				score += np.log1p((len(terms) - df + 0.5) / (df + 0.5)) * tf * 2.5 / (tf + 1.5 * (0.25 + 0.75 * len(terms[doc]) / average))
+		return score
+	for document, score in index.search_with_score("flights cancelled lx-0112", k=4):
+		assert np.isclose(score, bm25("flights cancelled lx-0112", document.metadata["n"]), rtol=1e-5)
+
+	# Persistence
+	index.save_local(str(tmp_path))
+	loaded = BM25Index.load_local(str(tmp_path))
+	assert loaded.search_with_score("pets cabin", k=1) == index.search_with_score("pets cabin", k=1)
@@ -0,0 +1,33 @@
+# Import the libraries
+from langchain.schema import Document
+from langchain_core.language_models.fake import FakeListLLM
+from langchain_core.messages import SystemMessage
+from enigma_code.chat_memory import TokenBudgetHistory, approximate_tokens, pack_context
+
+# Function for testing the sliding window and the summary without an LLM
+def test_history_budget():
+	history = TokenBudgetHistory(max_tokens=40, summary_tokens=15)
+	for i in range(50):
+		history.append(f"question number {i}", f"answer number {i}")
+		assert history.tokens() <= 40
+	assert history.turns[-1][:2] == ("question number 49", "answer number 49")
+	assert "question number" in history.summary
+	chat_history = history.as_chat_history()
+	assert isinstance(chat_history[0], SystemMessage) and chat_history[-1] == ("question number 49", "answer number 49")
+
+# Function for testing the rolling summary with an LLM
+def test_history_summary_llm():
+	llm = FakeListLLM(responses=["The customer booked flight LX 38."])
+	history = TokenBudgetHistory(max_tokens=20, summary_tokens=10, llm=llm)
+	history.append("Book flight LX 38 for me", "Done, your flight LX 38 is booked.")
+	history.append("What is my seat?", "Seat 12A.")
+	assert history.summary == "The customer booked flight LX 38."
+	assert [turn[0] for turn in history.turns] == ["What is my seat?"]
+
+# Function for testing the context packing
+def test_pack_context():
+	long = Document(page_content="x " * 100)
+	scored = [(Document(page_content="Refunds take 7 days."), 0.5), (Document(page_content="refunds  take 7 days."), 0.4), (long, 0.9), (Document(page_content="Pets fly in the cabin."), 0.7)]
+	packed = pack_context(scored, max_tokens=20)
+	assert [document.page_content for document in packed] == ["Pets fly in the cabin.", "Refunds take 7 days."]
+	assert approximate_tokens("abcd") == 1
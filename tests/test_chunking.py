@@ -0,0 +1,53 @@
+# Import the libraries
+import pytest
+from langchain.schema import Document
+from enigma_code.chunking import SpanChunker, TextSpan, TokenChunker, get_tokenizer, register_tokenizer, _with_token_lengths
+
+# Function for testing the newline spans over several documents
+def test_newline_spans():
+	documents = [Document(page_content="one\ntwo\n\nthree", metadata={"source": "a"}), Document(page_content="four", metadata={"source": "b"})]
+	chunks = SpanChunker("newline").split(documents)
+	assert list(chunks.spans()) == [TextSpan(0, 0, 3), TextSpan(0, 4, 7), TextSpan(0, 9, 14), TextSpan(1, 0, 4)]
+	assert [chunk.page_content for chunk in chunks] == ["one", "two", "three", "four"]
+	assert chunks[3].metadata == {"source": "b", "start_index": 0, "end_index": 4}
+
+# Function for testing that the offsets of a chunked document are added to the spans
+def test_span_offsets():
+	document = Document(page_content="one\ntwo", metadata={"source": "a", "start_index": 100})
+	chunks = SpanChunker("newline").split([Document(page_content="zero"), document])
+	assert chunks.span(2) == TextSpan(1, 4, 7)
+	assert chunks[2].metadata == {"source": "a", "start_index": 104, "end_index": 107}
+
+# Function for testing the char spans with overlap
+def test_char_spans_overlap():
+	text = "\n\n".join(["aaaa", "bbbb", "cccc", "dddd"])
+	chunks = SpanChunker("char", chunk_size=10, chunk_overlap=4).split([Document(page_content=text)])
+	assert [chunks.text(i) for i in range(len(chunks))] == ["aaaa\n\nbbbb", "bbbb\n\ncccc", "cccc\n\ndddd"]
+
+# Function for testing that the overlap cannot exceed the chunk size
+def test_char_invalid_overlap():
+	with pytest.raises(ValueError):
+		SpanChunker("char", chunk_size=10, chunk_overlap=20)
+
+# Function for testing the token chunking on token offsets
+def test_token_spans():
+	tiktoken = pytest.importorskip("tiktoken")
+	encoding = tiktoken.Encoding(name="bytes", pat_str=r"\S+|\s+", mergeable_ranks={bytes([i]): i for i in range(256)}, special_tokens={})
+	register_tokenizer(("tiktoken", "bytes"), _with_token_lengths(encoding))
+	documents = [Document(page_content="abcdefghij"), Document(page_content="héllo")]
+	chunks = TokenChunker("token", chunk_size=4, chunk_overlap=1, encoding_name="bytes", batch_size=1).split(documents)
+	assert [chunks.text(i) for i in range(len(chunks))] == ["abcd", "defg", "ghij", "hél", "llo"]
+	assert chunks.span(4) == TextSpan(1, 2, 5)
+
+# Tokenizer that splits on characters and returns the offsets like a fast Hugging Face tokenizer
+def character_tokenizer(texts, **kwargs):
+	return {"offset_mapping": [[(i, i + 1) for i in range(len(text))] for text in texts]}
+
+# Function for testing the sentence chunking and the tokenizer registry
+def test_sentence_spans():
+	register_tokenizer(("sentence-transformers", "chars"), (character_tokenizer, 6))
+	chunks = TokenChunker("sentence", chunk_overlap=2, model_name="chars").split([Document(page_content="abcdefghij")])
+	assert [chunks.text(i) for i in range(len(chunks))] == ["abcdef", "efghij"]
+	assert get_tokenizer(("sentence-transformers", "chars"), lambda: pytest.fail("Tokenizer should not be reloaded"))[1] == 6
+	with pytest.raises(ValueError):
+		TokenChunker("sentence", chunk_size=7, model_name="chars")
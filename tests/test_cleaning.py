@@ -0,0 +1,44 @@
+# Import the libraries
+from langchain.schema import Document
+from enigma_code.cleaning import TextCleaner, tokenize
+
+# Function for testing the normalization stages
+def test_clean_texts():
+	cleaner = TextCleaner()
+	texts = ["ﬁne​  print!!!\t\n\n\n\nnext   line  ", "second\x07 text"]
+	assert cleaner.clean_texts(texts) == ["fine print!\n\nnext line", "second text"]
+
+	# Markdown and ellipses are kept
+	assert cleaner.clean_texts(["### Sub\n\n|---|---|\n\nWait..."]) == ["### Sub\n\n|---|---|\n\nWait..."]
+
+# Function for testing the header and footer stripping
+def test_strip_headers_footers():
+	cleaner = TextCleaner(boilerplate_patterns=[r"Confidential.*"])
+	pages = [Document(page_content=f"ACME Policy Manual\nBody of page {i}\nConfidential - do not share\nPage {i} of 3", metadata={"source": "manual.pdf", "page": i}) for i in range(1, 4)]
+	cleaned = cleaner.clean_documents(pages)
+	assert [doc.page_content for doc in cleaned] == ["Body of page 1", "Body of page 2", "Body of page 3"]
+	assert cleaned[0].metadata == {"source": "manual.pdf", "page": 1}
+
+# Function for testing that the rows of a CSV file and the blocks of a text file keep all their lines
+def test_clean_csv_txt(tmp_path):
+	from enigma_code.data import DataHandler
+	from enigma_code.text_source import MappedTextFile
+	(tmp_path / "tickets.csv").write_text("id,question,status\n1,Lost bag,open\n2,Refund,open\n3,Seat,closed\n4,Pet,open\n")
+	(tmp_path / "notes.txt").write_text("\n\n".join(f"Note {i}\nBody {i}\nEnd of note {i}" for i in range(4)))
+	rows = list(DataHandler().iter_dataset(str(tmp_path / "tickets.csv")))
+	blocks = list(MappedTextFile(str(tmp_path / "notes.txt")).iter_documents(block_size=16))
+	assert len(rows) == 4 and len(blocks) >= 4
+	for documents in (rows, blocks):
+		assert [doc.page_content for doc in TextCleaner().clean_documents(documents)] == [doc.page_content.strip() for doc in documents]
+
+# Function for testing the streaming mode
+def test_clean_stream():
+	cleaner = TextCleaner(batch_size=2)
+	documents = (Document(page_content=f"doc  {i}") for i in range(5))
+	cleaned = cleaner.clean_documents(documents)
+	assert not isinstance(cleaned, list)
+	assert [doc.page_content for doc in cleaned] == [f"doc {i}" for i in range(5)]
+
+# Function for testing the tokenizer
+def test_tokenize():
+	assert tokenize("Refunds, within 24h.") == ["refunds", ",", "within", "24h", "."]
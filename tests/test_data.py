@@ -1,6 +1,9 @@
 
 # Import the libraries
+import json
+import os
 import pytest
+from langchain.schema import Document
 from enigma_code.data import DataHandler
 
 # Fixture for creating a DataHandler instance
@@ -36,3 +39,68 @@ def test_chunk_dataset(data_handler):
 	assert isinstance(chunks, list), "Chunks should be a list"
 	assert len(chunks) > 1, "There should be more than one chunk for large datasets"
 
+# Function for testing the lazy loading of CSV rows
+def test_load_dataset_lazy_csv(data_handler, tmp_path):
+	path = tmp_path / "policies.csv"
+	path.write_text("name,region\nrefunds,eu\nbaggage,us\n")
+	documents = data_handler.load_dataset(str(path), lazy=True)
+	assert not isinstance(documents, list), "Lazy loading should return an iterator"
+	documents = list(documents)
+	assert [doc.metadata["row"] for doc in documents] == [0, 1]
+	assert documents[1].page_content == "name: baggage\nregion: us"
+
+# Function for testing the lazy loading of JSON records
+def test_load_dataset_lazy_json(data_handler, tmp_path):
+	path = tmp_path / "policies.json"
+	path.write_text('[{"id": 1, "text": "a"}, {"id": 2, "text": "b"}, 12345]')
+	records = [doc.page_content for doc in data_handler._iter_json_records(str(path), block_size=4)]
+	assert records == ['{"id": 1, "text": "a"}', '{"id": 2, "text": "b"}', "12345"]
+
+# Function for testing the chunking of a stream of documents
+def test_chunk_dataset_stream(data_handler):
+	documents = (Document(page_content=f"line {i}\nnext {i}") for i in range(3))
+	chunks = data_handler.chunk_dataset(documents, "newline", None, None)
+	assert not isinstance(chunks, list), "Chunking a stream should return a generator"
+	assert [chunk.page_content for chunk in chunks] == ["line 0", "next 0", "line 1", "next 1", "line 2", "next 2"]
+
+# Function for testing the parallel ingestion of a directory
+def test_ingest_directory(data_handler, tmp_path):
+	for name in ["b.txt", "a.txt", "nested/c.txt"]:
+		(tmp_path / name).parent.mkdir(exist_ok=True)
+		(tmp_path / name).write_text(f"{name} first\n{name} second")
+	(tmp_path / "broken.json").write_text("{not json")
+	chunks = list(data_handler.ingest_directory(str(tmp_path), "newline", None, None, max_workers=2))
+	assert [chunk.page_content for chunk in chunks] == ["a.txt first", "a.txt second", "b.txt first", "b.txt second", "nested/c.txt first", "nested/c.txt second"]
+	report = {os.path.basename(entry["file_path"]): entry for entry in data_handler.ingestion_report}
+	assert report["broken.json"]["error"] is not None, "Failed files should be reported"
+	assert report["a.txt"]["error"] is None and report["a.txt"]["chunks"] == 2
+
+# Function for testing that the worker processes clean with the cleaner of the handler
+def test_ingest_directory_cleaner(tmp_path):
+	from enigma_code.cleaning import TextCleaner
+	(tmp_path / "a.txt").write_text("Confidential - do not share\nbody")
+	handler = DataHandler(cleaner=TextCleaner(boilerplate_patterns=[r"Confidential.*"]))
+	assert [chunk.page_content for chunk in handler.ingest_directory(str(tmp_path), "newline", None, None, max_workers=1)] == ["body"]
+
+# Function for testing that the header chunks of a directory are flat Documents
+def test_ingest_directory_headers(data_handler, tmp_path):
+	(tmp_path / "a.txt").write_text("# Title\n\nIntro\n\n### Sub\n\nDetails")
+	chunks = list(data_handler.ingest_directory(str(tmp_path), "markdown-headers", None, None, max_workers=1))
+	assert [(chunk.page_content, chunk.metadata.get("h3")) for chunk in chunks] == [("Intro", None), ("Details", "Sub")]
+	assert chunks[1].metadata["h1"] == "Title" and chunks[1].metadata["source"].endswith("a.txt")
+	assert data_handler.ingestion_report[0]["chunks"] == 2
+
+# Function for testing the streaming of a large record and the limit on invalid JSON
+def test_json_records_large(data_handler, tmp_path):
+	path = tmp_path / "large.json"
+	record = {"text": "x" * 200000, "items": list(range(20000))}
+	path.write_text(json.dumps(record) + "\n" + json.dumps([1, 2]))
+	records = [doc.page_content for doc in data_handler._iter_json_records(str(path), block_size=1024)]
+	assert [json.loads(content) for content in records] == [record, [1, 2]]
+
+	# Invalid JSON fails once the buffer passes the limit, before the end of the file
+	path.write_text('{"a": 1} {"b": ' + "x" * 100000)
+	records = data_handler._iter_json_records(str(path), block_size=1024, max_record_size=10000)
+	assert json.loads(next(records).page_content) == {"a": 1}
+	with pytest.raises(ValueError, match="longer than"):
+		next(records)
@@ -0,0 +1,30 @@
+# Import the libraries
+import json
+from langchain.schema import Document
+from enigma_code.data import DataHandler
+from enigma_code.dedup import MinHashDeduplicator
+
+# Boilerplate paragraph repeated across manuals
+BOILERPLATE = "All bookings are subject to the general terms and conditions of carriage published on our website and available at every sales office"
+
+# Function for testing the removal of near duplicates
+def test_deduplicate():
+	chunks = [
+		Document(page_content=BOILERPLATE, metadata={"source": "a.pdf", "page": 1}),
+		Document(page_content="Refunds are issued within seven days of the cancellation request", metadata={"source": "a.pdf", "page": 2}),
+		Document(page_content=BOILERPLATE + ".", metadata={"source": "b.pdf", "page": 9}),
+		Document(page_content=BOILERPLATE.upper(), metadata={"source": "c.pdf", "page": 4}),
+	]
+	data_handler = DataHandler()
+	kept = data_handler.deduplicate_dataset(chunks)
+	assert [doc.metadata["source"] for doc in kept] == ["a.pdf", "a.pdf"]
+	assert kept[0].metadata["duplicate_count"] == 2
+	assert json.loads(kept[0].metadata["duplicate_sources"]) == [{"source": "b.pdf", "page": 9}, {"source": "c.pdf", "page": 4}]
+	assert "duplicate_count" not in kept[1].metadata
+	assert data_handler.dedup_report == {"total": 4, "kept": 2, "dropped": 2, "dedup_ratio": 0.5}
+
+# Function for testing that different texts are kept
+def test_distinct_texts_kept():
+	texts = [f"policy number {i} covers baggage delays on route {i * 7}" for i in range(20)]
+	representative = MinHashDeduplicator(threshold=0.9).find_duplicates(texts)
+	assert representative == list(range(20))
@@ -0,0 +1,53 @@
+# Import the libraries
+from langchain_core.embeddings import Embeddings
+from enigma_code.embedding_cache import CachedEmbeddings
+
+# Embedding model that counts the embedded texts
+class CountingEmbeddings(Embeddings):
+	def __init__(self):
+		self.calls = []
+	def embed_documents(self, texts):
+		self.calls.append(list(texts))
+		return [[float(len(text)), 1.0, 0.5] for text in texts]
+	def embed_query(self, text):
+		self.calls.append([text])
+		return [float(len(text)), 0.0, 0.5]
+
+# Function for testing the bulk lookup and the persistence
+def test_cache_hits(tmp_path):
+	model = CountingEmbeddings()
+	cache = CachedEmbeddings(model, str(tmp_path / "cache.sqlite"), model_name="counting")
+	assert cache.embed_documents(["a", "bb", "a"]) == [[1.0, 1.0, 0.5], [2.0, 1.0, 0.5], [1.0, 1.0, 0.5]]
+	assert cache.embed_documents(["bb", "ccc"]) == [[2.0, 1.0, 0.5], [3.0, 1.0, 0.5]]
+	assert model.calls == [["a", "bb"], ["ccc"]], "Only the misses should be embedded, in one call"
+
+	# Queries are cached separately, and the cache survives a new instance
+	assert CachedEmbeddings(model, str(tmp_path / "cache.sqlite"), model_name="counting").embed_query("a") == [1.0, 0.0, 0.5]
+	reopened = CachedEmbeddings(model, str(tmp_path / "cache.sqlite"), model_name="counting")
+	reopened.embed_documents(["a", "bb", "ccc"])
+	reopened.embed_query("a")
+	assert len(model.calls) == 3
+	assert reopened.stats()["hits"] == 4
+
+# Function for testing the LRU eviction
+def test_cache_eviction(tmp_path):
+	model = CountingEmbeddings()
+	cache = CachedEmbeddings(model, str(tmp_path / "cache.sqlite"), model_name="counting", max_bytes=12 * 3)
+	for text in ["a", "b", "c"]:
+		cache.embed_documents([text])
+	cache.embed_documents(["a"])
+	cache.embed_documents(["d"])
+	model.calls.clear()
+	cache.embed_documents(["a", "b", "d"])
+	assert model.calls == [["b"]], "The least recently used vector should have been evicted"
+
+# Function for testing that the eviction keeps the rest of a batch that shares its last access time
+def test_cache_eviction_batch(tmp_path):
+	model = CountingEmbeddings()
+	cache = CachedEmbeddings(model, str(tmp_path / "cache.sqlite"), model_name="counting", max_bytes=12 * 4)
+	cache.embed_documents(["a", "b", "c"])
+	cache.embed_documents(["d", "e"])
+	assert cache.stats()["bytes"] == 12 * 3 and cache.stats()["entries"] == 3
+	model.calls.clear()
+	cache.embed_documents(["c", "d", "e"])
+	assert model.calls == []
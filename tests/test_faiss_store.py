@@ -0,0 +1,38 @@
+# Import the libraries
+import pytest
+from langchain.schema import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+faiss = pytest.importorskip("faiss")
+from enigma_code.faiss_store import IDMapFAISS
+
+# Function for testing the upsert and delete by ID of a store used directly
+def test_add_delete(tmp_path):
+	texts = [f"policy {i}" for i in range(6)]
+	store = IDMapFAISS.from_texts(texts, DeterministicFakeEmbedding(size=16), ids=[f"id-{i}" for i in range(6)])
+	assert isinstance(store.index, faiss.IndexIDMap2)
+	store.add_documents([Document(page_content="policy 2 updated", metadata={"v": 2})], ids=["id-2"])
+	store.add_documents([Document(page_content="policy 6")])
+	version = store.version
+	store.delete(["id-0", "id-4"])
+	assert store.index.ntotal == 5 and store.version > version
+	assert store.similarity_search("policy 2 updated", k=1)[0].metadata == {"v": 2}
+	assert sorted(document.page_content for document in store.similarity_search("policy", k=10)) == ["policy 1", "policy 2 updated", "policy 3", "policy 5", "policy 6"]
+
+	# The row IDs survive a save
+	store.save_local(str(tmp_path))
+	loaded = IDMapFAISS.load_local(str(tmp_path), DeterministicFakeEmbedding(size=16), allow_dangerous_deserialization=True)
+	loaded.delete(["id-1"])
+	assert sorted(document.page_content for document in loaded.similarity_search("policy", k=10)) == ["policy 2 updated", "policy 3", "policy 5", "policy 6"]
+
+# Function for testing that the row IDs of deleted documents are not reused, even after a save
+def test_rows_not_reused(tmp_path):
+	store = IDMapFAISS.from_texts(["a", "b", "c"], DeterministicFakeEmbedding(size=16), ids=["a", "b", "c"])
+	store.delete(["c"])
+	store.add_texts(["d"], ids=["d"])
+	assert sorted(store.index_to_docstore_id) == [0, 1, 3]
+	store.delete(["d"])
+	store.save_local(str(tmp_path))
+	loaded = IDMapFAISS.load_local(str(tmp_path), DeterministicFakeEmbedding(size=16), allow_dangerous_deserialization=True)
+	loaded.add_texts(["e"], ids=["e"])
+	assert loaded.index_to_docstore_id[4] == "e" and 3 not in loaded.index_to_docstore_id
@@ -0,0 +1,40 @@
+# Import the libraries
+from langchain.schema import Document
+from enigma_code.bm25 import BM25Index
+from enigma_code.hybrid import HybridRetriever, reciprocal_rank_fusion
+
+# Dense leg that returns a fixed ranking, like the notebook retriever
+class FixedRetriever:
+	def __init__(self, texts):
+		self.texts = texts
+	def query(self, query, k=5):
+		return [{"page_content": text, "similarity": 1.0} for text in self.texts[:k]]
+
+# Function for testing the reciprocal-rank fusion
+def test_reciprocal_rank_fusion():
+	a, b, c = (Document(page_content=text) for text in "abc")
+	fused = reciprocal_rank_fusion([[a, b, c], [c, b]], k=1)
+	assert [document.page_content for document, _ in fused] == ["c", "b", "a"]
+	assert fused[0][1] == 1 / 4 + 1 / 2
+
+# Function for testing that an exact code is found even when the dense leg ranks it last
+def test_hybrid_retriever():
+	texts = ["Baggage allowance is 23 kg.", "Refunds take 7 days.", "Policy POL-4.2 allows pets in the cabin."]
+	sparse = BM25Index.from_documents([Document(page_content=text) for text in texts])
+	retriever = HybridRetriever(dense=FixedRetriever(texts), sparse=sparse, k=2)
+	assert retriever.query("POL-4.2", k=1)[0]["page_content"] == texts[2]
+	assert [document.page_content for document in retriever.invoke("refunds")] == [texts[1], texts[0]]
+
+# Function for testing that the retriever exposes the version of its dense leg
+def test_hybrid_version():
+	dense = FixedRetriever(["a"])
+	retriever = HybridRetriever(dense=dense, sparse=BM25Index.from_documents([Document(page_content="a")]))
+	assert retriever.version is None
+	dense.version = 3
+	assert retriever.version == 3
+
+# Function for testing that k larger than fetch_k is fetched from both legs
+def test_hybrid_k_over_fetch_k():
+	texts = [f"policy {i}" for i in range(10)]
+	retriever = HybridRetriever(dense=FixedRetriever(texts), sparse=BM25Index.from_documents([Document(page_content=text) for text in texts]), fetch_k=3)
+	assert len(retriever.query("policy", k=8)) == 8
@@ -0,0 +1,39 @@
+# Import the libraries
+import time
+from enigma_code.index_registry import IndexRegistry, folder_stamp
+
+# Function for testing the reference counting and the idle eviction
+def test_refcount_eviction():
+	registry = IndexRegistry(idle_seconds=0.05)
+	loads = []
+	def loader():
+		loads.append(object())
+		return loads[-1]
+	first = registry.acquire(("local", "/index", "fake"), loader)
+	second = registry.acquire(("local", "/index", "fake"), loader)
+	other = registry.acquire(("local", "/other", "fake"), loader)
+	assert first is second and first is not other and len(loads) == 2
+	assert registry.stats()["references"] == 3
+	registry.release(first)
+	registry.release(other)
+	time.sleep(0.1)
+	assert registry.evict_idle() == 1 and len(registry) == 1
+	registry.release(second)
+	time.sleep(0.1)
+	assert registry.evict_idle() == 1 and len(registry) == 0
+	assert registry.acquire(("local", "/index", "fake"), loader) is loads[-1] and len(loads) == 3
+
+# Function for testing the reload when the files change
+def test_reload_on_change(tmp_path):
+	registry = IndexRegistry()
+	path = tmp_path / "index"
+	path.mkdir()
+	(path / "index.bin").write_bytes(b"a")
+	stamp = folder_stamp(str(path))
+	first = registry.acquire("key", object, stamp)
+	assert registry.acquire("key", object, folder_stamp(str(path))) is first
+	(path / "index.bin").write_bytes(b"ab")
+	second = registry.acquire("key", object, folder_stamp(str(path)))
+	assert second is not first and registry.stats()["reloads"] == 1
+	assert registry.stats()["references"] == 3
+	assert folder_stamp(str(tmp_path / "missing")) is None
@@ -0,0 +1,77 @@
+# Import the libraries
+import numpy as np
+from enigma_code.local_store import LocalVectorStore
+from enigma_code.metadata_index import MetadataIndex
+from tests.helpers import LetterEmbeddings
+
+# Function for testing the blocked top-k search against a full scan
+def test_blocked_search():
+	generator = np.random.RandomState(0)
+	vectors = generator.normal(size=(1000, 8))
+	store = LocalVectorStore.from_embeddings([(str(i), v) for i, v in enumerate(vectors)], LetterEmbeddings(), block_size=64)
+	query = generator.normal(size=8)
+	rows, scores = store._search(query, 10)
+	expected = vectors @ query / np.linalg.norm(vectors, axis=1) / np.linalg.norm(query)
+	assert list(rows) == list(np.argsort(-expected)[:10])
+	assert np.allclose(scores, np.sort(expected)[::-1][:10], atol=1e-5)
+
+# Function for testing the notebook-compatible query, the persistence and the deletion
+def test_save_load_delete(tmp_path):
+	store = LocalVectorStore.from_texts(["aaa", "bbb", "ccc", "aab"], LetterEmbeddings(), metadatas=[{"n": i} for i in range(4)], ids=["a", "b", "c", "d"])
+	assert [result["page_content"] for result in store.query("a", k=2)] == ["aaa", "aab"]
+	store.save_local(str(tmp_path))
+	loaded = LocalVectorStore.load_local(str(tmp_path), LetterEmbeddings())
+	assert isinstance(loaded._matrix, np.memmap)
+	assert loaded.similarity_search("bb", k=1)[0].metadata == {"n": 1}
+	loaded.delete(["a"])
+	loaded.add_texts(["abc"], ids=["e"])
+	assert len(loaded) == 4
+	assert [result["page_content"] for result in loaded.query("a", k=2)] == ["aab", "abc"]
+
+# Function for testing the quantized first pass with exact re-rank
+def test_quantized_recall(tmp_path):
+	generator = np.random.RandomState(1)
+	vectors = generator.normal(size=(2000, 32))
+	queries = generator.normal(size=(20, 32))
+	exact = LocalVectorStore.from_embeddings([(str(i), v) for i, v in enumerate(vectors)], LetterEmbeddings())
+	for storage in ["float16", "int8"]:
+		store = LocalVectorStore.from_embeddings([(str(i), v) for i, v in enumerate(vectors)], LetterEmbeddings(), storage=storage, block_size=256)
+		store.save_local(str(tmp_path / storage))
+		loaded = LocalVectorStore.load_local(str(tmp_path / storage), LetterEmbeddings(), storage=storage)
+		assert loaded._codes.dtype == np.dtype(storage) and loaded._codes.nbytes <= exact.vectors.nbytes / 2
+		recall = np.mean([len(set(loaded._search(q, 10)[0]) & set(exact._search(q, 10)[0])) / 10 for q in queries])
+		assert recall >= 0.95, f"{storage} recall@10 is {recall}"
+		rows, scores = loaded._search(queries[0], 5)
+		assert np.allclose(scores, exact.vectors[rows] @ LocalVectorStore._normalize(queries[0])), "Scores should be exact after re-ranking"
+
+# Function for testing the filtered search against a post-filtered full scan
+def test_filtered_search():
+	generator = np.random.RandomState(2)
+	vectors = generator.normal(size=(3000, 16))
+	metadatas = [{"region": ["eu", "us", "apac"][i % 3], "year": 2020 + i % 5, "tags": ["hr", "it"][:1 + i % 2]} for i in range(3000)]
+	query = generator.normal(size=16)
+	expected = vectors @ query / np.linalg.norm(vectors, axis=1)
+	for storage in ["float32", "int8"]:
+		store = LocalVectorStore.from_embeddings([(str(i), v) for i, v in enumerate(vectors)], LetterEmbeddings(), metadatas=metadatas, storage=storage, block_size=128)
+		for filter in [{"region": "eu"}, {"region": ["eu", "us"], "year": {"$gte": 2023}}, {"tags": "it", "year": {"$in": [2021, 2022]}}]:
+			matching = [i for i, metadata in enumerate(metadatas) if MetadataIndex.matches(metadata, filter)]
+			rows, _ = store._search(query, 5, filter=filter)
+			assert set(rows) <= set(matching)
+			assert set(rows) == set(sorted(matching, key=lambda i: -expected[i])[:5])
+	assert store.similarity_search("a", k=3, filter={"region": "mars"}) == []
+	store.delete(["0"])
+	assert "0" not in [store.ids[row] for row in store._search(query, 3000, filter={"region": "eu"})[0]]
+
+# Function for testing the batch search against single searches
+def test_search_many():
+	generator = np.random.RandomState(3)
+	vectors = generator.normal(size=(1500, 16))
+	queries = generator.normal(size=(7, 16))
+	for storage in ["float32", "int8"]:
+		store = LocalVectorStore.from_embeddings([(str(i), v) for i, v in enumerate(vectors)], LetterEmbeddings(), metadatas=[{"odd": i % 2} for i in range(1500)], storage=storage, block_size=100)
+		for filter in [None, {"odd": 1}]:
+			for query, (rows, scores) in zip(queries, store._search_many(queries, 5, filter=filter)):
+				expected_rows, expected_scores = store._search(query, 5, filter=filter)
+				assert list(rows) == list(expected_rows) and np.allclose(scores, expected_scores)
+	store = LocalVectorStore.from_texts(["aaa", "bbb", "ccc", "aab"], LetterEmbeddings())
+	assert [[result["page_content"] for result in results] for results in store.query_many(["a", "bb"], k=2)] == [["aaa", "aab"], ["bbb", "aab"]]
@@ -0,0 +1,107 @@
+# Import the libraries
+import os
+import pytest
+from enigma_code.data import DataHandler
+from enigma_code.manifest import IngestionManifest
+
+# Vector store that records the added and deleted IDs
+class RecordingVectorStore:
+	def __init__(self):
+		self.ids = {}
+	def add_documents(self, documents, ids):
+		self.ids.update(zip(ids, [doc.page_content for doc in documents]))
+	def delete(self, ids):
+		for i in ids:
+			del self.ids[i]
+
+# Fixture for creating a corpus directory
+@pytest.fixture
+def corpus(tmp_path):
+	(tmp_path / "docs").mkdir()
+	(tmp_path / "docs" / "a.txt").write_text("alpha\nbeta")
+	(tmp_path / "docs" / "b.txt").write_text("gamma\ndelta")
+	return tmp_path
+
+# Function for running a sync
+def sync(corpus, vectorstore):
+	manifest = IngestionManifest(str(corpus / "manifest.json"))
+	return manifest.sync(DataHandler(), vectorstore, str(corpus / "docs"), "newline", None, None, max_workers=1)
+
+# Function for testing that a re-run only touches what changed
+def test_sync_incremental(corpus):
+	vectorstore = RecordingVectorStore()
+	stats = sync(corpus, vectorstore)
+	assert stats["changed_files"] == 2 and stats["added_chunks"] == 4
+	assert sorted(vectorstore.ids.values()) == ["alpha", "beta", "delta", "gamma"]
+
+	# Nothing changed
+	stats = sync(corpus, vectorstore)
+	assert stats["unchanged_files"] == 2 and stats["added_chunks"] == 0 and stats["deleted_chunks"] == 0
+
+	# One chunk changed and one file removed
+	(corpus / "docs" / "a.txt").write_text("alpha\nbeta v2")
+	os.remove(corpus / "docs" / "b.txt")
+	stats = sync(corpus, vectorstore)
+	assert stats["changed_files"] == 1 and stats["removed_files"] == 1
+	assert stats["added_chunks"] == 1 and stats["deleted_chunks"] == 3
+	assert sorted(vectorstore.ids.values()) == ["alpha", "beta v2"]
+
+# Function for testing that identical chunks get distinct IDs
+def test_chunk_ids_unique(corpus):
+	manifest = IngestionManifest(str(corpus / "manifest.json"))
+	chunks = DataHandler().chunk_dataset(DataHandler().load_dataset(str(corpus / "docs" / "a.txt")), "newline", None, None)
+	ids = manifest.chunk_ids("a.txt", chunks + chunks)
+	assert len(set(ids)) == 4
+	assert ids[:2] == manifest.chunk_ids("a.txt", chunks)
+
+# Function for testing that editing the start of a file only re-embeds the edited chunk
+def test_sync_edit_start(corpus):
+	paragraphs = [f"Paragraph {i} of the policy." for i in range(100)]
+	(corpus / "docs" / "a.txt").write_text("\n\n".join(paragraphs))
+	manifest = IngestionManifest(str(corpus / "manifest.json"))
+	vectorstore = RecordingVectorStore()
+	manifest.sync(DataHandler(), vectorstore, str(corpus / "docs"), "char", 40, 0, max_workers=1)
+	chunks = len(vectorstore.ids)
+	(corpus / "docs" / "a.txt").write_text("\n\n".join(["Paragraph 0 was edited."] + paragraphs[1:]))
+	stats = manifest.sync(DataHandler(), vectorstore, str(corpus / "docs"), "char", 40, 0, max_workers=1)
+	assert stats["added_chunks"] == 1 and stats["deleted_chunks"] == 1
+	assert len(vectorstore.ids) == chunks
+
+# Function for testing that a relative and an absolute path give the same manifest keys
+def test_sync_relative_path(corpus, monkeypatch):
+	vectorstore = RecordingVectorStore()
+	sync(corpus, vectorstore)
+	monkeypatch.chdir(corpus)
+	manifest = IngestionManifest("manifest.json")
+	stats = manifest.sync(DataHandler(), vectorstore, "docs", "newline", None, None, max_workers=1)
+	assert stats["unchanged_files"] == 2 and stats["removed_files"] == 0 and stats["deleted_chunks"] == 0
+
+# Vector store that fails on the fourth write
+class FailingVectorStore(RecordingVectorStore):
+	def __init__(self):
+		super().__init__()
+		self.writes = 0
+	def add_documents(self, documents, ids):
+		self.writes += 1
+		if self.writes == 4:
+			raise RuntimeError("Interrupted")
+		super().add_documents(documents, ids)
+	def delete(self, ids):
+		for i in ids:
+			self.ids.pop(i, None)
+
+# Function for testing that an interrupted sync leaves no orphaned vectors
+def test_sync_interrupted(corpus):
+	vectorstore = FailingVectorStore()
+	sync(corpus, vectorstore)
+	(corpus / "docs" / "a.txt").write_text("alpha v2\nbeta v2")
+	(corpus / "docs" / "b.txt").write_text("gamma v2")
+	with pytest.raises(RuntimeError):
+		sync(corpus, vectorstore)
+
+	# The files change again before the next sync
+	(corpus / "docs" / "a.txt").write_text("alpha v3")
+	(corpus / "docs" / "b.txt").write_text("gamma v3")
+	sync(corpus, vectorstore)
+	assert sorted(vectorstore.ids.values()) == ["alpha v3", "gamma v3"]
+	assert not os.path.exists(corpus / "manifest.json.journal")
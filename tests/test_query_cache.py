@@ -0,0 +1,80 @@
+# Import the libraries
+from enigma_code.local_store import LocalVectorStore
+from enigma_code.query_cache import CachedQueryEmbeddings, CachedRetriever, QueryCache, embed_queries, normalize_query
+from tests.helpers import LetterEmbeddings
+
+# Function for testing the LRU eviction and the expiry
+def test_lru_ttl(monkeypatch):
+	now = [0.0]
+	monkeypatch.setattr("enigma_code.query_cache.time.monotonic", lambda: now[0])
+	cache = QueryCache(max_entries=2, ttl=10)
+	cache.put("a", 1)
+	cache.put("b", 2)
+	assert cache.get("a") == 1
+	cache.put("c", 3)
+	assert cache.get("b") is None and cache.get("a") == 1, "The least recently used entry should be evicted"
+	now[0] = 11
+	assert cache.get("a") is None
+	assert cache.stats() == {"hits": 2, "misses": 2, "hit_rate": 0.5, "evictions": 1, "expirations": 1, "invalidations": 0, "entries": 1}
+
+# Function for testing that a cached lookup makes no embedding call and that a rebuild invalidates the cache
+def test_cached_retriever():
+	embedding = LetterEmbeddings()
+	store = LocalVectorStore.from_texts(["aaa", "bbb"], embedding)
+	retriever = CachedRetriever(store)
+	calls = embedding.calls
+	assert retriever.query("  AAA ", k=1)[0]["page_content"] == "aaa"
+	assert retriever.query("aaa", k=1)[0]["page_content"] == "aaa"
+	assert embedding.calls == calls + 1
+	store.add_texts(["aaaa"])
+	assert retriever.query("aaa", k=1)[0]["page_content"] in ("aaa", "aaaa")
+	assert embedding.calls == calls + 3
+	assert retriever.stats()["invalidations"] == 1
+
+# Function for testing the query embedding cache
+def test_cached_query_embeddings():
+	embedding = CachedQueryEmbeddings(LetterEmbeddings())
+	assert embedding.embed_query("abc") == embedding.embed_query(" ABC ") == [1, 1, 1]
+	assert embedding.embedding.calls == 1
+	assert normalize_query("Ｆlight\tLX  12 ") == "flight lx 12"
+
+# Function for testing that batched queries go through the query path of the model
+def test_embed_queries(tmp_path):
+	from enigma_code.embedding_cache import CachedEmbeddings
+	class AsymmetricEmbeddings(LetterEmbeddings):
+		def embed_documents(self, texts):
+			return [[0, 0, 0] for _ in texts]
+	embedding = AsymmetricEmbeddings()
+	assert embed_queries(embedding, ["ab", "c"]) == [embedding.embed_query("ab"), embedding.embed_query("c")]
+	store = LocalVectorStore.from_texts(["aaa", "ccc"], LetterEmbeddings())
+	store.embedding = embedding
+	assert [results[0]["page_content"] for results in store.query_many(["a", "cc"], k=1)] == ["aaa", "ccc"]
+
+	# The cached models keep the query vectors apart from the document vectors
+	cached = CachedEmbeddings(embedding, str(tmp_path / "cache.db"))
+	assert cached.embed_queries(["ab"]) == [[1.0, 1.0, 0.0]] and cached.embed_documents(["ab"]) == [[0.0, 0.0, 0.0]]
+	query_cached = CachedQueryEmbeddings(embedding)
+	assert query_cached.embed_queries(["ab", "ab "]) == [[1, 1, 0], [1, 1, 0]] and query_cached.embed_query("ab") == [1, 1, 0]
+
+# Function for testing that replacing the retriever empties the cache
+def test_cached_retriever_rebind():
+	first = LocalVectorStore.from_texts(["aaa", "bbb"], LetterEmbeddings())
+	second = LocalVectorStore.from_texts(["aab", "bbb"], LetterEmbeddings())
+	retriever = CachedRetriever(first)
+	assert retriever.query("aa", k=1)[0]["page_content"] == "aaa"
+	retriever.rebind(first)
+	assert retriever.stats()["invalidations"] == 0
+	retriever.rebind(second)
+	assert retriever.query("aa", k=1)[0]["page_content"] == "aab"
+	assert retriever.stats()["invalidations"] == 1
+
+# Function for testing the query embedding cache of the vector store manager
+def test_manager_query_cache(monkeypatch, tmp_path):
+	from enigma_code.vectorstore import VectorStoreManager
+	embedding = LetterEmbeddings()
+	monkeypatch.setitem(VectorStoreManager.EMBEDDING_MODELS, "fake", lambda: embedding)
+	manager = VectorStoreManager("local", "fake", vectorstore_path=str(tmp_path / "index"), query_cache_entries=16)
+	assert isinstance(manager.embedding, CachedQueryEmbeddings)
+	assert manager.embedding.embed_query("abc") == manager.embedding.embed_query("ABC") == [1, 1, 1]
+	assert embedding.calls == 1
+	assert VectorStoreManager("local", "fake", vectorstore_path=str(tmp_path / "index")).embedding is embedding
@@ -0,0 +1,66 @@
+# Import the libraries
+import asyncio
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from enigma_code.local_store import LocalVectorStore
+from enigma_code.rag import RAG
+from tests.helpers import KeywordEmbeddings
+
+# Function for creating a RAG with a fake chat model
+def make_rag(responses):
+	store = LocalVectorStore.from_texts(["Baggage allowance is 23 kg.", "Refunds take 7 days."], KeywordEmbeddings())
+	return RAG(FakeListChatModel(responses=responses), store)
+
+# Function for testing the streamed answer
+def test_astream_query():
+	rag = make_rag(["Seven days.", "Refunds take 7 days?", "Yes."])
+	async def collect(question):
+		return [event async for event in rag.astream_query(question)]
+	events = asyncio.run(collect("How long do refunds take?"))
+	assert events[0]["type"] == "sources" and events[0]["documents"][0].page_content == "Refunds take 7 days."
+	assert "".join(event["content"] for event in events if event["type"] == "token") == "Seven days."
+	assert events[-1] == {"type": "end", "answer": "Seven days."}
+
+	# The second turn condenses the question with the history first
+	assert asyncio.run(rag.achat_query("Really?")) == "Yes."
+	assert rag.chat_history == [("How long do refunds take?", "Seven days."), ("Really?", "Yes.")]
+
+# Function for testing concurrent sessions on one event loop
+def test_concurrent_sessions():
+	rags = [make_rag([f"Answer {i}."]) for i in range(5)]
+	async def run():
+		return await asyncio.gather(*(rag.achat_query("baggage?") for rag in rags))
+	assert asyncio.run(run()) == [f"Answer {i}." for i in range(5)]
+
+# Function for testing the token budgets of the history and the context
+def test_budgets():
+	store = LocalVectorStore.from_texts(["Baggage allowance is 23 kg.", "Refunds take 7 days.", "Refunds take 7 days."], KeywordEmbeddings())
+	rag = RAG(FakeListChatModel(responses=["ok"]), store, history_tokens=40, context_tokens=100)
+	for _ in range(20):
+		assert rag.chat_query("How long do refunds take?") == "ok"
+	assert rag.chat_history.tokens() <= 40
+	assert [document.page_content for document in rag.chat_chain.retriever.invoke("refund")][:2] == ["Refunds take 7 days.", "Baggage allowance is 23 kg."]
+
+# Function for testing the answer cache
+def test_answer_cache():
+	from enigma_code.answer_cache import SemanticAnswerCache
+	store = LocalVectorStore.from_texts(["Baggage allowance is 23 kg.", "Refunds take 7 days."], KeywordEmbeddings())
+	cache = SemanticAnswerCache(KeywordEmbeddings(), threshold=0.99)
+	rag = RAG(FakeListChatModel(responses=["Seven days.", "23 kg."]), store, answer_cache=cache)
+	assert rag.chat_query("How long do refunds take?") == "Seven days."
+	other = RAG(FakeListChatModel(responses=["refund?", "unused"]), store, answer_cache=cache)
+	assert asyncio.run(other.achat_query("When is my refund paid?")) == "Seven days."
+	assert cache.stats()["hits"] == 1
+
+	# A change of the index empties the cache
+	store.add_texts(["Pets fly in the cabin."])
+	assert RAG(FakeListChatModel(responses=["7 days."]), store, answer_cache=cache).chat_query("How long do refunds take?") == "7 days."
+
+# Function for testing the answer cache with the version of the index given by a function
+def test_answer_cache_index_version():
+	from enigma_code.answer_cache import SemanticAnswerCache
+	store = LocalVectorStore.from_texts(["Baggage allowance is 23 kg.", "Refunds take 7 days."], KeywordEmbeddings())
+	cache, version = SemanticAnswerCache(KeywordEmbeddings(), threshold=0.99), [0]
+	assert RAG(FakeListChatModel(responses=["Seven days."]), store, answer_cache=cache, index_version=lambda: version[0]).chat_query("refunds?") == "Seven days."
+	assert RAG(FakeListChatModel(responses=["unused"]), store, answer_cache=cache, index_version=lambda: version[0]).chat_query("refunds?") == "Seven days."
+	version[0] += 1
+	assert RAG(FakeListChatModel(responses=["7 days."]), store, answer_cache=cache, index_version=lambda: version[0]).chat_query("refunds?") == "7 days."
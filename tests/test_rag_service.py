@@ -0,0 +1,101 @@
+# Import the libraries
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from enigma_code.local_store import LocalVectorStore
+from enigma_code.rag_service import RAGService, SessionStore
+from tests.helpers import KeywordEmbeddings
+
+# Function for creating a service with a fake chat model that always answers "ok"
+def make_service(**kwargs):
+	store = LocalVectorStore.from_texts(["Baggage allowance is 23 kg.", "Refunds take 7 days."], KeywordEmbeddings())
+	return RAGService(FakeListChatModel(responses=["ok"]), store, **kwargs)
+
+# Function for testing the LRU, the SQLite spill and the restore
+def test_session_store(tmp_path):
+	store = SessionStore(list, max_sessions=2, sqlite_path=str(tmp_path / "sessions.db"))
+	for session_id in ("a", "b", "c"):
+		store.get(session_id).chat_history.append(["hi", session_id])
+	assert len(store) == 2 and store.stats()["spilled"] == 1
+	assert store.get("a").chat_history == [["hi", "a"]] and store.stats()["restores"] == 1
+
+	# A session in use is not evicted
+	used = store.get("c", use=True)
+	store.get("d")
+	store.get("e")
+	assert "c" in store._sessions
+	store.release(used)
+	store.close()
+	reopened = SessionStore(list, sqlite_path=str(tmp_path / "sessions.db"))
+	assert reopened.get("e").chat_history == [] and reopened.get("b").chat_history == [["hi", "b"]]
+
+# Function for testing the idle eviction without SQLite
+def test_evict_idle():
+	store = SessionStore(list, idle_seconds=0.05)
+	store.get("a").chat_history.append(("hi", "there"))
+	time.sleep(0.1)
+	store.get("b")
+	assert store.evict_idle() == 1 and len(store) == 1
+	assert store.get("a").chat_history == []
+
+# Function for testing concurrent sessions sharing one chain
+def test_service(tmp_path):
+	service = make_service(max_sessions=3, sqlite_path=str(tmp_path / "sessions.db"))
+	with ThreadPoolExecutor(max_workers=8) as executor:
+		list(executor.map(lambda i: service.chat_query(f"user-{i % 5}", "How long do refunds take?"), range(20)))
+	assert sum(len(service.chat_history(f"user-{i}")) for i in range(5)) == 20
+	assert len(service.sessions) <= 3
+
+	# Sessions on one event loop
+	async def run():
+		return await asyncio.gather(*(service.achat_query(f"async-{i}", "baggage?") for i in range(10)))
+	assert asyncio.run(run()) == ["ok"] * 10
+	assert service.chat_history("async-0") == [("baggage?", "ok")]
+
+# Function for testing the spill of token-budgeted histories
+def test_service_budget(tmp_path):
+	service = make_service(history_tokens=40, max_sessions=1, sqlite_path=str(tmp_path / "sessions.db"))
+	for _ in range(10):
+		service.chat_query("a", "How long do refunds take?")
+	service.chat_query("b", "baggage?")
+	restored = service.chat_history("a")
+	assert restored.summary and restored.tokens() <= 40
+
+# Function for testing that a session is released by an early close and that the sync and async queries share its lock
+def test_service_stream_closed():
+	service = make_service()
+	async def run():
+		stream = service.astream_query("a", "baggage?")
+		await stream.__anext__()
+		session = service.sessions._sessions["a"]
+		assert session.users == 1 and session.lock.locked()
+		await stream.aclose()
+		assert session.users == 0 and not session.lock.locked()
+
+		# An async query waits for a sync query of the same session
+		session.lock.acquire()
+		task = asyncio.ensure_future(service.achat_query("a", "refunds?"))
+		await asyncio.sleep(0.05)
+		assert not task.done()
+		session.lock.release()
+		return await task
+	assert asyncio.run(run()) == "ok"
+	assert not service.sessions._sessions["a"].lock.locked() and service.sessions._sessions["a"].users == 0
+
+# Function for testing that a slow spill does not block the other sessions
+def test_spill_outside_lock(tmp_path, monkeypatch):
+	store = SessionStore(list, max_sessions=1, sqlite_path=str(tmp_path / "sessions.db"))
+	store.get("a").chat_history.append(["hi", "a"])
+	encode = store.encode
+	def slow_encode(chat_history):
+		time.sleep(0.3)
+		return encode(chat_history)
+	store.encode = slow_encode
+	with ThreadPoolExecutor(max_workers=2) as executor:
+		spill = executor.submit(store.get, "b")
+		time.sleep(0.1)
+		start = time.monotonic()
+		assert store.get("a").chat_history == [["hi", "a"]], "A session being spilled should be taken back from memory"
+		assert time.monotonic() - start < 0.2
+		spill.result()
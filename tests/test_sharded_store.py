@@ -0,0 +1,86 @@
+# Import the libraries
+import gc
+import numpy as np
+from enigma_code.local_store import LocalVectorStore
+from enigma_code.sharded_store import ShardedVectorStore
+from tests.helpers import LetterEmbeddings
+
+# Function for testing that the merged shards give the results of a single store
+def test_sharded_search(tmp_path):
+	generator = np.random.RandomState(4)
+	vectors = generator.normal(size=(2000, 16))
+	queries = generator.normal(size=(5, 16))
+	text_embeddings = [(str(i), v) for i, v in enumerate(vectors)]
+	metadatas = [{"odd": i % 2} for i in range(2000)]
+	exact = LocalVectorStore.from_embeddings(text_embeddings, LetterEmbeddings(), metadatas=metadatas, ids=[str(i) for i in range(2000)])
+	store = ShardedVectorStore.from_embeddings(text_embeddings, LetterEmbeddings(), metadatas=metadatas, ids=[str(i) for i in range(2000)], n_shards=4)
+	assert sorted(len(shard) for shard in store.shards)[0] > 400, "The hash should spread the documents"
+
+	# Function for comparing the results with the single store
+	def check(store, filter=None):
+		for query, results in zip(queries, store.similarity_search_many_by_vector(queries, k=10, filter=filter)):
+			expected = exact.similarity_search_with_score_by_vector(query, k=10, filter=filter)
+			assert [document.page_content for document, _ in results] == [document.page_content for document, _ in expected]
+
+	check(store)
+	check(store, filter={"odd": 1})
+
+	# Upserts and deletes go to the shard of the ID
+	store.add_embeddings([("new", vectors[0])], ids=["0"])
+	store.delete(["1"])
+	assert len(store) == 1999 and store.similarity_search_by_vector(vectors[0], k=1)[0].page_content == "new"
+	exact.delete(["0", "1"])
+	exact.add_embeddings([("new", vectors[0])], ids=["0"])
+
+	# Rebalance, save and search with worker processes
+	store.rebalance(3)
+	assert len(store.shards) == 3 and len(store) == 1999
+	check(store)
+	store.save_local(str(tmp_path))
+	with ShardedVectorStore.load_local(str(tmp_path), LetterEmbeddings(), workers="processes", max_workers=2) as loaded:
+		check(loaded, filter={"odd": 0})
+	store.close()
+
+# Function for listing the shards loaded by a worker process
+def _worker_shards():
+	from enigma_code.sharded_store import _WORKER_SHARDS
+	return sorted(_WORKER_SHARDS)
+
+# Function for testing that each shard is loaded by the one worker process it is pinned to
+def test_sharded_processes(tmp_path):
+	vectors = np.random.RandomState(5).normal(size=(300, 8))
+	store = ShardedVectorStore.from_embeddings([(str(i), v) for i, v in enumerate(vectors)], LetterEmbeddings(), ids=[str(i) for i in range(300)], n_shards=4)
+	store.save_local(str(tmp_path / "a"))
+	loaded = ShardedVectorStore.load_local(str(tmp_path / "a"), LetterEmbeddings(), workers="processes", max_workers=2)
+	assert loaded._shards == [None] * 4 and len(loaded) == 300, "The parent should not load the shards"
+	for _ in range(3):
+		assert loaded.similarity_search_by_vector(vectors[7], k=1)[0].page_content == "7"
+	folder = loaded.folder_path
+	assert [pool.submit(_worker_shards).result() for pool in loaded._processes] == [[f"{folder}/shard_0000", f"{folder}/shard_0002"], [f"{folder}/shard_0001", f"{folder}/shard_0003"]]
+
+	# A change loads its shard only, and the worker drops the shards of the old folder
+	loaded.delete(["7"])
+	assert sum(shard is not None for shard in loaded._shards) == 1 and len(loaded) == 299
+	loaded.save_local(str(tmp_path / "b"))
+	assert loaded.similarity_search_by_vector(vectors[7], k=1)[0].page_content != "7"
+	assert all(shard.startswith(loaded.folder_path) for pool in loaded._processes for shard in pool.submit(_worker_shards).result())
+	loaded.close()
+	store.close()
+
+# Function for testing that the worker processes are shut down by close() and by the finalizer
+def test_sharded_close(tmp_path):
+	store = ShardedVectorStore.from_embeddings([("a", [1, 0]), ("b", [0, 1])], LetterEmbeddings(), ids=["0", "4"], n_shards=2)
+	assert store.shard_of("0") != store.shard_of("4")
+	store.save_local(str(tmp_path))
+	for close in (lambda loaded: loaded.close(), lambda loaded: gc.collect()):
+		loaded = ShardedVectorStore.load_local(str(tmp_path), LetterEmbeddings(), workers="processes")
+		assert loaded.similarity_search_by_vector([1, 0], k=1)[0].page_content == "a"
+		processes = [process for pool in loaded._processes for process in pool._processes.values()]
+		assert len(processes) == 2
+		close(loaded)
+		del loaded
+		gc.collect()
+		for process in processes:
+			process.join(timeout=10)
+			assert not process.is_alive()
+	store.close()
@@ -0,0 +1,27 @@
+# Import the libraries
+from enigma_code.data import DataHandler
+from enigma_code.text_source import MappedTextFile
+
+# Function for testing the decoding of characters cut by block boundaries
+def test_iter_documents_multibyte(tmp_path):
+	path = tmp_path / "transcript.txt"
+	text = "".join(f"ligne {i} : café crème\n" + ("\n" if i % 3 == 0 else "") for i in range(50))
+	path.write_text(text, encoding="utf-8")
+	documents = list(MappedTextFile(str(path)).iter_documents(block_size=7))
+	assert "".join(doc.page_content for doc in documents) == text
+	assert all(text[doc.metadata["start_index"]:].startswith(doc.page_content) for doc in documents)
+	assert len(documents) > 1
+
+# Function for testing the encoding detection fallback
+def test_detect_encoding(tmp_path):
+	path = tmp_path / "legacy.txt"
+	path.write_bytes("Prix: 12 €\n".encode("cp1252") * 20)
+	source = MappedTextFile(str(path))
+	assert source.encoding != "utf-8"
+	assert "".join(doc.page_content for doc in source.iter_documents()).startswith("Prix: 12 ")
+
+# Function for testing the lazy loading of text files
+def test_load_dataset_lazy_txt(tmp_path):
+	path = tmp_path / "empty.txt"
+	path.write_text("")
+	assert list(DataHandler().load_dataset(str(path), lazy=True)) == []
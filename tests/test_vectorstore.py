@@ -0,0 +1,183 @@
+# Import the libraries
+import os
+import subprocess
+import sys
+import pytest
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from enigma_code.vectorstore import RateLimiter, VectorStoreManager
+
+# Embedding model that maps a text to a deterministic vector and records the batches
+class FakeEmbeddings(Embeddings):
+	def __init__(self, fail_on=None):
+		self.batches = []
+		self.query_batches = []
+		self.fail_on = fail_on
+	def embed_documents(self, texts):
+		if self.fail_on in texts:
+			self.fail_on = None
+			raise RuntimeError("Rate limit reached")
+		self.batches.append(list(texts))
+		return [self.embed_query(text) for text in texts]
+	def embed_query(self, text):
+		return [float(len(text)), float(sum(map(ord, text)) % 7), 1.0]
+	def embed_queries(self, texts):
+		self.query_batches.append(list(texts))
+		return [self.embed_query(text) for text in texts]
+
+# Fixture for creating a manager with the fake embedding model
+@pytest.fixture
+def manager(monkeypatch, tmp_path):
+	embedding = FakeEmbeddings()
+	monkeypatch.setitem(VectorStoreManager.EMBEDDING_MODELS, "fake", lambda: embedding)
+	return VectorStoreManager("faiss", "fake", vectorstore_path=str(tmp_path / "index"))
+
+# Documents used by the tests
+DOCUMENTS = [Document(page_content=f"policy {i} " + "x" * i, metadata={"n": i}) for i in range(10)]
+
+# Function for testing the batched build
+def test_build_faiss(manager):
+	pytest.importorskip("faiss")
+	vectorstore = manager.build(DOCUMENTS, ids=[f"id-{i}" for i in range(10)], batch_size=3, max_workers=2)
+	assert [len(batch) for batch in manager.embedding.batches] == [3, 3, 3, 1]
+	assert vectorstore.index.ntotal == 10
+	assert vectorstore.similarity_search("policy 4 xxxx", k=1)[0].metadata == {"n": 4}
+	assert manager.load_vectorstore().index.ntotal == 10
+
+# Function for testing that an interrupted build resumes from its checkpoint
+def test_build_resume(manager, tmp_path):
+	pytest.importorskip("faiss")
+	manager.embedding.fail_on = DOCUMENTS[6].page_content
+	with pytest.raises(RuntimeError):
+		manager.build(DOCUMENTS, batch_size=2, max_workers=1, max_retries=0, checkpoint_path=str(tmp_path / "checkpoint"))
+	embedded = len(manager.embedding.batches)
+	manager.build(DOCUMENTS, batch_size=2, max_workers=1, checkpoint_path=str(tmp_path / "checkpoint"))
+	assert len(manager.embedding.batches) - embedded == 5 - embedded, "Only the missing batches should be embedded"
+	assert manager.vectorstore.index.ntotal == 10
+	assert not (tmp_path / "checkpoint").exists()
+
+# Function for testing the rate limiter
+def test_rate_limiter(monkeypatch):
+	sleeps = []
+	monkeypatch.setattr("enigma_code.vectorstore.time.sleep", sleeps.append)
+	limiter = RateLimiter(requests_per_minute=600)
+	for _ in range(3):
+		limiter.acquire()
+	assert len(sleeps) == 2 and all(0 < s <= 0.2 for s in sleeps)
+
+# Function for testing the local vector store backend
+def test_build_local(manager):
+	manager.vectorstore_name = "local"
+	manager.build(DOCUMENTS, batch_size=4)
+	loaded = manager.load_vectorstore()
+	assert len(loaded) == 10
+	assert loaded.similarity_search("policy 7 xxxxxxx", k=1)[0].metadata == {"n": 7}
+
+# Function for testing that importing the module does not import the backends
+def test_import_is_lazy():
+	code = "import sys, enigma_code.vectorstore; print(sorted(m for m in sys.modules if m.startswith(('langchain_community.vectorstores', 'langchain_community.embeddings', 'faiss', 'chromadb', 'enigma_code.local_store', 'langchain_core'))))"
+	output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+	assert output.strip() == "[]", f"Backends imported at import time: {output}"
+
+# Function for testing that a backend is imported when it is selected
+def test_backend_imported_when_selected(manager):
+	assert manager._vectorstore_class().__name__ == "IDMapFAISS"
+	manager.vectorstore_name = "local"
+	assert manager._vectorstore_class().__name__ == "LocalVectorStore"
+
+# Function for testing the filtered search of the FAISS and local backends
+def test_search_filter(manager):
+	pytest.importorskip("faiss")
+	documents = [Document(page_content=document.page_content, metadata={"n": document.metadata["n"], "region": ["eu", "us"][i % 2]}) for i, document in enumerate(DOCUMENTS)]
+	for name in ["faiss", "local"]:
+		manager.vectorstore_name = name
+		manager.build(documents)
+		results = manager.search("policy 4 xxxx", k=2, filter={"region": "us", "n": {"$gte": 5}})
+		expected = [document for document in manager.vectorstore.similarity_search("policy 4 xxxx", k=10) if document.metadata["region"] == "us" and document.metadata["n"] >= 5]
+		assert [document.metadata["n"] for document in results] == [document.metadata["n"] for document in expected[:2]]
+		assert manager.search("policy 4 xxxx", k=1, filter={"region": "eu"})[0].metadata["n"] == 4
+		assert manager.search("policy 4 xxxx", k=2, filter={"region": "mars"}) == []
+
+		# An upsert on the store itself is seen by the next filtered search
+		if name == "faiss":
+			manager.vectorstore.add_documents([Document(page_content="policy 4 xxxx", metadata={"n": 40, "region": "eu"})], ids=[manager.vectorstore.index_to_docstore_id[4]])
+			assert [document.metadata["n"] for document in manager.search("policy 4 xxxx", k=1, filter={"n": 40})] == [40]
+			assert manager.search("policy 4 xxxx", k=1, filter={"n": 4}) == []
+
+# Function for testing the in-place upsert and delete of the FAISS and Annoy backends
+@pytest.mark.parametrize("name", ["faiss", "annoy"])
+def test_upsert_delete(manager, tmp_path, name):
+	pytest.importorskip(name)
+	manager.vectorstore_name = name
+	manager.build(DOCUMENTS, ids=[f"id-{i}" for i in range(10)])
+	manager.add_documents([Document(page_content="policy 4 xxxx", metadata={"n": 40})], ids=["id-4"])
+	manager.delete(ids=["id-7"])
+	loaded = manager.load_vectorstore()
+	results = loaded.similarity_search("policy 4 xxxx", k=10)
+	assert sorted(document.metadata["n"] for document in results) == [0, 1, 2, 3, 5, 6, 8, 9, 40]
+	assert results[0].metadata == {"n": 40}
+
+# Function for testing that a new manager adds to the saved store instead of replacing it
+@pytest.mark.parametrize("name", ["faiss", "local"])
+def test_add_to_saved(manager, tmp_path, name):
+	pytest.importorskip("faiss")
+	manager.vectorstore_name = name
+	manager.build(DOCUMENTS[:5], ids=[f"id-{i}" for i in range(5)])
+	fresh = VectorStoreManager(name, "fake", vectorstore_path=str(tmp_path / "index"))
+	fresh.add_documents(DOCUMENTS[5:6], ids=["id-5"])
+	loaded = VectorStoreManager(name, "fake", vectorstore_path=str(tmp_path / "index")).load_vectorstore()
+	assert sorted(document.metadata["n"] for document in loaded.similarity_search("policy", k=10)) == [0, 1, 2, 3, 4, 5]
+
+# Function for testing that a save switches the store to a new version in one rename
+def test_atomic_save(manager, tmp_path):
+	pytest.importorskip("faiss")
+	manager.build(DOCUMENTS[:5])
+	first = os.path.realpath(tmp_path / "index")
+	manager.add_documents(DOCUMENTS[5:])
+	assert os.path.islink(tmp_path / "index") and os.path.realpath(tmp_path / "index") != first
+	manager.add_documents(DOCUMENTS[:1])
+	assert not os.path.exists(first), "Versions older than the previous one should be deleted"
+	assert len(os.listdir(tmp_path / "index.versions")) == 2
+
+# Function for testing that a batch query returns the results of single queries with one query embedding request
+@pytest.mark.parametrize("name", ["faiss", "local"])
+def test_query_many(manager, name):
+	pytest.importorskip("faiss")
+	manager.vectorstore_name = name
+	manager.build(DOCUMENTS)
+	queries = ["policy 4 xxxx", "policy 7 xxxxxxx", "policy 1 x"]
+	expected = [[document.metadata["n"] for document in manager.vectorstore.similarity_search(query, k=3)] for query in queries]
+	batches = len(manager.embedding.batches)
+	results = manager.query_many(queries, k=3)
+	assert len(manager.embedding.batches) == batches and manager.embedding.query_batches == [queries]
+	assert [[document.metadata["n"] for document in documents] for documents in results] == expected
+
+# Function for testing the sharded backend
+def test_build_sharded(manager):
+	manager.vectorstore_name = "sharded"
+	manager.vectorstore_kwargs = {"n_shards": 3}
+	manager.build(DOCUMENTS, ids=[f"id-{i}" for i in range(10)], batch_size=4)
+	loaded = manager.load_vectorstore()
+	assert len(loaded.shards) == 3 and len(loaded) == 10
+	assert manager.search("policy 7 xxxxxxx", k=1, filter={"n": 7})[0].metadata == {"n": 7}
+	assert loaded._executors, "The search should have started the shard threads"
+	manager.release()
+	assert manager.vectorstore is None and loaded._executors == []
+
+# Function for testing the shared loading through the registry
+def test_load_shared(monkeypatch, tmp_path):
+	embedding = FakeEmbeddings()
+	monkeypatch.setitem(VectorStoreManager.EMBEDDING_MODELS, "fake", lambda: embedding)
+	path = str(tmp_path / "index")
+	VectorStoreManager("local", "fake", vectorstore_path=path).build(DOCUMENTS[:5])
+	first, second = VectorStoreManager("local", "fake", vectorstore_path=path), VectorStoreManager("local", "fake", vectorstore_path=path)
+	assert first.load_vectorstore(shared=True) is second.load_vectorstore(shared=True)
+	assert first.load_vectorstore() is not second.vectorstore
+
+	# Saving the index again loads the new files
+	writer = VectorStoreManager("local", "fake", vectorstore_path=path)
+	writer.build(DOCUMENTS)
+	third = VectorStoreManager("local", "fake", vectorstore_path=path)
+	assert len(third.load_vectorstore(shared=True)) == 10 and len(second.vectorstore) == 5
+	for manager in (second, third):
+		manager.release()